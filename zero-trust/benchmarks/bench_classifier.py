@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: цепочка правил DeviceClassifier против ScoringClassifier
+"""
+
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+# Добавляем корень проекта в путь
+project_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_dir))
+os.chdir(project_dir)
+
+from src.core.models import NetworkDevice
+from src.scanner.device_classifier import DeviceClassifier
+
+PORTS = [22, 23, 53, 80, 139, 443, 445, 515, 554, 631, 1883, 1900,
+         3389, 5000, 5353, 8080, 9100, 37777, 62078]
+HOSTNAMES = [None, 'router', 'home-pc', 'android-phone', 'smart-tv',
+             'hp-printer', 'security-camera', 'diskstation', 'laptop-01']
+
+
+# Устройства, на которых не срабатывает ни одно правило цепочки
+UNMATCHED_PORTS = [81, 5900, 8443, 10000, 49152]
+
+
+def make_devices(count: int, ouis: list, ports: list, hostnames: list,
+                 seed: int = 42) -> list:
+    """Сгенерировать синтетический инвентарь устройств"""
+    rnd = random.Random(seed)
+    
+    devices = []
+    for i in range(count):
+        tail = ':'.join(f"{rnd.randrange(256):02X}" for _ in range(3))
+        devices.append(NetworkDevice(
+            ip_address=f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i % 250 + 2}",
+            mac_address=f"{rnd.choice(ouis)}:{tail}",
+            hostname=rnd.choice(hostnames),
+            open_ports=sorted(rnd.sample(ports, rnd.randint(1, 4))),
+        ))
+    return devices
+
+
+def bench(name: str, func, devices: list) -> float:
+    """Измерить время классификации всех устройств"""
+    start = time.perf_counter()
+    for device in devices:
+        func(device)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {elapsed * 1000:9.1f} мс  "
+          f"({elapsed / len(devices) * 1e6:6.2f} мкс/устройство)")
+    return elapsed
+
+
+def run_scenario(title: str, classifier: DeviceClassifier, devices: list):
+    """Сравнить оба классификатора на одном наборе устройств"""
+    # Производитель по OUI определяется заранее для обоих вариантов
+    for device in devices:
+        device.vendor = classifier.get_vendor_from_mac(device.mac_address)
+    
+    print(f"\n{title} ({len(devices)} устройств)")
+    rules = bench("Цепочка правил", classifier.classify_device, devices)
+    scoring = bench("ScoringClassifier", classifier.scorer.classify, devices)
+    print(f"Отношение времени: x{rules / scoring:.2f}")
+    
+    agree = sum(
+        classifier.classify_device(d) == classifier.scorer.classify(d)[0]
+        for d in devices
+    )
+    print(f"Совпадение результатов: {agree / len(devices):.1%}")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    classifier = DeviceClassifier()
+    ouis = list(classifier.oui_db.keys())
+    
+    run_scenario(
+        "Смешанный инвентарь", classifier,
+        make_devices(count, ouis, PORTS, HOSTNAMES)
+    )
+    
+    # Худший случай для цепочки: производитель неизвестен, ни одно правило
+    # не срабатывает и вычисляются все лямбды плюс эвристики по портам
+    run_scenario(
+        "Нераспознаваемые устройства", classifier,
+        make_devices(count, ['02:00:00'], UNMATCHED_PORTS, [None, 'host'])
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: память и время создания NetworkDevice против прежнего dataclass
+"""
+
+import ipaddress
+import os
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+
+# Добавляем корень проекта в путь
+project_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_dir))
+os.chdir(project_dir)
+
+from src.core.models import NetworkDevice, DeviceType
+
+VENDORS = ['HP', 'Hikvision', 'Synology', 'TP-Link', 'Samsung', 'Xiaomi', 'Apple', 'Sony']
+OS_NAMES = [None, 'Linux 4.x', 'Windows 10', 'Android 12', 'RouterOS 7']
+PORTS = [22, 23, 53, 80, 139, 443, 445, 554, 631, 1883, 1900, 3389, 8080, 9100]
+
+@dataclass
+class LegacyNetworkDevice:
+    """Прежнее представление устройства (dataclass с __dict__)"""
+    ip_address: str
+    mac_address: Optional[str] = None
+    hostname: Optional[str] = None
+    device_type: DeviceType = DeviceType.UNKNOWN
+    vendor: Optional[str] = None
+    open_ports: List[int] = field(default_factory=list)
+    os_info: Optional[str] = None
+    risk_score: float = 0.5
+    is_gateway: bool = False
+    
+    def __post_init__(self):
+        try:
+            ipaddress.ip_address(self.ip_address)
+        except ValueError:
+            raise ValueError(f"Invalid IP address: {self.ip_address}")
+
+def make_records(count: int, seed: int = 42):
+    """Исходные данные в том виде, в каком их дает сканер или JSON"""
+    rnd = random.Random(seed)
+    for i in range(count):
+        os_name = rnd.choice(OS_NAMES)
+        yield dict(
+            ip_address=f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+            mac_address=':'.join(f"{rnd.randrange(256):02X}" for _ in range(6)),
+            hostname=f"host-{i}",
+            device_type=rnd.choice(list(DeviceType)),
+            # Строки и числа из JSON - отдельные объекты у каждого устройства
+            vendor=''.join(list(rnd.choice(VENDORS))),
+            open_ports=[int(str(p)) for p in rnd.sample(PORTS, rnd.randint(1, 4))],
+            os_info=''.join(list(os_name)) if os_name else None,
+        )
+
+def measure(name: str, cls, count: int) -> float:
+    """Память, удерживаемая устройствами, и время создания"""
+    # Память: исходные записи освобождаются, остается только то, что
+    # хранят сами устройства
+    tracemalloc.start()
+    devices = [cls(**record) for record in make_records(count)]
+    current, _ = tracemalloc.get_traced_memory()
+    # NetworkDevice кэширует текст адреса после первого чтения
+    for device in devices:
+        device.ip_address
+    read, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    records = list(make_records(count))
+    start = time.perf_counter()
+    devices = [cls(**record) for record in records]
+    elapsed = time.perf_counter() - start
+    
+    timings = []
+    for _ in range(2):
+        start = time.perf_counter()
+        for device in devices:
+            device.ip_address
+        timings.append(time.perf_counter() - start)
+    
+    per_device = current / count
+    print(f"{name:<16} {per_device:6.0f} байт/устройство ({read / count:4.0f} после чтения ip_address)  "
+          f"создание {elapsed / count * 1e6:5.2f} мкс  "
+          f"ip_address {timings[0] / count * 1e9:4.0f} нс, повторно {timings[1] / count * 1e9:4.0f} нс")
+    return per_device
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    
+    print(f"Устройств: {count}")
+    legacy = measure("dataclass", LegacyNetworkDevice, count)
+    compact = measure("NetworkDevice", NetworkDevice, count)
+    print(f"Экономия памяти: x{legacy / compact:.1f}")
+
+if __name__ == "__main__":
+    main()
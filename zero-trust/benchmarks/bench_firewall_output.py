@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: размер и загрузка правил iptables и nftables для одной политики
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Добавляем корень проекта в путь
+project_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_dir))
+os.chdir(project_dir)
+
+from src.core.generator import PolicyGenerator
+from bench_policy_io import make_policy, timed
+
+def count_lines(config: str, prefix: str) -> int:
+    return sum(1 for line in config.splitlines() if line.lstrip().startswith(prefix))
+
+def nft_check(path: Path) -> str:
+    """Время проверки набора правил nft -c -f (без применения) или причина, по которой оно не измерено"""
+    nft = shutil.which('nft')
+    if nft is None:
+        return "nft не найден, время загрузки не измерялось"
+    start = time.perf_counter()
+    result = subprocess.run([nft, '-c', '-f', str(path)], capture_output=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        error = result.stderr.decode('utf-8', 'replace').strip().splitlines()
+        return f"nft -c -f завершился с ошибкой, время не измерено: {error[0] if error else result.returncode}"
+    return f"nft -c -f {elapsed * 1000:7.1f} мс"
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+    policy = make_policy(count)
+    generator = PolicyGenerator()
+    print(f"Устройств: {count}, правил политики: {len(policy.rules)}")
+    
+    outputs = [
+        ("iptables", lambda: generator.generate_iptables_config(policy), "iptables -A"),
+        ("iptables ipset", lambda: generator.generate_iptables_config(policy, use_ipset=True), "iptables -A"),
+        ("nftables", lambda: generator.generate_nftables_config(policy), None),
+    ]
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, generate, rule_prefix in outputs:
+            config = None
+            
+            def run():
+                nonlocal config
+                config = generate()
+            
+            elapsed = timed(run)
+            path = Path(tmp) / f"{name.replace(' ', '_')}.rules"
+            path.write_text(config, encoding='utf-8')
+            
+            if rule_prefix:
+                # Каждая строка - отдельный процесс iptables и правило в цепочке
+                rules = count_lines(config, rule_prefix)
+                details = f"правил {rules:8d}  процессов при загрузке {rules:8d}"
+            else:
+                rules = count_lines(config, 'chain ')
+                elements = config.count(' : jump ')
+                details = f"цепочек {rules:7d}  элементов карт {elements:8d}  {nft_check(path)}"
+            
+            print(f"{name:<15} генерация {elapsed * 1000:8.1f} мс  "
+                  f"размер {len(config.encode('utf-8')) / 1024:8.0f} КБ  {details}")
+
+if __name__ == "__main__":
+    main()
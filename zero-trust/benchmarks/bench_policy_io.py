@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: сохранение и загрузка политики в JSON и бинарном формате
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Добавляем корень проекта в путь
+project_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_dir))
+os.chdir(project_dir)
+
+from src.core.models import (
+    NetworkDevice, SecurityZone, SecurityRule, NetworkPolicy, DeviceType, ZoneType, ActionType
+)
+
+VENDORS = ['HP', 'Hikvision', 'Synology', 'TP-Link', 'Samsung', 'Xiaomi', 'Apple', 'Sony']
+OS_NAMES = [None, 'Linux 4.x', 'Windows 10', 'Android 12', 'RouterOS 7']
+PORTS = [22, 23, 53, 80, 139, 443, 445, 554, 631, 1883, 1900, 3389, 8080, 9100]
+
+def make_policy(count: int, seed: int = 42) -> NetworkPolicy:
+    """Политика с count устройствами, распределенными по всем типам зон"""
+    rnd = random.Random(seed)
+    policy = NetworkPolicy("Benchmark")
+    zones = [SecurityZone(zone_type.value, zone_type) for zone_type in ZoneType]
+    for zone in zones:
+        policy.add_zone(zone)
+    
+    for i in range(count):
+        device = NetworkDevice(
+            f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+            mac_address=':'.join(f"{rnd.randrange(256):02X}" for _ in range(6)),
+            hostname=f"host-{i}",
+            device_type=rnd.choice(list(DeviceType)),
+            vendor=rnd.choice(VENDORS),
+            open_ports=rnd.sample(PORTS, rnd.randint(1, 4)),
+            os_info=rnd.choice(OS_NAMES),
+            risk_score=round(rnd.random(), 2)
+        )
+        rnd.choice(zones).add_device(device)
+    
+    for source in zones:
+        for destination in zones:
+            if source is not destination:
+                policy.add_rule(SecurityRule(source.name, destination.name, ActionType.DENY))
+    
+    return policy
+
+def timed(action) -> float:
+    start = time.perf_counter()
+    action()
+    return time.perf_counter() - start
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    policy = make_policy(count)
+    print(f"Устройств: {count}")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = Path(tmp) / "policy.json"
+        binary_path = Path(tmp) / "policy.ztpb"
+        
+        results = [
+            ("JSON", json_path, {}),
+            ("binary", binary_path, {}),
+            ("binary trusted", binary_path, {'trusted': True}),
+        ]
+        
+        baseline = None
+        for name, path, options in results:
+            save = timed(lambda: policy.save_to_file(str(path)))
+            load = timed(lambda: NetworkPolicy.load_from_file(str(path), **options))
+            size = path.stat().st_size
+            
+            baseline = baseline or (save, load, size)
+            print(f"{name:<15} запись {save * 1000:7.1f} мс (x{baseline[0] / save:4.1f})  "
+                  f"чтение {load * 1000:7.1f} мс (x{baseline[1] / load:4.1f})  "
+                  f"размер {size / 1024:7.0f} КБ (x{baseline[2] / size:4.1f})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+# Windows Firewall Rules (grouped by zone pair)
+# Generated by ZeroTrust Inspector
+# Policy: {{ policy_name }}
+
+# Remove old rules
+Get-NetFirewallRule | Where-Object {$_.DisplayName -like "ZTI_*"} | Remove-NetFirewallRule
+
+# Create new rules
+{% for rule in rules %}
+New-NetFirewallRule `
+    -DisplayName "{{ rule.name }}" `
+    -Description "{{ rule.description }}" `
+    -Enabled True `
+    -Direction Outbound `
+    -Protocol {{ rule.protocol }} `
+    {% if rule.ports %}
+    -RemotePort {{ rule.ports|join(",") }} `
+    {% endif %}
+    -LocalAddress {{ rule.local|join(",") }} `
+    -RemoteAddress {{ rule.remote|join(",") }} `
+    -Action {{ rule.action }} | Out-Null
+Write-Host "Created rule: {{ rule.name }}"
+
+{% endfor %}
+Write-Host "Windows Firewall rules applied successfully!"
@@ -0,0 +1,528 @@
+"""
+Бинарный формат файлов политик
+
+Компактная альтернатива JSON для больших политик. Файл состоит из
+заголовка, каталога секций и самих секций:
+    
+    заголовок   magic b'ZTPB', версия формата, флаги, число секций
+    каталог     (тег, смещение, длина) для каждой секции
+    STRS        таблица строк: смещения (в байтах) и текст UTF-8
+    META        имя, описание и дата создания политики
+    DEVS        уникальные устройства, по столбцу на поле
+    PORT        порты устройств и правил одним массивом uint16
+    ZONE        зоны со ссылками на устройства
+    REFS        индексы устройств зон (uint32)
+    RULE        правила
+
+Все числа little-endian. Строковые поля хранятся индексами в таблице
+строк (NONE - отсутствующее значение), поэтому повторяющиеся значения
+(производители, ОС, типы) записываются один раз. Устройство, входящее
+в несколько зон, хранится один раз.
+
+Секции читаются по смещениям из каталога, поэтому файл можно открыть
+через mmap и разбирать только нужные секции (см. lazy_policy). В версии 1
+смещения строк считались в символах, с версии 2 - в байтах, чтобы
+отдельную строку можно было прочитать без разбора всей таблицы. С
+версии 3 зона хранит маску целых координат и размеров: они записываются
+как double, но загружаются целыми, как в JSON.
+"""
+
+import gc
+import ipaddress
+import socket
+import struct
+import sys
+from array import array
+from contextlib import contextmanager
+from datetime import datetime
+from mmap import mmap
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from .exceptions import PolicyFormatError
+from .models import (
+    NetworkDevice, SecurityZone, SecurityRule, NetworkPolicy,
+    DeviceType, ZoneType, ActionType, _IPV6_FLAG
+)
+
+MAGIC = b'ZTPB'
+EXTENSION = '.ztpb'
+FORMAT_VERSION = 3
+
+# Индекс строки для значения None
+NONE = 0xFFFFFFFF
+
+HEADER = struct.Struct('<4sHHI')
+SECTION = struct.Struct('<4sQQ')
+COUNT = struct.Struct('<I')
+META = struct.Struct('<III')
+
+# Вид IP-адреса в столбце ip_kind
+IP_V4 = 4
+IP_V6 = 6
+IP_TEXT = 0  # адрес с зоной IPv6, хранится строкой
+
+# Вид MAC-адреса в столбце mac_kind
+MAC_NONE = 0
+MAC_INT = 1
+MAC_TEXT = 2
+
+_LOW64 = (1 << 64) - 1
+
+# Столбцы таблиц: (имя, код типа array)
+DEVICE_COLUMNS = (
+    ('ip_kind', 'B'),
+    ('ip_lo', 'Q'),
+    ('ip_hi', 'Q'),
+    ('mac_kind', 'B'),
+    ('mac', 'Q'),
+    ('hostname', 'I'),
+    ('device_type', 'I'),
+    ('vendor', 'I'),
+    ('os_info', 'I'),
+    ('risk_score', 'd'),
+    ('is_gateway', 'B'),
+    ('ports_start', 'I'),
+    ('ports_count', 'H'),
+)
+
+ZONE_COLUMNS = (
+    ('name', 'I'),
+    ('zone_type', 'I'),
+    ('description', 'I'),
+    ('color', 'I'),
+    ('pos_x', 'd'),
+    ('pos_y', 'd'),
+    ('width', 'd'),
+    ('height', 'd'),
+    ('refs_start', 'I'),
+    ('refs_count', 'I'),
+    ('int_geometry', 'B'),  # с версии 3: биты целых значений GEOMETRY_COLUMNS
+)
+
+GEOMETRY_COLUMNS = ('pos_x', 'pos_y', 'width', 'height')
+
+RULE_COLUMNS = (
+    ('source_zone', 'I'),
+    ('destination_zone', 'I'),
+    ('action', 'I'),
+    ('protocol', 'I'),
+    ('description', 'I'),
+    ('ports_start', 'I'),
+    ('ports_count', 'i'),  # -1 - ports=None
+)
+
+_BIG_ENDIAN = sys.byteorder == 'big'
+
+PathLike = Union[str, Path]
+
+def _to_bytes(typecode: str, values, name: str = '') -> bytes:
+    try:
+        data = array(typecode, values)
+    except (TypeError, OverflowError) as e:
+        # Например, risk_score=None или порт больше 65535
+        raise PolicyFormatError(f"Значение {name} нельзя записать в бинарный формат: {e}") from e
+    if _BIG_ENDIAN:
+        data.byteswap()
+    return data.tobytes()
+
+def _from_bytes(typecode: str, data: memoryview, offset: int, count: int) -> Tuple[array, int]:
+    values = array(typecode)
+    end = offset + values.itemsize * count
+    if end > len(data):
+        raise PolicyFormatError("Повреждённый файл политики: секция обрезана")
+    values.frombytes(data[offset:end])
+    if _BIG_ENDIAN:
+        values.byteswap()
+    return values, end
+
+def zone_columns(version: int) -> tuple:
+    """Столбцы секции ZONE в файле данной версии"""
+    return ZONE_COLUMNS if version >= 3 else ZONE_COLUMNS[:-1]
+
+def zone_geometry(table: Dict[str, Sequence[Any]], row: int) -> Tuple[tuple, tuple]:
+    """Позиция и размер зоны из строки секции ZONE"""
+    values = [table[name][row] for name in GEOMETRY_COLUMNS]
+    if 'int_geometry' in table:
+        mask = table['int_geometry'][row]
+    else:
+        # До версии 3 тип не хранился: целые значения восстанавливаются целыми
+        mask = sum(1 << i for i, value in enumerate(values) if value.is_integer())
+    values = [int(value) if mask >> i & 1 else value for i, value in enumerate(values)]
+    return (values[0], values[1]), (values[2], values[3])
+
+def _pack_table(columns: tuple, table: Dict[str, list]) -> bytes:
+    count = len(table[columns[0][0]])
+    parts = [COUNT.pack(count)]
+    parts.extend(_to_bytes(typecode, table[name], name) for name, typecode in columns)
+    return b''.join(parts)
+
+def _unpack_table(columns: tuple, data: memoryview) -> Tuple[int, Dict[str, array]]:
+    if len(data) < COUNT.size:
+        raise PolicyFormatError("Повреждённый файл политики: секция обрезана")
+    count = COUNT.unpack_from(data)[0]
+    offset = COUNT.size
+    table = {}
+    for name, typecode in columns:
+        table[name], offset = _from_bytes(typecode, data, offset, count)
+    return count, table
+
+class _StringTable:
+    """Таблица строк, заполняемая при записи"""
+    
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.strings: List[str] = []
+    
+    def add(self, value: Optional[str]) -> int:
+        if value is None:
+            return NONE
+        idx = self.index.get(value)
+        if idx is None:
+            idx = self.index[value] = len(self.strings)
+            self.strings.append(value)
+        return idx
+    
+    def pack(self) -> bytes:
+        encoded = [value.encode('utf-8', 'surrogatepass') for value in self.strings]
+        offsets = [0]
+        total = 0
+        for value in encoded:
+            total += len(value)
+            offsets.append(total)
+        return COUNT.pack(len(self.strings)) + _to_bytes('I', offsets) + b''.join(encoded)
+
+def _unpack_strings(data: memoryview, version: int = FORMAT_VERSION) -> List[Optional[str]]:
+    count = COUNT.unpack_from(data)[0]
+    offsets, end = _from_bytes('I', data, COUNT.size, count + 1)
+    blob = bytes(data[end:])
+    
+    if version < 2:
+        # Версия 1: смещения в символах
+        blob = blob.decode('utf-8', 'surrogatepass')
+    if offsets[-1] != len(blob):
+        raise PolicyFormatError("Повреждённый файл политики: таблица строк")
+    if version < 2:
+        return [blob[offsets[i]:offsets[i + 1]] for i in range(count)]
+    
+    return [blob[offsets[i]:offsets[i + 1]].decode('utf-8', 'surrogatepass') for i in range(count)]
+
+def dumps(policy: NetworkPolicy) -> bytes:
+    """Сериализовать политику в бинарный формат"""
+    strings = _StringTable()
+    add = strings.add
+    ports: List[int] = []
+    
+    # Одинаковые наборы портов - общие кортежи, записываем их один раз
+    port_offsets: Dict[int, int] = {}
+    
+    devices = policy.unique_devices()
+    device_index = {id(device): i for i, device in enumerate(devices)}
+    
+    dev = {name: [] for name, _ in DEVICE_COLUMNS}
+    for device in devices:
+        ip = device._ip
+        if ip.__class__ is str:
+            dev['ip_kind'].append(IP_TEXT)
+            dev['ip_lo'].append(add(ip))
+            dev['ip_hi'].append(0)
+        elif ip >= _IPV6_FLAG:
+            ip ^= _IPV6_FLAG
+            dev['ip_kind'].append(IP_V6)
+            dev['ip_lo'].append(ip & _LOW64)
+            dev['ip_hi'].append(ip >> 64)
+        else:
+            dev['ip_kind'].append(IP_V4)
+            dev['ip_lo'].append(ip)
+            dev['ip_hi'].append(0)
+        
+        mac = device._mac
+        if mac is None:
+            dev['mac_kind'].append(MAC_NONE)
+            dev['mac'].append(0)
+        elif mac.__class__ is int:
+            dev['mac_kind'].append(MAC_INT)
+            dev['mac'].append(mac)
+        else:
+            dev['mac_kind'].append(MAC_TEXT)
+            dev['mac'].append(add(mac))
+        
+        dev['hostname'].append(add(device.hostname))
+        dev['device_type'].append(add(device.device_type.value))
+        dev['vendor'].append(add(device.vendor))
+        dev['os_info'].append(add(device.os_info))
+        dev['risk_score'].append(device.risk_score)
+        dev['is_gateway'].append(1 if device.is_gateway else 0)
+        
+        open_ports = device.open_ports
+        start = port_offsets.get(id(open_ports))
+        if start is None:
+            start = port_offsets[id(open_ports)] = len(ports)
+            ports.extend(open_ports)
+        dev['ports_start'].append(start)
+        dev['ports_count'].append(len(open_ports))
+    
+    refs: List[int] = []
+    zones = {name: [] for name, _ in ZONE_COLUMNS}
+    for zone in policy.zones.values():
+        zones['name'].append(add(zone.name))
+        zones['zone_type'].append(add(zone.zone_type.value))
+        zones['description'].append(add(zone.description))
+        zones['color'].append(add(zone.color))
+        geometry = (*zone.position, *zone.size)
+        for name, value in zip(GEOMETRY_COLUMNS, geometry):
+            zones[name].append(value)
+        zones['refs_start'].append(len(refs))
+        zones['refs_count'].append(len(zone.devices))
+        zones['int_geometry'].append(
+            sum(1 << i for i, value in enumerate(geometry) if isinstance(value, int))
+        )
+        refs.extend(device_index[id(device)] for device in zone.devices)
+    
+    rules = {name: [] for name, _ in RULE_COLUMNS}
+    for rule in policy.rules:
+        rules['source_zone'].append(add(rule.source_zone))
+        rules['destination_zone'].append(add(rule.destination_zone))
+        rules['action'].append(add(rule.action.value))
+        rules['protocol'].append(add(rule.protocol))
+        rules['description'].append(add(rule.description))
+        rules['ports_start'].append(len(ports))
+        if rule.ports is None:
+            rules['ports_count'].append(-1)
+        else:
+            rules['ports_count'].append(len(rule.ports))
+            ports.extend(rule.ports)
+    
+    meta = META.pack(
+        add(policy.name),
+        add(policy.description),
+        add(policy.created_at.isoformat())
+    )
+    
+    sections = [
+        (b'META', meta),
+        (b'DEVS', _pack_table(DEVICE_COLUMNS, dev)),
+        (b'PORT', _to_bytes('H', ports, 'ports')),
+        (b'ZONE', _pack_table(ZONE_COLUMNS, zones)),
+        (b'REFS', _to_bytes('I', refs, 'refs')),
+        (b'RULE', _pack_table(RULE_COLUMNS, rules)),
+        # Таблица строк последней: ее заполняют все остальные секции
+        (b'STRS', strings.pack()),
+    ]
+    
+    offset = HEADER.size + SECTION.size * len(sections)
+    directory = []
+    for tag, payload in sections:
+        directory.append(SECTION.pack(tag, offset, len(payload)))
+        offset += len(payload)
+    
+    return b''.join([HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(sections))]
+                    + directory + [payload for _, payload in sections])
+
+def read_sections(data: Union[bytes, memoryview, mmap]) -> Tuple[int, Dict[bytes, memoryview]]:
+    """Проверить заголовок и вернуть версию формата и секции файла по тегам"""
+    view = memoryview(data)
+    if len(view) < HEADER.size:
+        raise PolicyFormatError("Файл слишком короткий для бинарной политики")
+    
+    magic, version, _flags, count = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise PolicyFormatError("Файл не является бинарной политикой ZeroTrust")
+    if version > FORMAT_VERSION:
+        raise PolicyFormatError(f"Неподдерживаемая версия формата: {version}")
+    
+    sections = {}
+    for i in range(count):
+        position = HEADER.size + SECTION.size * i
+        if position + SECTION.size > len(view):
+            raise PolicyFormatError("Повреждённый файл политики: каталог секций")
+        tag, offset, length = SECTION.unpack_from(view, position)
+        if offset + length > len(view):
+            raise PolicyFormatError(f"Повреждённый файл политики: секция {tag!r}")
+        sections[tag] = view[offset:offset + length]
+    
+    for tag in (b'STRS', b'META', b'DEVS', b'PORT', b'ZONE', b'REFS', b'RULE'):
+        if tag not in sections:
+            raise PolicyFormatError(f"В файле политики нет секции {tag.decode()}")
+    
+    return version, sections
+
+def _ip_text(kind: int, low: int, high: int, strings: list) -> str:
+    if kind == IP_V4:
+        return socket.inet_ntoa(low.to_bytes(4, 'big'))
+    if kind == IP_V6:
+        return str(ipaddress.IPv6Address(high << 64 | low))
+    return strings[low]
+
+def _ip_value(kind: int, low: int, high: int, strings: list):
+    """Адрес во внутреннем представлении NetworkDevice"""
+    if kind == IP_V4:
+        return low
+    if kind == IP_V6:
+        return (high << 64 | low) | _IPV6_FLAG
+    return strings[low]
+
+def _mac_value(kind: int, value: int, strings: list):
+    """MAC-адрес во внутреннем представлении NetworkDevice"""
+    if kind == MAC_INT:
+        return value
+    if kind == MAC_TEXT:
+        return strings[value]
+    return None
+
+def _mac_text(kind: int, value: int, strings: list) -> Optional[str]:
+    if kind == MAC_INT:
+        return value.to_bytes(6, 'big').hex(':').upper()
+    return _mac_value(kind, value, strings)
+
+def loads(data: Union[bytes, memoryview], trusted: bool = False) -> NetworkPolicy:
+    """
+    Загрузить политику из бинарного формата
+    
+    trusted=True - быстрый путь для собственных файлов: устройства
+    создаются из сохраненного внутреннего представления без разбора и
+    проверки IP-адресов. Без него каждое устройство проходит через
+    обычный конструктор NetworkDevice
+    """
+    version, sections = read_sections(data)
+    
+    try:
+        strings = _unpack_strings(sections[b'STRS'], version)
+        
+        def text(idx: int) -> Optional[str]:
+            return None if idx == NONE else strings[idx]
+        
+        name, description, created_at = map(text, META.unpack_from(sections[b'META']))
+        
+        port_data = sections[b'PORT']
+        ports, _ = _from_bytes('H', port_data, 0, len(port_data) // 2)
+        
+        with _gc_paused():
+            devices = _load_devices(sections[b'DEVS'], strings, ports, trusted)
+        
+        policy = NetworkPolicy(name=name, description=description or "")
+        if created_at:
+            policy.created_at = datetime.fromisoformat(created_at)
+        
+        ref_data = sections[b'REFS']
+        refs, _ = _from_bytes('I', ref_data, 0, len(ref_data) // 4)
+        
+        count, zones = _unpack_table(zone_columns(version), sections[b'ZONE'])
+        for i in range(count):
+            start = zones['refs_start'][i]
+            position, size = zone_geometry(zones, i)
+            zone = SecurityZone(
+                name=text(zones['name'][i]),
+                zone_type=ZoneType(text(zones['zone_type'][i])),
+                description=text(zones['description'][i]) or "",
+                devices=[devices[ref] for ref in refs[start:start + zones['refs_count'][i]]],
+                color=text(zones['color'][i]),
+                position=position,
+                size=size
+            )
+            policy.zones[zone.name] = zone
+        
+        count, rules = _unpack_table(RULE_COLUMNS, sections[b'RULE'])
+        for i in range(count):
+            start = rules['ports_start'][i]
+            ports_count = rules['ports_count'][i]
+            policy.rules.append(SecurityRule(
+                source_zone=text(rules['source_zone'][i]),
+                destination_zone=text(rules['destination_zone'][i]),
+                action=ActionType(text(rules['action'][i])),
+                protocol=text(rules['protocol'][i]),
+                ports=None if ports_count < 0 else list(ports[start:start + ports_count]),
+                description=text(rules['description'][i]) or ""
+            ))
+    except (IndexError, KeyError, ValueError, struct.error) as e:
+        raise PolicyFormatError(f"Повреждённый файл политики: {e}") from e
+    
+    return policy
+
+@contextmanager
+def _gc_paused():
+    """
+    Отключить сборщик мусора на время создания устройств
+    
+    Десятки тысяч новых объектов многократно запускают сборку, которая
+    каждый раз обходит уже созданные устройства, хотя циклов среди них нет
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def _load_devices(data: memoryview, strings: list, ports: array, trusted: bool) -> List[NetworkDevice]:
+    """Создать устройства из секции DEVS"""
+    _count, table = _unpack_table(DEVICE_COLUMNS, data)
+    return devices_from_table(table, strings, ports, trusted)
+    
+def devices_from_table(table: Dict[str, Sequence[Any]], strings: Sequence[Optional[str]],
+                       ports: Sequence[int], trusted: bool) -> List[NetworkDevice]:
+    """
+    Создать устройства из столбцов DEVICE_COLUMNS
+    
+    Столбцы могут содержать только часть строк секции DEVS (ленивая
+    загрузка); strings и ports - любые последовательности с доступом по
+    индексу и срезу
+    """
+    # Столбцы разбираются целиком: списковые включения заметно быстрее,
+    # чем разбор каждого поля в цикле по устройствам
+    def texts(column: array) -> list:
+        return [None if idx == NONE else strings[idx] for idx in column]
+    
+    types = {idx: DeviceType(strings[idx]) for idx in set(table['device_type'])}
+    device_types = [types[idx] for idx in table['device_type']]
+    
+    port_sets: Dict[Tuple[int, int], tuple] = {}
+    open_ports = []
+    for key in zip(table['ports_start'], table['ports_count']):
+        ports_set = port_sets.get(key)
+        if ports_set is None:
+            start, length = key
+            if start + length > len(ports):
+                raise PolicyFormatError("Повреждённый файл политики: порты устройства")
+            ports_set = port_sets[key] = tuple(ports[start:start + length])
+        open_ports.append(ports_set)
+    
+    ip_kinds = table['ip_kind']
+    mac_kinds = table['mac_kind']
+    
+    if trusted:
+        # IPv4 - основной случай, остальные виды адресов редки
+        ips = [low if kind == IP_V4 else _ip_value(kind, low, high, strings)
+               for kind, low, high in zip(ip_kinds, table['ip_lo'], table['ip_hi'])]
+        macs = [value if kind == MAC_INT else _mac_value(kind, value, strings)
+                for kind, value in zip(mac_kinds, table['mac'])]
+        factory = NetworkDevice._from_columns
+    else:
+        ips = [_ip_text(kind, low, high, strings)
+               for kind, low, high in zip(ip_kinds, table['ip_lo'], table['ip_hi'])]
+        macs = [_mac_text(kind, value, strings) for kind, value in zip(mac_kinds, table['mac'])]
+        factory = _construct
+    
+    return factory(
+        ips, macs, texts(table['hostname']), device_types, texts(table['vendor']),
+        open_ports, texts(table['os_info']), table['risk_score'],
+        [bool(flag) for flag in table['is_gateway']]
+    )
+
+def _construct(*columns) -> List[NetworkDevice]:
+    """Создать устройства через конструктор, с полной проверкой"""
+    return [NetworkDevice(*values) for values in zip(*columns)]
+
+def save(policy: NetworkPolicy, filepath: PathLike):
+    """Сохранить политику в бинарный файл"""
+    Path(filepath).write_bytes(dumps(policy))
+
+def load(filepath: PathLike, trusted: bool = False) -> NetworkPolicy:
+    """Загрузить политику из бинарного файла"""
+    return loads(Path(filepath).read_bytes(), trusted=trusted)
+
+def is_binary_policy(filepath: PathLike) -> bool:
+    """Проверить по сигнатуре, что файл в бинарном формате"""
+    with open(filepath, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
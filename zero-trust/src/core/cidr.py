@@ -0,0 +1,77 @@
+"""
+Агрегация адресов зон в префиксы CIDR
+
+Зоны хранят адреса отдельных устройств, и генераторы по умолчанию
+выгружают их по одному. aggregate_addresses сворачивает список в
+минимальный набор префиксов (ipaddress.collapse_addresses), а при
+max_overcoverage > 0 дополнительно расширяет префиксы, если доля чужих
+адресов в расширенном префиксе не превышает заданной.
+"""
+
+import ipaddress
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Union
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+def _format_network(network: IPNetwork) -> str:
+    """Префикс строкой; префикс из одного адреса - просто адрес"""
+    if network.prefixlen == network.max_prefixlen:
+        return str(network.network_address)
+    return str(network)
+
+def _widen(networks: List[IPNetwork], max_overcoverage: float) -> List[IPNetwork]:
+    """
+    Расширить префиксы с допустимым перекрытием
+    
+    networks - отсортированные непересекающиеся префиксы одной версии.
+    Каждый префикс заменяется наибольшим надпрефиксом, который объединяет
+    его с другими префиксами и в котором адреса из networks составляют
+    не меньше (1 - max_overcoverage) адресов
+    """
+    starts = [int(network.network_address) for network in networks]
+    sizes = [0]
+    for network in networks:
+        sizes.append(sizes[-1] + network.num_addresses)
+    min_fill = 1.0 - max_overcoverage
+    
+    widened = []
+    for network in networks:
+        best = network
+        for prefixlen in range(network.prefixlen - 1, -1, -1):
+            supernet = network.supernet(new_prefix=prefixlen)
+            first = int(supernet.network_address)
+            # Префиксы либо вложены друг в друга, либо не пересекаются:
+            # покрытие надпрефикса - сумма размеров вложенных префиксов
+            lo = bisect_left(starts, first)
+            hi = bisect_right(starts, first + supernet.num_addresses - 1)
+            # Расширение, не объединяющее префиксы, только добавляет чужие адреса
+            if hi - lo > 1 and sizes[hi] - sizes[lo] >= min_fill * supernet.num_addresses:
+                best = supernet
+        widened.append(best)
+    
+    return list(ipaddress.collapse_addresses(widened))
+
+def aggregate_addresses(addresses: Iterable[str], max_overcoverage: float = 0.0) -> List[str]:
+    """
+    Свернуть адреса и префиксы в минимальный список префиксов CIDR
+    
+    Результат сортирован, сначала IPv4, затем IPv6. max_overcoverage -
+    допустимая доля адресов каждого итогового префикса, не входящих в
+    исходный список (0 - точная агрегация)
+    """
+    if not 0.0 <= max_overcoverage < 1.0:
+        raise ValueError("max_overcoverage должен быть в диапазоне [0, 1)")
+    
+    by_version: Dict[int, List[IPNetwork]] = {4: [], 6: []}
+    for address in addresses:
+        network = ipaddress.ip_network(address, strict=False)
+        by_version[network.version].append(network)
+    
+    result = []
+    for networks in by_version.values():
+        collapsed = list(ipaddress.collapse_addresses(networks))
+        if max_overcoverage > 0 and len(collapsed) > 1:
+            collapsed = _widen(collapsed, max_overcoverage)
+        result.extend(_format_network(network) for network in collapsed)
+    return result
@@ -41,3 +41,7 @@ class NetworkError(ZeroTrustError):
 class TemplateError(ZeroTrustError):
     """Ошибка шаблона"""
     pass
+
+class PolicyFormatError(ZeroTrustError):
+    """Ошибка формата файла политики"""
+    pass
@@ -2,34 +2,222 @@
 Генератор правил безопасности
 """
 
+import difflib
 import os
-from typing import List, Dict, Optional
-from jinja2 import Environment, FileSystemLoader
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Iterable, Iterator, List, Dict, Optional, Tuple
+from jinja2.environment import TemplateStream
 
-from .models import NetworkPolicy, SecurityRule, ActionType
+from . import binary_format
+from .cidr import aggregate_addresses
+from .constants import EXPORT_DIR
+from .models import NetworkPolicy, SecurityRule, SecurityZone, ActionType
+from .templates import get_environment
+
+# Максимальная длина имени набора ipset
+IPSET_NAME_MAX = 31
+
+# Максимальная длина имени цепочки iptables
+IPTABLES_CHAIN_MAX = 28
+
+# Размер набора ipset по умолчанию (maxelem)
+IPSET_MAXELEM = 65536
+
+# Число правил FORWARD перед правилами политики в iptables.j2
+# (одинаково для iptables и ip6tables)
+IPTABLES_FORWARD_PREFIX = 1
+
+# Подготовка цепочки FORWARD ip6tables в режиме ipset и завершающее ее правило
+IP6TABLES_FORWARD_SETUP = [
+    "ip6tables -F FORWARD",
+    "ip6tables -P FORWARD DROP",
+    "ip6tables -A FORWARD -m state --state ESTABLISHED,RELATED -j ACCEPT",
+]
+IP6TABLES_FORWARD_LOG = 'ip6tables -A FORWARD -j LOG --log-prefix "IP6TABLES-DROPPED: "'
+
+# Наибольшее число адресов в списке LocalAddress/RemoteAddress одного
+# правила Windows Firewall; длинные списки делятся на несколько правил
+WINDOWS_ADDRESS_CHUNK = 1000
+
+# Семейства ipset по версии IP
+IPSET_FAMILIES = {4: 'inet', 6: 'inet6'}
+
+# Разделы RouterOS по версиям IP
+MIKROTIK_FAMILIES = {4: '/ip', 6: '/ipv6'}
+
+# Список RouterOS со всеми адресами зон; дефис не встречается в именах
+# списков зон (см. _ipset_names), поэтому имена не совпадут
+MIKROTIK_ZONES_LIST = 'zt-zones'
+
+def _ipset_names(zone_names: Iterable[str], max_length: int = IPSET_NAME_MAX) -> Dict[str, str]:
+    """
+    Имена наборов ipset (и цепочек iptables) для зон
+    
+    ipset и iptables допускают короткие имена, поэтому имя зоны
+    приводится к латинице, цифрам и _, обрезается с запасом под суффиксы
+    и при совпадении получает номер
+    """
+    names = {}
+    used = set()
+    for zone_name in zone_names:
+        base = re.sub(r'[^A-Za-z0-9_]+', '_', zone_name).strip('_') or 'zone'
+        base = 'zt_' + base[:max_length - 10]
+        name, n = base, 1
+        while name.lower() in used:
+            n += 1
+            name = f"{base}_{n}"
+        used.add(name.lower())
+        names[zone_name] = name
+    return names
+
+def _address_version(address: str) -> int:
+    """Версия IP адреса или префикса в записи"""
+    return 6 if ':' in address else 4
+
+def _zone_ipset(name: str, addresses: List[str], version: int = 4) -> Dict:
+    """Описание набора ipset зоны для шаблона; в набор попадают адреса одной версии IP"""
+    entries = [address for address in addresses if _address_version(address) == version]
+    return {
+        'name': name,
+        'type': 'hash:net' if any('/' in entry for entry in entries) else 'hash:ip',
+        'family': IPSET_FAMILIES[version],
+        'maxelem': max(IPSET_MAXELEM, len(entries)),
+        'entries': entries
+    }
+
+# Типы адресов nftables по версии IP
+NFT_ADDRESS_TYPES = {4: 'ipv4_addr', 6: 'ipv6_addr'}
+
+# Выражения адресов nftables по версии IP
+NFT_ADDRESS_EXPRS = {4: 'ip', 6: 'ip6'}
+
+def _address_groups(zone_addresses: Dict[str, Dict[int, List[str]]], version: int) -> Dict[tuple, List[str]]:
+    """
+    Адреса версии version, сгруппированные по набору зон, в которые они входят
+    
+    Для адресов с одинаковым набором зон применимы одни и те же правила,
+    поэтому цепочки правил строятся по группам, а не по адресам
+    """
+    membership: Dict[str, List[str]] = {}
+    for zone_name, by_version in zone_addresses.items():
+        for address in by_version[version]:
+            zones = membership.setdefault(address, [])
+            if zone_name not in zones:
+                zones.append(zone_name)
+    
+    groups: Dict[tuple, List[str]] = {}
+    for address, zones in membership.items():
+        groups.setdefault(tuple(zones), []).append(address)
+    return groups
+
+# Платформы экспорта: шаблон, метод подготовки его данных и параметры метода
+PLATFORMS = {
+    'openwrt': ('openwrt.j2', '_openwrt_context', {}),
+    'iptables': ('iptables.j2', '_iptables_context', {}),
+    'iptables-ipset': ('iptables.j2', '_iptables_context', {'use_ipset': True}),
+    'iptables-restore': ('iptables_restore.j2', '_iptables_restore_context', {}),
+    'ip6tables-restore': ('iptables_restore.j2', '_iptables_restore_context', {'ip_version': 6}),
+    'nftables': ('nftables.j2', '_nftables_context', {}),
+    'windows': ('windows.ps1', '_windows_context', {}),
+    'windows-grouped': ('windows_grouped.ps1', '_windows_grouped_context', {}),
+    'mikrotik': ('mikrotik.j2', '_mikrotik_context', {}),
+}
+
+# Расширения файлов экспорта
+PLATFORM_EXTENSIONS = {
+    'openwrt': 'conf',
+    'iptables': 'sh',
+    'iptables-ipset': 'sh',
+    'iptables-restore': 'rules',
+    'ip6tables-restore': 'rules',
+    'nftables': 'nft',
+    'windows': 'ps1',
+    'windows-grouped': 'ps1',
+    'mikrotik': 'rsc',
+}
+
+# Платформы export_all по умолчанию
+DEFAULT_EXPORT_PLATFORMS = ('openwrt', 'iptables', 'nftables', 'windows')
+
+# Число частей шаблона, собираемых в одну запись при потоковом экспорте
+STREAM_BUFFER_SIZE = 256
+
+# Политика и генератор процесса-исполнителя export_all
+_worker_state: Dict[str, Any] = {}
+
+def _init_export_worker(data: bytes, template_dir: str, aggregate: bool, max_overcoverage: float):
+    """Запуск процесса-исполнителя: политика разбирается один раз на процесс"""
+    _worker_state['policy'] = binary_format.loads(data, trusted=True)
+    _worker_state['generator'] = PolicyGenerator(template_dir, aggregate, max_overcoverage)
+
+def _export_task(platform: str, output_file: str) -> Dict[str, Any]:
+    """Задача процесса-исполнителя: экспорт на одну платформу"""
+    return _timed_export(_worker_state['generator'], _worker_state['policy'], platform, output_file)
+
+def _timed_export(generator: 'PolicyGenerator', policy: NetworkPolicy,
+                  platform: str, output_file: str) -> Dict[str, Any]:
+    """Экспорт с замером времени и размера файла"""
+    start = time.perf_counter()
+    generator.export_policy(policy, platform, output_file)
+    return {
+        'file': output_file,
+        'seconds': time.perf_counter() - start,
+        'size': os.path.getsize(output_file)
+    }
+
+def _chunks(items: List[str], size: int) -> List[List[str]]:
+    """Список, разбитый на части не длиннее size"""
+    return [items[i:i + size] for i in range(0, len(items), size)]
 
 class PolicyGenerator:
-    """Генератор конфигураций для различных платформ"""
+    """
+    Генератор конфигураций для различных платформ
+    
+    С aggregate=True адреса зон перед выгрузкой сворачиваются в префиксы
+    CIDR; max_overcoverage разрешает префиксам покрывать долю адресов вне
+    зоны (см. cidr.aggregate_addresses)
+    """
     
-    def __init__(self, template_dir: str = "configs/templates"):
+    def __init__(self, template_dir: str = "configs/templates", aggregate: bool = False,
+                 max_overcoverage: float = 0.0):
         self.template_dir = template_dir
-        self.env = Environment(
-            loader=FileSystemLoader(template_dir),
-            trim_blocks=True,
-            lstrip_blocks=True
-        )
+        self.aggregate = aggregate
+        self.max_overcoverage = max_overcoverage
+        # Окружение общее для всех генераторов процесса (см. templates)
+        self.env = get_environment(template_dir)
+    
+    def _aggregate(self, addresses: List[str], exact: bool = False) -> List[str]:
+        """Свернуть адреса в префиксы, если агрегация включена"""
+        if not self.aggregate:
+            return addresses
+        return aggregate_addresses(addresses, 0.0 if exact else self.max_overcoverage)
+    
+    def _zone_addresses(self, zone: SecurityZone, version: Optional[int] = None) -> List[str]:
+        """Адреса (или префиксы) зоны для выгрузки; version ограничивает версию IP"""
+        addresses = [device.ip_address for device in zone.devices
+                     if version is None or device.ip_version == version]
+        return self._aggregate(addresses)
+    
+    def _policy_addresses(self, policy: NetworkPolicy) -> Dict[str, List[str]]:
+        """Адреса всех зон политики"""
+        return {name: self._zone_addresses(zone) for name, zone in policy.zones.items()}
     
     def generate_openwrt_config(self, policy: NetworkPolicy) -> str:
         """Генерация конфигурации для OpenWrt"""
         template = self.env.get_template('openwrt.j2')
+        return template.render(self._openwrt_context(policy))
         
+    def _openwrt_context(self, policy: NetworkPolicy) -> Dict:
+        """Данные шаблона openwrt.j2"""
         # Подготавливаем данные для шаблона
         zones = []
         for zone_name, zone in policy.zones.items():
             zones.append({
                 'name': zone_name,
                 'type': zone.zone_type.value,
-                'ips': zone.ip_list,
+                'ips': self._zone_addresses(zone),
                 'description': zone.description
             })
         
@@ -44,47 +232,101 @@ class PolicyGenerator:
                 'description': rule.description
             })
         
-        return template.render(
-            policy_name=policy.name,
-            zones=zones,
-            rules=rules
-        )
+        return {
+            'policy_name': policy.name,
+            'zones': zones,
+            'rules': rules
+        }
     
-    def generate_iptables_config(self, policy: NetworkPolicy) -> str:
-        """Генерация iptables правил"""
+    def generate_iptables_config(self, policy: NetworkPolicy, use_ipset: bool = False) -> str:
+        """
+        Генерация iptables правил
+        
+        По умолчанию правило зоны разворачивается в отдельную строку для
+        каждой пары IP-адресов источника и назначения. С use_ipset для
+        каждой зоны создается набор ipset, и правило политики дает одну
+        строку с -m set --match-set: число правил равно числу правил
+        политики, а проверка адреса - поиск в хэш-таблице. Адреса IPv6
+        попадают в наборы family inet6 (имя с суффиксом _v6), а правила
+        для них - в цепочку FORWARD ip6tables
+        """
         template = self.env.get_template('iptables.j2')
+        return template.render(self._iptables_context(policy, use_ipset))
         
-        # Формируем правила
-        iptables_rules = []
+    def _iptables_context(self, policy: NetworkPolicy, use_ipset: bool = False) -> Dict:
+        """Данные шаблона iptables.j2; правила создаются лениво, по мере вывода"""
+        ipsets = []
+        rules6 = []
+        addresses = self._policy_addresses(policy)
         
-        for rule in policy.rules:
-            source_zone = policy.zones.get(rule.source_zone)
-            dest_zone = policy.zones.get(rule.destination_zone)
+        if use_ipset:
+            set_names = _ipset_names(policy.zones)
+            ipsets = [_zone_ipset(set_names[name], entries) for name, entries in addresses.items()]
+            rules = (
+                self._create_iptables_rule(
+                    set_names[rule.source_zone], set_names[rule.destination_zone], rule,
+                    use_ipset=True
+                )
+                for rule in policy.rules
+                if rule.source_zone in set_names and rule.destination_zone in set_names
+            )
             
-            if source_zone and dest_zone:
-                for source_ip in source_zone.ip_list:
-                    for dest_ip in dest_zone.ip_list:
-                        rule_text = self._create_iptables_rule(
-                            source_ip, dest_ip, rule
-                        )
-                        iptables_rules.append(rule_text)
+            # Наборы IPv6 создаются только для зон с адресами IPv6
+            zones6 = [name for name, entries in addresses.items()
+                      if any(_address_version(entry) == 6 for entry in entries)]
+            ipsets.extend(_zone_ipset(f"{set_names[name]}_v6", addresses[name], 6) for name in zones6)
+            rules6 = [
+                self._create_iptables_rule(
+                    f"{set_names[rule.source_zone]}_v6", f"{set_names[rule.destination_zone]}_v6", rule,
+                    use_ipset=True, ip_version=6
+                )
+                for rule in policy.rules
+                if rule.source_zone in zones6 and rule.destination_zone in zones6
+            ]
+        else:
+            rules = self._iter_iptables_rules(policy, addresses)
+            
+        return {
+            'policy_name': policy.name,
+            'ipsets': ipsets,
+            'rules': rules,
+            'rules6': rules6,
+            'forward6_setup': IP6TABLES_FORWARD_SETUP,
+            'forward6_log': IP6TABLES_FORWARD_LOG
+        }
+                
+    def _iter_iptables_rules(self, policy: NetworkPolicy, addresses: Dict[str, List[str]]) -> Iterator[str]:
+        """Строки iptables для всех пар адресов зон каждого правила"""
+        for rule in policy.rules:
+            source_ips = addresses.get(rule.source_zone)
+            dest_ips = addresses.get(rule.destination_zone)
         
-        return template.render(
-            policy_name=policy.name,
-            rules=iptables_rules
-        )
+            if source_ips is not None and dest_ips is not None:
+                for source_ip in source_ips:
+                    for dest_ip in dest_ips:
+                        yield self._create_iptables_rule(source_ip, dest_ip, rule)
     
-    def _create_iptables_rule(self, src_ip: str, dst_ip: str, rule: SecurityRule) -> str:
-        """Создать одну строку iptables правила"""
-        parts = ["iptables -A FORWARD"]
+    def _create_iptables_rule(self, src_ip: str, dst_ip: str, rule: SecurityRule,
+                              use_ipset: bool = False, ip_version: int = 4) -> str:
+        """
+        Создать одну строку iptables правила (ip6tables для ip_version=6)
+        
+        С use_ipset src_ip и dst_ip - имена наборов ipset зон
+        """
+        parts = ["ip6tables -A FORWARD" if ip_version == 6 else "iptables -A FORWARD"]
         
         # Источник и назначение
-        parts.append(f"-s {src_ip}")
-        parts.append(f"-d {dst_ip}")
+        if use_ipset:
+            parts.append(f"-m set --match-set {src_ip} src")
+            parts.append(f"-m set --match-set {dst_ip} dst")
+        else:
+            parts.append(f"-s {src_ip}")
+            parts.append(f"-d {dst_ip}")
         
         # Протокол
         if rule.protocol != 'any':
-            parts.append(f"-p {rule.protocol}")
+            protocol = 'ipv6-icmp' if ip_version == 6 and rule.protocol == 'icmp' else rule.protocol
+            parts.append(f"-p {protocol}")
             if rule.ports and rule.protocol in ['tcp', 'udp']:
                 ports_str = ','.join(map(str, rule.ports))
                 parts.append(f"--dport {ports_str}")
@@ -102,50 +344,584 @@ class PolicyGenerator:
         
         return ' '.join(parts)
     
-    def generate_windows_firewall(self, policy: NetworkPolicy) -> str:
-        """Генерация PowerShell скрипта для Windows Firewall"""
+    def _ipset_state(self, policy: NetworkPolicy) -> Tuple[Dict[str, Dict], Dict[int, List[str]]]:
+        """
+        Наборы ipset и условия правил FORWARD выгрузки политики в режиме use_ipset
+        
+        Условия правил - по версиям IP: 4 для iptables, 6 для ip6tables
+        """
+        context = self._iptables_context(policy, use_ipset=True)
+        sets = {ipset['name']: ipset for ipset in context['ipsets']}
+        rules = {
+            4: [rule[len("iptables -A FORWARD "):] for rule in context['rules']],
+            6: [rule[len("ip6tables -A FORWARD "):] for rule in context['rules6']]
+        }
+        return sets, rules
+    
+    def generate_iptables_delta(self, old_policy: NetworkPolicy, new_policy: NetworkPolicy) -> str:
+        """
+        Разностный скрипт между двумя ревизиями политики
+        
+        Скрипт применяется поверх загруженной выгрузки old_policy в режиме
+        ipset (generate_iptables_config(..., use_ipset=True)) и приводит ее
+        к new_policy без сброса таблиц: добавляет и удаляет только
+        изменившиеся элементы наборов и правила FORWARD. Перенос
+        устройства между зонами дает две команды ipset. Если в old_policy
+        не было правил IPv6, цепочка FORWARD ip6tables подготавливается
+        так же, как в полной выгрузке
+        """
+        template = self.env.get_template('iptables_delta.j2')
+        old_sets, old_rules = self._ipset_state(old_policy)
+        new_sets, new_rules = self._ipset_state(new_policy)
+        
+        def options(ipset: Dict) -> str:
+            return f"{ipset['type']} family {ipset['family']} maxelem {ipset['maxelem']}"
+        
+        # Набор с другими параметрами пересоздается, а правила, которые на
+        # него ссылаются, удаляются до этого и добавляются заново после
+        recreated = [name for name, ipset in new_sets.items()
+                     if name in old_sets and options(old_sets[name]) != options(ipset)]
+        added = [name for name in new_sets if name not in old_sets]
+        removed = [name for name in old_sets if name not in new_sets]
+        
+        def refers(rule: str) -> bool:
+            return any(f"--match-set {name} " in rule for name in recreated)
+        
+        # Правила сравниваются как последовательности: после удаления
+        # оставшиеся правила идут в порядке новой ревизии, и вставка по
+        # возрастанию позиции восстанавливает новый порядок
+        deleted_rules = []
+        inserted_rules = []
+        for version, tool in ((4, 'iptables'), (6, 'ip6tables')):
+            old_chain, new_chain = old_rules[version], new_rules[version]
+            if version == 6 and new_chain and not old_chain:
+                inserted_rules.extend(IP6TABLES_FORWARD_SETUP + [IP6TABLES_FORWARD_LOG])
+            
+            matcher = difflib.SequenceMatcher(
+                None, [(rule, refers(rule)) for rule in old_chain], [(rule, False) for rule in new_chain],
+                autojunk=False
+            )
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                if tag in ('delete', 'replace'):
+                    deleted_rules.extend(f"{tool} -D FORWARD {rule}" for rule in old_chain[i1:i2])
+                if tag in ('insert', 'replace'):
+                    inserted_rules.extend(
+                        f"{tool} -I FORWARD {IPTABLES_FORWARD_PREFIX + j + 1} {new_chain[j]}"
+                        for j in range(j1, j2)
+                    )
+        
+        def fill(name: str) -> List[str]:
+            ipset = new_sets[name]
+            return [f"ipset create {name} {options(ipset)}"] + \
+                [f"ipset add {name} {entry}" for entry in ipset['entries']]
+        
+        member_added = []
+        member_removed = []
+        for name, ipset in new_sets.items():
+            if name in old_sets and name not in recreated:
+                old_entries = set(old_sets[name]['entries'])
+                new_entries = set(ipset['entries'])
+                member_added.extend(f"ipset add {name} {entry}"
+                                    for entry in ipset['entries'] if entry not in old_entries)
+                member_removed.extend(f"ipset del {name} {entry}"
+                                      for entry in old_sets[name]['entries'] if entry not in new_entries)
+        
+        # Порядок шагов: сначала все, что добавляет, затем правила, и в
+        # конце удаление элементов - устройство не теряет доступ при переносе
+        steps = [
+            ("New zone sets", [line for name in added for line in fill(name)]),
+            ("Zone membership additions", member_added),
+            ("Removed rules", deleted_rules),
+            ("Removed and recreated sets", [f"ipset destroy {name}" for name in removed + recreated] +
+             [line for name in recreated for line in fill(name)]),
+            ("New rules", inserted_rules),
+            ("Zone membership removals", member_removed),
+        ]
+        steps = [(title, commands) for title, commands in steps if commands]
+        
+        return template.render(
+            policy_name=new_policy.name,
+            steps=steps,
+            changes=sum(len(commands) for _, commands in steps)
+        )
+    
+    def generate_iptables_restore(self, policy: NetworkPolicy, ip_version: int = 4,
+                                  use_ipset: bool = False) -> str:
+        """
+        Генерация входных данных iptables-restore (ip6tables-restore для ip_version=6)
+        
+        Таблица filter загружается целиком и применяется одной транзакцией
+        при COMMIT. Для каждой зоны-источника создается своя цепочка:
+        FORWARD переходит в нее по адресу источника, а в цепочке правила
+        проверяют только адрес назначения. С use_ipset адреса сравниваются
+        с наборами ipset, которые перед загрузкой создаются из
+        generate_ipset_restore
+        """
+        template = self.env.get_template('iptables_restore.j2')
+        return template.render(self._iptables_restore_context(policy, ip_version, use_ipset))
+    
+    def _iptables_restore_context(self, policy: NetworkPolicy, ip_version: int = 4,
+                                  use_ipset: bool = False) -> Dict:
+        """Данные шаблона iptables_restore.j2; строки правил создаются лениво"""
+        set_names = _ipset_names(policy.zones)
+        chain_names = _ipset_names(policy.zones, IPTABLES_CHAIN_MAX)
+        suffix = '_v6' if ip_version == 6 else ''
+        
+        # Зоны-источники в порядке первого правила
+        source_zones = []
+        for rule in policy.rules:
+            if (rule.source_zone in policy.zones and rule.destination_zone in policy.zones
+                    and rule.source_zone not in source_zones):
+                source_zones.append(rule.source_zone)
+        
+        # Условия на адрес источника и назначения для каждой зоны
+        if use_ipset:
+            sources = {name: [f"-m set --match-set {set_names[name]}{suffix} src"] for name in policy.zones}
+            dests = {name: [f"-m set --match-set {set_names[name]}{suffix} dst"] for name in policy.zones}
+        else:
+            addresses = {name: self._zone_addresses(zone, ip_version) for name, zone in policy.zones.items()}
+            sources = {name: [f"-s {address}" for address in entries] for name, entries in addresses.items()}
+            dests = {name: [f"-d {address}" for address in entries] for name, entries in addresses.items()}
+            
+        dispatch = (
+            f"-A FORWARD {match} -j {chain_names[zone_name]}"
+            for zone_name in source_zones for match in sources[zone_name]
+        )
+        rules = (
+            self._create_restore_rule(chain_names[zone_name], match, rule, ip_version)
+            for zone_name in source_zones
+            for rule in policy.rules
+            if rule.source_zone == zone_name and rule.destination_zone in policy.zones
+            for match in dests[rule.destination_zone]
+        )
+        
+        return {
+            'policy_name': policy.name,
+            'tool': 'ip6tables' if ip_version == 6 else 'iptables',
+            'chains': [chain_names[name] for name in source_zones],
+            'dispatch': dispatch,
+            'rules': rules
+        }
+    
+    def _create_restore_rule(self, chain: str, dest_match: str, rule: SecurityRule,
+                             ip_version: int = 4) -> str:
+        """Создать одну строку правила iptables-restore в цепочке зоны"""
+        parts = [f"-A {chain}", dest_match]
+        
+        # Протокол
+        if rule.protocol != 'any':
+            protocol = 'ipv6-icmp' if ip_version == 6 and rule.protocol == 'icmp' else rule.protocol
+            parts.append(f"-p {protocol}")
+            if rule.ports and rule.protocol in ['tcp', 'udp']:
+                if len(rule.ports) > 1:
+                    parts.append(f"-m multiport --dports {','.join(map(str, rule.ports))}")
+                else:
+                    parts.append(f"--dport {rule.ports[0]}")
+        
+        # Комментарий
+        if rule.description:
+            comment = rule.description.replace('"', "'")
+            parts.append(f"-m comment --comment \"{comment}\"")
+        
+        # Действие
+        action_map = {
+            'allow': 'ACCEPT',
+            'deny': 'DROP'
+        }
+        parts.append(f"-j {action_map.get(rule.action.value, 'DROP')}")
+        
+        return ' '.join(parts)
+    
+    def generate_ipset_restore(self, policy: NetworkPolicy, ip_version: int = 4) -> str:
+        """
+        Входные данные ipset restore с наборами зон для generate_iptables_restore
+        
+        Применяется командой ipset -exist restore: существующие наборы
+        очищаются и заполняются заново
+        """
+        set_names = _ipset_names(policy.zones)
+        suffix = '_v6' if ip_version == 6 else ''
+        
+        lines = []
+        for zone_name, zone in policy.zones.items():
+            ipset = _zone_ipset(set_names[zone_name] + suffix, self._zone_addresses(zone, ip_version),
+                                ip_version)
+            lines.append(f"create {ipset['name']} {ipset['type']} family {ipset['family']} "
+                         f"maxelem {ipset['maxelem']}")
+            lines.append(f"flush {ipset['name']}")
+            lines.extend(f"add {ipset['name']} {entry}" for entry in ipset['entries'])
+        
+        return '\n'.join(lines) + '\n'
+    
+    def generate_nftables_config(self, policy: NetworkPolicy) -> str:
+        """
+        Генерация набора правил nftables для загрузки через nft -f
+        
+        Членство в зонах выгружается именованными наборами. Карта
+        вердиктов ip saddr vmap (одна на семейство адресов) переводит пакет
+        в цепочку правил зон его источника, где адрес назначения
+        проверяется поиском в наборе зоны (ip daddr @набор). Размер правил
+        растет линейно с числом адресов и правил, а не с числом пар
+        адресов. Таблица пересоздается в одной транзакции, поэтому
+        политика применяется атомарно
+        """
+        template = self.env.get_template('nftables.j2')
+        return template.render(self._nftables_context(policy))
+    
+    def _nftables_context(self, policy: NetworkPolicy) -> Dict:
+        """Данные шаблона nftables.j2; элементы карт создаются лениво"""
+        names = _ipset_names(policy.zones)
+        
+        # Наборы адресов зон по семействам
+        zone_addresses: Dict[str, Dict[int, List[str]]] = {}
+        sets = []
+        for zone_name, zone in policy.zones.items():
+            by_version: Dict[int, List[str]] = {4: [], 6: []}
+            for device in zone.devices:
+                by_version[device.ip_version].append(device.ip_address)
+            zone_addresses[zone_name] = by_version
+            
+            for version, entries in by_version.items():
+                entries = self._aggregate(entries)
+                if entries:
+                    sets.append({
+                        'name': f"{names[zone_name]}_v{version}",
+                        'type': NFT_ADDRESS_TYPES[version],
+                        'interval': any('/' in entry for entry in entries),
+                        'entries': entries
+                    })
+        
+        # Цепочка на каждый набор правил источника; адрес, входящий в
+        # несколько зон, получает правила всех своих зон в порядке политики
+        chains: Dict[tuple, Dict] = {}
+        maps = []
+        for version, address_type in NFT_ADDRESS_TYPES.items():
+            expr = NFT_ADDRESS_EXPRS[version]
+            # Группы адресов не пересекаются, и их префиксы в карте тоже:
+            # поэтому группы агрегируются точно, без перекрытия
+            groups = {zones: self._aggregate(group, exact=True)
+                      for zones, group in _address_groups(zone_addresses, version).items()}
+            sources = []
+            
+            for source_zones, source_addresses in groups.items():
+                # Правила, у которых есть набор назначения этого семейства
+                rule_ids = tuple(
+                    i for i, rule in enumerate(policy.rules)
+                    if rule.source_zone in source_zones and zone_addresses.get(rule.destination_zone, {}).get(version)
+                )
+                if not rule_ids:
+                    continue
+                    
+                chain = chains.get((version, rule_ids))
+                if chain is None:
+                    chain = chains[(version, rule_ids)] = {
+                        'name': self._nft_chain_name(policy, rule_ids, names, len(chains), version),
+                        'rules': [
+                            f"{expr} daddr @{names[policy.rules[i].destination_zone]}_v{version} "
+                            f"{self._create_nft_rule(policy.rules[i], version)}"
+                            for i in rule_ids
+                        ]
+                    }
+                sources.append((source_addresses, chain['name']))
+                    
+            if sources:
+                maps.append({
+                    'name': f"zone_sources_v{version}",
+                    'type': address_type,
+                    'expr': expr,
+                    'interval': any('/' in address for addresses, _ in sources for address in addresses),
+                    'elements': self._iter_nft_elements(sources)
+                })
+        
+        return {
+            'policy_name': policy.name,
+            'sets': sets,
+            'maps': maps,
+            'chains': list(chains.values())
+        }
+    
+    def _iter_nft_elements(self, sources: List[tuple]) -> Iterator[str]:
+        """Элементы карты вердиктов: адрес источника и переход в цепочку его правил"""
+        for source_addresses, chain_name in sources:
+            verdict = f" : jump {chain_name}"
+            for source in source_addresses:
+                yield f"{source}{verdict}"
+    
+    def _nft_chain_name(self, policy: NetworkPolicy, rule_ids: tuple,
+                        names: Dict[str, str], number: int, version: int = 4) -> str:
+        """Имя цепочки правил: по зоне источника или порядковое для пересекающихся зон"""
+        sources = {policy.rules[i].source_zone for i in rule_ids}
+        if len(sources) == 1:
+            return f"{names[sources.pop()]}_out_v{version}"
+        return f"zt_overlap_{number}_v{version}"
+    
+    def _create_nft_rule(self, rule: SecurityRule, ip_version: int = 4) -> str:
+        """Создать одно правило nftables внутри цепочки пары зон (семейства ip_version)"""
+        parts = []
+        
+        # Протокол и порты
+        if rule.protocol != 'any':
+            if rule.ports and rule.protocol in ['tcp', 'udp']:
+                ports_str = ', '.join(map(str, rule.ports))
+                parts.append(f"{rule.protocol} dport {{ {ports_str} }}")
+            else:
+                # ICMP в цепочках IPv6 - это ICMPv6
+                protocol = 'ipv6-icmp' if ip_version == 6 and rule.protocol == 'icmp' else rule.protocol
+                parts.append(f"meta l4proto {protocol}")
+        
+        # Действие
+        action_map = {
+            'allow': 'accept',
+            'deny': 'drop'
+        }
+        parts.append(action_map.get(rule.action.value, 'drop'))
+        
+        # Комментарий
+        if rule.description:
+            comment = rule.description.replace('"', "'")
+            parts.append(f"comment \"{comment}\"")
+        
+        return ' '.join(parts)
+    
+    def generate_windows_firewall(self, policy: NetworkPolicy, grouped: bool = False) -> str:
+        """
+        Генерация PowerShell скрипта для Windows Firewall
+        
+        По умолчанию создается правило на каждую пару адресов. С grouped
+        правило политики дает одно правило New-NetFirewallRule со списками
+        LocalAddress и RemoteAddress (по WINDOWS_ADDRESS_CHUNK адресов;
+        более длинные списки делятся на несколько правил)
+        """
+        if grouped:
+            template = self.env.get_template('windows_grouped.ps1')
+            return template.render(self._windows_grouped_context(policy))
         template = self.env.get_template('windows.ps1')
+        return template.render(self._windows_context(policy))
         
-        # Подготавливаем правила
-        firewall_rules = []
+    def _windows_context(self, policy: NetworkPolicy) -> Dict:
+        """Данные шаблона windows.ps1; правила создаются лениво"""
+        return {
+            'policy_name': policy.name,
+            'rules': self._iter_windows_rules(policy, self._policy_addresses(policy))
+        }
         
+    def _iter_windows_rules(self, policy: NetworkPolicy, addresses: Dict[str, List[str]]) -> Iterator[Dict]:
+        """Правила Windows Firewall для всех пар адресов зон"""
         for rule in policy.rules:
-            source_zone = policy.zones.get(rule.source_zone)
-            dest_zone = policy.zones.get(rule.destination_zone)
+            source_ips = addresses.get(rule.source_zone)
+            dest_ips = addresses.get(rule.destination_zone)
             
-            if source_zone and dest_zone:
-                for source_ip in source_zone.ip_list:
-                    for dest_ip in dest_zone.ip_list:
-                        firewall_rules.append({
+            if source_ips is not None and dest_ips is not None:
+                for source_ip in source_ips:
+                    for dest_ip in dest_ips:
+                        yield {
                             'source_ip': source_ip,
                             'dest_ip': dest_ip,
                             'action': rule.action.value,
                             'protocol': rule.protocol.upper() if rule.protocol != 'any' else 'ANY',
                             'ports': rule.ports,
                             'description': rule.description
-                        })
+                        }
         
-        return template.render(
-            policy_name=policy.name,
-            rules=firewall_rules
-        )
+    def _windows_grouped_context(self, policy: NetworkPolicy) -> Dict:
+        """Данные шаблона windows_grouped.ps1"""
+        addresses = self._policy_addresses(policy)
+        protocol_map = {
+            'tcp': 'TCP',
+            'udp': 'UDP',
+            'icmp': 'ICMPv4',
+            'any': 'Any'
+        }
+        action_map = {
+            'allow': 'Allow',
+            'deny': 'Block'
+        }
+        
+        firewall_rules = []
+        for index, rule in enumerate(policy.rules, 1):
+            source_ips = addresses.get(rule.source_zone)
+            dest_ips = addresses.get(rule.destination_zone)
+            if not source_ips or not dest_ips:
+                continue
+            
+            source_chunks = _chunks(source_ips, WINDOWS_ADDRESS_CHUNK)
+            dest_chunks = _chunks(dest_ips, WINDOWS_ADDRESS_CHUNK)
+            name = re.sub(r'[^\w.-]+', '_', f"ZTI_{index}_{rule.source_zone}_to_{rule.destination_zone}")
+            protocol = protocol_map.get(rule.protocol, rule.protocol.upper())
+            
+            for source_part, local in enumerate(source_chunks, 1):
+                for dest_part, remote in enumerate(dest_chunks, 1):
+                    part = f"_{source_part}_{dest_part}" if len(source_chunks) * len(dest_chunks) > 1 else ""
+                    firewall_rules.append({
+                        'name': name + part,
+                        'description': rule.description.replace('"', "'"),
+                        'action': action_map.get(rule.action.value, 'Block'),
+                        'protocol': protocol,
+                        'ports': rule.ports if rule.protocol in ['tcp', 'udp'] else None,
+                        'local': local,
+                        'remote': remote
+                    })
+        
+        return {
+            'policy_name': policy.name,
+            'rules': firewall_rules
+        }
+        
+    def generate_mikrotik_config(self, policy: NetworkPolicy, fasttrack: bool = True) -> str:
+        """
+        Генерация скрипта RouterOS для MikroTik
+        
+        Зоны выгружаются списками /ip firewall address-list, правило
+        политики - одно правило цепочки forward с src-address-list и
+        dst-address-list. Правила вставляются в начало цепочки forward,
+        перед уже существующими: сначала пропуск установленных соединений
+        (с fasttrack - в обход firewall), поэтому правила зон проверяются
+        только для новых соединений, а последним - запрет остального
+        трафика между адресами зон
+        """
+        template = self.env.get_template('mikrotik.j2')
+        return template.render(self._mikrotik_context(policy, fasttrack))
     
-    def export_policy(self, policy: NetworkPolicy, platform: str, output_file: str):
-        """Экспорт политики в файл"""
-        if platform.lower() == 'openwrt':
-            config = self.generate_openwrt_config(policy)
-        elif platform.lower() == 'iptables':
-            config = self.generate_iptables_config(policy)
-        elif platform.lower() == 'windows':
-            config = self.generate_windows_firewall(policy)
-        else:
+    def _mikrotik_context(self, policy: NetworkPolicy, fasttrack: bool = True) -> Dict:
+        """Данные шаблона mikrotik.j2"""
+        names = _ipset_names(policy.zones)
+        
+        families = []
+        for version, path in MIKROTIK_FAMILIES.items():
+            addresses = {zone_name: self._zone_addresses(zone, version)
+                         for zone_name, zone in policy.zones.items()}
+            lists = [{'name': names[zone_name], 'addresses': entries}
+                     for zone_name, entries in addresses.items() if entries]
+            if not lists:
+                continue
+            
+            # Все адреса зон без повторов - для запрета по умолчанию
+            zone_ips = [device.ip_address for zone in policy.zones.values()
+                        for device in zone.devices if device.ip_version == version]
+            lists.append({
+                'name': MIKROTIK_ZONES_LIST,
+                'addresses': self._aggregate(list(dict.fromkeys(zone_ips)), exact=True)
+            })
+            
+            # Правила цепочки forward в порядке проверки
+            forward = []
+            # FastTrack для IPv6 есть не во всех версиях RouterOS
+            if fasttrack and version == 4:
+                forward.append('action=fasttrack-connection connection-state=established,related '
+                               'comment="ZTI: fast-path"')
+            forward.append('action=accept connection-state=established,related comment="ZTI: established"')
+            forward.append('action=drop connection-state=invalid comment="ZTI: invalid"')
+            forward.extend(
+                self._create_mikrotik_rule(rule, names[rule.source_zone], names[rule.destination_zone], version)
+                for rule in policy.rules
+                if addresses.get(rule.source_zone) and addresses.get(rule.destination_zone)
+            )
+            forward.append(f'action=drop src-address-list={MIKROTIK_ZONES_LIST} '
+                           f'dst-address-list={MIKROTIK_ZONES_LIST} comment="ZTI: default deny"')
+            
+            families.append({
+                'path': path,
+                'lists': lists,
+                'forward': forward
+            })
+        
+        return {
+            'policy_name': policy.name,
+            'families': families
+        }
+    
+    def _create_mikrotik_rule(self, rule: SecurityRule, source_list: str, dest_list: str,
+                              version: int = 4) -> str:
+        """Параметры команды add правила цепочки forward"""
+        action = 'accept' if rule.action == ActionType.ALLOW else 'drop'
+        parts = [f"action={action}", f"src-address-list={source_list}", f"dst-address-list={dest_list}"]
+        
+        if rule.protocol == 'icmp':
+            parts.append("protocol=icmpv6" if version == 6 else "protocol=icmp")
+        elif rule.protocol not in ['any', 'all']:
+            parts.append(f"protocol={rule.protocol}")
+            if rule.ports and rule.protocol in ['tcp', 'udp']:
+                parts.append(f"dst-port={','.join(map(str, rule.ports))}")
+        
+        description = rule.description or f"{rule.source_zone} to {rule.destination_zone}"
+        description = description.replace('"', "'")
+        parts.append(f'comment="ZTI: {description}"')
+        return " ".join(parts)
+    
+    def stream_config(self, policy: NetworkPolicy, platform: str) -> TemplateStream:
+        """
+        Конфигурация платформы потоком частей, без сборки строки целиком
+        
+        platform - ключ PLATFORMS
+        """
+        try:
+            template_name, context_method, options = PLATFORMS[platform.lower()]
+        except KeyError:
             raise ValueError(f"Unsupported platform: {platform}")
         
+        context = getattr(self, context_method)(policy, **options)
+        stream = self.env.get_template(template_name).stream(context)
+        stream.enable_buffering(STREAM_BUFFER_SIZE)
+        return stream
+    
+    def export_policy(self, policy: NetworkPolicy, platform: str, output_file: str):
+        """
+        Экспорт политики в файл
+        
+        Конфигурация пишется в файл по частям, по мере создания правил,
+        поэтому память не растет с их числом. Запись идет во временный
+        файл рядом, который затем атомарно заменяет прежний
+        """
+        stream = self.stream_config(policy, platform)
+        
         # Создаем директорию, если не существует
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        directory = os.path.dirname(output_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
         
         # Сохраняем конфигурацию
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(config)
+        temp_file = f"{output_file}.tmp"
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                stream.dump(f)
+            os.replace(temp_file, output_file)
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+        
+        return output_file
+    
+    def export_all(self, policy: NetworkPolicy, platforms: Optional[Iterable[str]] = None,
+                   out_dir: str = EXPORT_DIR, max_workers: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Экспорт политики на несколько платформ параллельно
+        
+        Каждая платформа рендерится в отдельном процессе. Политика
+        сериализуется один раз (бинарный формат) и передается процессам
+        при запуске, а не с каждой задачей. Файлы называются
+        <платформа>.<расширение> в out_dir. Возвращает для каждой
+        платформы путь к файлу ('file'), время экспорта в секундах
+        ('seconds') и размер файла в байтах ('size')
+        """
+        platforms = [platform.lower() for platform in (platforms or DEFAULT_EXPORT_PLATFORMS)]
+        unknown = [platform for platform in platforms if platform not in PLATFORMS]
+        if unknown:
+            raise ValueError(f"Unsupported platform: {', '.join(unknown)}")
+        
+        files = {platform: os.path.join(out_dir, f"{platform}.{PLATFORM_EXTENSIONS[platform]}")
+                 for platform in platforms}
+        
+        # Одна платформа или один процесс: пул только добавил бы запуск процессов
+        workers = min(max_workers or os.cpu_count() or 1, len(platforms))
+        if workers <= 1:
+            return {platform: _timed_export(self, policy, platform, files[platform])
+                    for platform in platforms}
         
-        return output_file
\ No newline at end of file
+        data = binary_format.dumps(policy)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_export_worker,
+                                 initargs=(data, self.template_dir, self.aggregate,
+                                           self.max_overcoverage)) as pool:
+            futures = {platform: pool.submit(_export_task, platform, files[platform])
+                       for platform in platforms}
+            return {platform: future.result() for platform, future in futures.items()}
\ No newline at end of file
@@ -0,0 +1,337 @@
+"""
+Столбцовое представление инвентаря устройств для аналитики
+
+DeviceInventory хранит поля устройств параллельными массивами (array) и
+строит битовые индексы: для каждого порта, типа, производителя, зоны и
+диапазона риска - целое число, в котором бит i означает строку i.
+Фильтры возвращают такие маски, их можно комбинировать операторами
+& | ~, а подсчеты сводятся к битовым операциям над длинными целыми,
+которые выполняются в C, без обхода объектов NetworkDevice.
+"""
+
+import ipaddress
+from array import array
+from itertools import compress
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from .models import NetworkDevice, NetworkPolicy, DeviceType
+
+# Число интервалов гистограммы риска (риск в диапазоне 0..1)
+RISK_BINS = 10
+
+# Значение OUI для устройств без MAC-адреса
+NO_OUI = 0xFFFFFFFF
+
+DEVICE_TYPES = list(DeviceType)
+_TYPE_CODES = {device_type: code for code, device_type in enumerate(DEVICE_TYPES)}
+
+_FLAG_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+_DIGIT_FLAGS = bytes.maketrans(b'01', b'\x00\x01')
+
+Mask = int
+
+try:
+    _popcount = int.bit_count
+except AttributeError:  # Python 3.9
+    def _popcount(mask: int) -> int:
+        return bin(mask).count('1')
+
+def _mask_from_flags(flags: bytes) -> Mask:
+    """Маска из байтов 0/1, по байту на строку"""
+    return int(flags.translate(_FLAG_DIGITS)[::-1] or b'0', 2)
+
+def _mask_from_rows(rows: Iterable[int], size: int) -> Mask:
+    """Маска из номеров строк"""
+    buffer = bytearray((size + 7) >> 3)
+    for row in rows:
+        buffer[row >> 3] |= 1 << (row & 7)
+    return int.from_bytes(buffer, 'little')
+
+def _rows(mask: Mask) -> Iterable[int]:
+    """Номера строк, отмеченных в маске, по возрастанию"""
+    bits = bin(mask)[:1:-1].encode('ascii').translate(_DIGIT_FLAGS)
+    return compress(range(len(bits)), bits)
+
+def _risk_bin(risk: float) -> int:
+    return min(max(int(risk * RISK_BINS), 0), RISK_BINS - 1)
+
+class DeviceInventory:
+    """
+    Столбцовый инвентарь устройств
+    
+    Источник - список устройств или политика (тогда доступны и зоны).
+    sync() приводит инвентарь в соответствие с источником: новые
+    устройства добавляются, исчезнувшие удаляются, измененные
+    переиндексируются; остальные строки не трогаются.
+    """
+    
+    def __init__(self, source: Union[NetworkPolicy, Iterable[NetworkDevice]]):
+        self.source = source
+        self._build(self._source_devices())
+    
+    def _source_devices(self) -> List[NetworkDevice]:
+        if isinstance(self.source, NetworkPolicy):
+            return self.source.unique_devices()
+        return list(self.source)
+    
+    def _build(self, devices: List[NetworkDevice]):
+        """Построить столбцы и индексы с нуля"""
+        self._devices: List[Optional[NetworkDevice]] = list(devices)
+        self._row_of: Dict[int, int] = {id(device): row for row, device in enumerate(devices)}
+        self._keys: List[Optional[tuple]] = [device._key() for device in devices]
+        
+        self.ip = array('Q', [0] * len(devices))
+        self.ip_version = array('B', [0] * len(devices))
+        self.oui = array('I', [NO_OUI] * len(devices))
+        self.device_type = array('B', [0] * len(devices))
+        self.risk = array('d', [0.0] * len(devices))
+        self.is_gateway = array('B', [0] * len(devices))
+        self.vendor: List[Optional[str]] = [None] * len(devices)
+        self.ports: List[tuple] = [()] * len(devices)
+        
+        by_port: Dict[int, List[int]] = {}
+        by_type: Dict[DeviceType, List[int]] = {}
+        by_vendor: Dict[Optional[str], List[int]] = {}
+        by_risk: Dict[int, List[int]] = {}
+        gateways = []
+        
+        for row, device in enumerate(devices):
+            self._fill_row(row, device)
+            for port in device.open_ports:
+                by_port.setdefault(port, []).append(row)
+            by_type.setdefault(device.device_type, []).append(row)
+            by_vendor.setdefault(device.vendor, []).append(row)
+            by_risk.setdefault(_risk_bin(device.risk_score), []).append(row)
+            if device.is_gateway:
+                gateways.append(row)
+        
+        size = len(devices)
+        self._by_port = {key: _mask_from_rows(rows, size) for key, rows in by_port.items()}
+        self._by_type = {key: _mask_from_rows(rows, size) for key, rows in by_type.items()}
+        self._by_vendor = {key: _mask_from_rows(rows, size) for key, rows in by_vendor.items()}
+        self._by_risk = {key: _mask_from_rows(rows, size) for key, rows in by_risk.items()}
+        self._gateways = _mask_from_rows(gateways, size)
+        self._alive = (1 << size) - 1
+        self._dead = 0
+        
+        self._index_zones()
+    
+    def _fill_row(self, row: int, device: NetworkDevice):
+        """Записать значения столбцов строки"""
+        version = device.ip_version
+        self.ip_version[row] = version
+        self.ip[row] = device.ip_int if version == 4 else 0
+        
+        mac = device._mac
+        self.oui[row] = mac >> 24 if mac.__class__ is int else NO_OUI
+        
+        self.device_type[row] = _TYPE_CODES[device.device_type]
+        self.risk[row] = device.risk_score
+        self.is_gateway[row] = 1 if device.is_gateway else 0
+        self.vendor[row] = device.vendor
+        self.ports[row] = device.open_ports
+    
+    def _index_zones(self):
+        """Маски зон; зон немного, поэтому они всегда строятся заново"""
+        self._by_zone: Dict[str, Mask] = {}
+        if not isinstance(self.source, NetworkPolicy):
+            return
+        
+        row_of = self._row_of
+        size = len(self._devices)
+        for name, zone in self.source.zones.items():
+            self._by_zone[name] = _mask_from_rows(
+                (row_of[id(device)] for device in zone.devices if id(device) in row_of), size
+            )
+    
+    def _index_row(self, row: int, add: bool):
+        """Установить или снять бит строки во всех индексах по значениям столбцов"""
+        bit = 1 << row
+        
+        def update(index: Dict[Any, Mask], key: Any):
+            mask = index.get(key, 0)
+            mask = mask | bit if add else mask & ~bit
+            if mask:
+                index[key] = mask
+            else:
+                index.pop(key, None)
+        
+        for port in self.ports[row]:
+            update(self._by_port, port)
+        update(self._by_type, DEVICE_TYPES[self.device_type[row]])
+        update(self._by_vendor, self.vendor[row])
+        update(self._by_risk, _risk_bin(self.risk[row]))
+        
+        if add and self.is_gateway[row]:
+            self._gateways |= bit
+        else:
+            self._gateways &= ~bit
+    
+    def sync(self) -> bool:
+        """
+        Обновить инвентарь по источнику
+        
+        Возвращает True, если что-то изменилось
+        """
+        devices = self._source_devices()
+        current = {id(device) for device in devices}
+        changed = False
+        
+        # Удаленные устройства: строка остается пустой до перестроения
+        for device_id, row in list(self._row_of.items()):
+            if device_id not in current:
+                self._index_row(row, add=False)
+                del self._row_of[device_id]
+                self._devices[row] = None
+                self._keys[row] = None
+                self._alive &= ~(1 << row)
+                self._dead += 1
+                changed = True
+        
+        if self._dead > len(self._row_of):
+            self._build(devices)
+            return True
+        
+        for device in devices:
+            row = self._row_of.get(id(device))
+            if row is None:
+                row = len(self._devices)
+                self._devices.append(device)
+                self._keys.append(device._key())
+                self._row_of[id(device)] = row
+                for column, empty in ((self.ip, 0), (self.ip_version, 0), (self.oui, NO_OUI),
+                                      (self.device_type, 0), (self.risk, 0.0), (self.is_gateway, 0)):
+                    column.append(empty)
+                self.vendor.append(None)
+                self.ports.append(())
+                self._alive |= 1 << row
+            elif self._keys[row] != device._key():
+                self._index_row(row, add=False)
+                self._keys[row] = device._key()
+            else:
+                continue
+            
+            self._fill_row(row, device)
+            self._index_row(row, add=True)
+            changed = True
+        
+        self._index_zones()
+        return changed
+    
+    def __len__(self) -> int:
+        return len(self._row_of)
+    
+    # Фильтры: возвращают маски строк
+    
+    def all(self) -> Mask:
+        """Все устройства"""
+        return self._alive
+    
+    def with_port(self, *ports: int) -> Mask:
+        """Устройства, у которых открыт хотя бы один из портов"""
+        mask = 0
+        for port in ports:
+            mask |= self._by_port.get(port, 0)
+        return mask
+    
+    def of_type(self, *device_types: DeviceType) -> Mask:
+        """Устройства указанных типов"""
+        mask = 0
+        for device_type in device_types:
+            mask |= self._by_type.get(device_type, 0)
+        return mask
+    
+    def from_vendor(self, *vendors: Optional[str]) -> Mask:
+        """Устройства указанных производителей"""
+        mask = 0
+        for vendor in vendors:
+            mask |= self._by_vendor.get(vendor, 0)
+        return mask
+    
+    def in_zone(self, *zone_names: str) -> Mask:
+        """Устройства указанных зон"""
+        mask = 0
+        for name in zone_names:
+            mask |= self._by_zone.get(name, 0)
+        return mask
+    
+    def gateways(self) -> Mask:
+        """Шлюзы"""
+        return self._gateways
+    
+    def risk_at_least(self, threshold: float) -> Mask:
+        """Устройства с риском не ниже порога"""
+        return _mask_from_flags(bytes(risk >= threshold for risk in self.risk)) & self._alive
+    
+    def in_network(self, network: str) -> Mask:
+        """Устройства из сети IPv4 в нотации CIDR"""
+        net = ipaddress.IPv4Network(network, strict=False)
+        first = int(net.network_address)
+        last = int(net.broadcast_address)
+        flags = bytes(version == 4 and first <= ip <= last
+                      for ip, version in zip(self.ip, self.ip_version))
+        return _mask_from_flags(flags) & self._alive
+    
+    def with_oui(self, prefix: str) -> Mask:
+        """Устройства с MAC-адресом из блока OUI (например, 00:1B:A9)"""
+        oui = int(prefix.replace(':', '').replace('-', ''), 16)
+        return _mask_from_flags(bytes(value == oui for value in self.oui)) & self._alive
+    
+    # Агрегаты
+    
+    def count(self, mask: Optional[Mask] = None) -> int:
+        """Число устройств в маске"""
+        return _popcount(self._alive if mask is None else mask & self._alive)
+    
+    def devices(self, mask: Optional[Mask] = None) -> List[NetworkDevice]:
+        """Устройства маски в порядке строк"""
+        if mask is None:
+            mask = self._alive
+        devices = self._devices
+        return [devices[row] for row in _rows(mask & self._alive)]
+    
+    def count_by(self, field: str, mask: Optional[Mask] = None) -> Dict[Any, int]:
+        """
+        Число устройств по значениям поля
+        
+        field - 'device_type', 'vendor', 'port' или 'zone'; нулевые
+        группы не включаются
+        """
+        indexes = {
+            'device_type': self._by_type,
+            'vendor': self._by_vendor,
+            'port': self._by_port,
+            'zone': self._by_zone,
+        }
+        if field not in indexes:
+            raise ValueError(f"Группировка по полю {field} не поддерживается")
+        
+        if mask is None:
+            mask = self._alive
+        counts = {}
+        for key, group in indexes[field].items():
+            count = _popcount(group & mask)
+            if count:
+                counts[key] = count
+        return counts
+    
+    def risk_histogram(self, mask: Optional[Mask] = None) -> List[int]:
+        """Гистограмма риска: RISK_BINS интервалов шириной 1 / RISK_BINS"""
+        if mask is None:
+            mask = self._alive
+        return [_popcount(self._by_risk.get(i, 0) & mask) for i in range(RISK_BINS)]
+    
+    def risk_histogram_by_zone(self) -> Dict[str, List[int]]:
+        """Гистограммы риска по зонам"""
+        return {name: self.risk_histogram(mask) for name, mask in self._by_zone.items()}
+    
+    def summary(self) -> Dict[str, Any]:
+        """Сводка для отчетов"""
+        return {
+            'total_devices': self.count(),
+            'by_type': {device_type.value: count
+                        for device_type, count in self.count_by('device_type').items()},
+            'by_zone': self.count_by('zone'),
+            'high_risk': self.count(self.risk_at_least(0.7)),
+            'risk_histogram': self.risk_histogram(),
+        }
@@ -0,0 +1,248 @@
+"""
+Ленивая загрузка бинарных политик
+
+LazyPolicy открывает файл .ztpb через mmap и читает при открытии только
+заголовок, метаданные, индекс зон и правила. Устройства зоны создаются
+при первом обращении к ней; строки таблицы строк декодируются по одной.
+Для сводок (имена зон, число устройств и правил) устройства не
+создаются вовсе.
+"""
+
+import mmap
+import struct
+from array import array
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from . import binary_format as fmt
+from .exceptions import PolicyFormatError
+from .models import NetworkDevice, SecurityZone, SecurityRule, NetworkPolicy, ZoneType, ActionType
+
+class _LazyStrings:
+    """Таблица строк, декодирующая строку при первом обращении"""
+    
+    def __init__(self, data: memoryview, version: int):
+        count = fmt.COUNT.unpack_from(data)[0]
+        self._offsets, end = fmt._from_bytes('I', data, fmt.COUNT.size, count + 1)
+        self._blob = data[end:]
+        self._cache: Dict[int, str] = {}
+        
+        if version < 2:
+            # В версии 1 смещения в символах: нужна вся таблица
+            self._cache = dict(enumerate(fmt._unpack_strings(data, version)))
+        elif self._offsets[-1] != len(self._blob):
+            raise PolicyFormatError("Повреждённый файл политики: таблица строк")
+    
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+    
+    def __getitem__(self, idx: int) -> str:
+        value = self._cache.get(idx)
+        if value is None:
+            start, end = self._offsets[idx], self._offsets[idx + 1]
+            value = self._cache[idx] = str(self._blob[start:end], 'utf-8', 'surrogatepass')
+        return value
+    
+    def text(self, idx: int) -> Optional[str]:
+        return None if idx == fmt.NONE else self[idx]
+
+class _LazyArray:
+    """Массив little-endian чисел в секции, читаемый по индексу и срезу"""
+    
+    def __init__(self, data: memoryview, typecode: str, offset: int = 0, count: Optional[int] = None):
+        self._typecode = typecode
+        self._item = struct.Struct('<' + typecode)
+        self._data = data
+        self._offset = offset
+        self._count = (len(data) - offset) // self._item.size if count is None else count
+        if offset + self._count * self._item.size > len(data):
+            raise PolicyFormatError("Повреждённый файл политики: секция обрезана")
+    
+    def __len__(self) -> int:
+        return self._count
+    
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            start, stop, _ = idx.indices(self._count)
+            values, _ = fmt._from_bytes(self._typecode, self._data,
+                                        self._offset + start * self._item.size, max(stop - start, 0))
+            return values
+        if not 0 <= idx < self._count:
+            raise IndexError(idx)
+        return self._item.unpack_from(self._data, self._offset + idx * self._item.size)[0]
+
+def _lazy_table(columns: tuple, data: memoryview) -> Dict[str, _LazyArray]:
+    """Столбцы табличной секции без чтения значений"""
+    if len(data) < fmt.COUNT.size:
+        raise PolicyFormatError("Повреждённый файл политики: секция обрезана")
+    count = fmt.COUNT.unpack_from(data)[0]
+    offset = fmt.COUNT.size
+    table = {}
+    for name, typecode in columns:
+        table[name] = _LazyArray(data, typecode, offset, count)
+        offset += table[name]._item.size * count
+    return table
+
+class _LazyZones(Mapping):
+    """Словарь зон, создающий зону при первом обращении"""
+    
+    def __init__(self, policy: 'LazyPolicy'):
+        self._policy = policy
+    
+    def __getitem__(self, name: str) -> SecurityZone:
+        return self._policy.zone(name)
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._policy._zone_rows)
+    
+    def __len__(self) -> int:
+        return len(self._policy._zone_rows)
+
+class LazyPolicy:
+    """
+    Политика из бинарного файла с загрузкой зон по требованию
+    
+    Имя, описание, дата создания, правила и индекс зон доступны сразу,
+    zones[имя] создает зону вместе с ее устройствами. Устройство, входящее
+    в несколько зон, создается один раз. Файл остается открытым до
+    close(); после него доступны только уже созданные зоны
+    """
+    
+    def __init__(self, filepath: fmt.PathLike, trusted: bool = False):
+        self.trusted = trusted
+        self._file = open(filepath, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Пустой файл нельзя отобразить в память
+            self._file.close()
+            raise PolicyFormatError("Файл слишком короткий для бинарной политики")
+        
+        try:
+            self._open()
+        except (IndexError, KeyError, ValueError, struct.error) as e:
+            self.close()
+            raise PolicyFormatError(f"Повреждённый файл политики: {e}") from e
+        except PolicyFormatError:
+            self.close()
+            raise
+    
+    def _open(self):
+        version, sections = fmt.read_sections(self._mmap)
+        self._strings = _LazyStrings(sections[b'STRS'], version)
+        text = self._strings.text
+        
+        name, description, created_at = fmt.META.unpack_from(sections[b'META'])
+        self.name = text(name)
+        self.description = text(description) or ""
+        self.created_at = datetime.fromisoformat(text(created_at)) if created_at != fmt.NONE else datetime.now()
+        
+        self._devices = _lazy_table(fmt.DEVICE_COLUMNS, sections[b'DEVS'])
+        self._ports = _LazyArray(sections[b'PORT'], 'H')
+        self._refs = _LazyArray(sections[b'REFS'], 'I')
+        
+        self._zone_table = _lazy_table(fmt.zone_columns(version), sections[b'ZONE'])
+        self._zone_rows = {text(idx): row for row, idx in enumerate(self._zone_table['name'][:])}
+        
+        count, rules = fmt._unpack_table(fmt.RULE_COLUMNS, sections[b'RULE'])
+        self.rules: List[SecurityRule] = []
+        for i in range(count):
+            start = rules['ports_start'][i]
+            ports_count = rules['ports_count'][i]
+            self.rules.append(SecurityRule(
+                source_zone=text(rules['source_zone'][i]),
+                destination_zone=text(rules['destination_zone'][i]),
+                action=ActionType(text(rules['action'][i])),
+                protocol=text(rules['protocol'][i]),
+                ports=None if ports_count < 0 else list(self._ports[start:start + ports_count]),
+                description=text(rules['description'][i]) or ""
+            ))
+        
+        self._zones: Dict[str, SecurityZone] = {}
+        self._device_cache: Dict[int, NetworkDevice] = {}
+        self._columns: Optional[Dict[str, array]] = None
+        self.zones = _LazyZones(self)
+    
+    def zone_device_count(self, name: str) -> int:
+        """Число устройств зоны без создания устройств"""
+        return self._zone_table['refs_count'][self._zone_rows[name]]
+    
+    @property
+    def device_count(self) -> int:
+        """Число уникальных устройств в файле"""
+        return len(self._devices['ip_kind'])
+    
+    def zone(self, name: str) -> SecurityZone:
+        """Зона с устройствами; создается при первом обращении"""
+        zone = self._zones.get(name)
+        if zone is not None:
+            return zone
+        
+        row = self._zone_rows[name]
+        table = self._zone_table
+        text = self._strings.text
+        start = table['refs_start'][row]
+        refs = list(self._refs[start:start + table['refs_count'][row]])
+        
+        try:
+            devices = self._materialize(refs)
+            position, size = fmt.zone_geometry(table, row)
+            zone = SecurityZone(
+                name=name,
+                zone_type=ZoneType(text(table['zone_type'][row])),
+                description=text(table['description'][row]) or "",
+                devices=devices,
+                color=text(table['color'][row]),
+                position=position,
+                size=size
+            )
+        except (IndexError, ValueError, struct.error) as e:
+            raise PolicyFormatError(f"Повреждённый файл политики: {e}") from e
+        
+        self._zones[name] = zone
+        return zone
+    
+    def _materialize(self, refs: List[int]) -> List[NetworkDevice]:
+        """Устройства по номерам строк секции DEVS, с кэшем общих устройств"""
+        cache = self._device_cache
+        missing = sorted({ref for ref in refs if ref not in cache})
+        
+        if missing:
+            # Столбцы читаются целиком один раз: это копирование байтов,
+            # намного дешевле разбора значений по одному
+            if self._columns is None:
+                self._columns = {name: column[:] for name, column in self._devices.items()}
+            table = {name: [column[ref] for ref in missing]
+                     for name, column in self._columns.items()}
+            with fmt._gc_paused():
+                devices = fmt.devices_from_table(table, self._strings, self._ports, self.trusted)
+            cache.update(zip(missing, devices))
+        
+        return [cache[ref] for ref in refs]
+    
+    def to_policy(self) -> NetworkPolicy:
+        """Полностью загруженная NetworkPolicy"""
+        policy = NetworkPolicy(name=self.name, description=self.description)
+        policy.created_at = self.created_at
+        for name in self._zone_rows:
+            policy.zones[name] = self.zone(name)
+        policy.rules = list(self.rules)
+        return policy
+    
+    def close(self):
+        """Закрыть файл; созданные зоны и устройства остаются доступны"""
+        # Представления секций держат экспорт буфера mmap: освобождаем их
+        for name in ('_strings', '_devices', '_ports', '_refs', '_zone_table'):
+            self.__dict__.pop(name, None)
+        try:
+            self._mmap.close()
+        except (AttributeError, BufferError):
+            pass
+        self._file.close()
+    
+    def __enter__(self) -> 'LazyPolicy':
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
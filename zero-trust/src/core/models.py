@@ -5,9 +5,13 @@
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Iterable, Optional, Any, Tuple
+import hashlib
+import itertools
 import json
 import ipaddress
+import socket
+import sys
 
 class DeviceType(Enum):
     ROUTER = "router"
@@ -32,25 +36,356 @@ class ActionType(Enum):
     ALLOW = "allow"
     DENY = "deny"
 
-@dataclass
-class NetworkDevice:
-    """Сетевое устройство"""
-    ip_address: str
-    mac_address: Optional[str] = None
-    hostname: Optional[str] = None
-    device_type: DeviceType = DeviceType.UNKNOWN
-    vendor: Optional[str] = None
-    open_ports: List[int] = field(default_factory=list)
-    os_info: Optional[str] = None
-    risk_score: float = 0.5
-    is_gateway: bool = False
+# Признак IPv6 в сохраненном целом: адреса IPv4 меньше 2**32, поэтому
+# IPv6 хранится со старшим битом за пределами 128 бит адреса
+_IPV6_FLAG = 1 << 128
+
+# Версия словаря политики: 2 - устройства в общей таблице, зоны хранят ссылки
+POLICY_FORMAT_VERSION = 2
+
+# Общие объекты портов и наборов портов: устройства с одинаковыми портами
+# ссылаются на один кортеж, а не на собственные копии. Кэши ограничены
+# _PORT_CACHE_LIMIT и очищаются при переполнении: уже созданные кортежи
+# остаются общими, новые наборы начинают кэш заново
+_PORT_CACHE_LIMIT = 65536
+_port_objects: Dict[int, int] = {}
+_port_sets: Dict[Tuple[int, ...], Tuple[int, ...]] = {}
+
+_MAC_SEPARATORS = str.maketrans('', '', ':-.')
+
+# Часы изменений: каждое изменение объекта модели получает следующий
+# номер, а mark_clean() запоминает номер, после которого изменений не было
+_clock = itertools.count(1)
+
+# Номер последнего изменения полей устройства (любого)
+_device_changed = 0
+
+def _device_touched() -> int:
+    """Отметка изменения устройства"""
+    global _device_changed
+    _device_changed = next(_clock)
+    return _device_changed
+
+def _parse_ip(value) -> Any:
+    """
+    Разобрать IP-адрес в целое число (для IPv6 - с признаком _IPV6_FLAG)
     
-    def __post_init__(self):
-        """Валидация IP-адреса"""
+    Адреса IPv6 с зоной (fe80::1%eth0) не представимы одним числом и
+    сохраняются исходной строкой
+    """
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, value), 'big')
+    except (OSError, TypeError, ValueError):
+        pass
+    
+    try:
+        address = ipaddress.ip_address(value)
+    except ValueError:
+        raise ValueError(f"Invalid IP address: {value}")
+    
+    if address.version == 4:
+        return int(address)
+    if address.scope_id:
+        return str(address)
+    return int(address) | _IPV6_FLAG
+
+def _parse_mac(value: Optional[str]) -> Any:
+    """MAC-адрес в 48-битное целое; нестандартная запись сохраняется строкой"""
+    if not value or value.__class__ is not str:
+        return value
+    
+    digits = value.translate(_MAC_SEPARATORS)
+    if len(digits) == 12:
         try:
-            ipaddress.ip_address(self.ip_address)
+            return int(digits, 16)
         except ValueError:
-            raise ValueError(f"Invalid IP address: {self.ip_address}")
+            pass
+    return value
+
+def _shared_ports(value: Iterable[int]) -> Tuple[int, ...]:
+    """Кортеж портов, общий для всех устройств с таким же набором"""
+    cache = _port_objects
+    if len(cache) >= _PORT_CACHE_LIMIT:
+        cache.clear()
+    ports = tuple([cache.setdefault(port, port) for port in map(int, value)])
+    if len(_port_sets) >= _PORT_CACHE_LIMIT:
+        _port_sets.clear()
+    return _port_sets.setdefault(ports, ports)
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    """Интернировать строку: производители и ОС повторяются у тысяч устройств"""
+    return sys.intern(value) if value.__class__ is str else value
+
+def _json_default(value: Any) -> Any:
+    return value.value if isinstance(value, Enum) else str(value)
+
+def content_digest(data: Any) -> str:
+    """
+    Стабильный хэш данных: SHA-256 канонического JSON
+    
+    Тот же способ, что в ConfigManager.get_config_hash; перечисления
+    записываются значениями, кортежи - списками
+    """
+    text = json.dumps(data, sort_keys=True, ensure_ascii=False, default=_json_default)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+class _ContentTracked:
+    """
+    Грязный флаг по отметкам изменений
+    
+    Запись публичного поля и методы изменения ставят объекту отметку по
+    часам _clock, а устройства - свою (см. NetworkDevice). dirty
+    сравнивает отметки с моментом mark_clean() и не считает хэш:
+    проверка стоит O(1) для правила и зоны и O(зон + правил) для
+    политики. Устройства зоны просматриваются только после изменения
+    какого-либо устройства, один раз на изменение. content_hash
+    считается в mark_clean() и для проверки, что
+    содержимое действительно изменилось. Правки списков на месте
+    (devices, ports, zones, rules) распознаются по их длине и составу
+    """
+    _modified = 0
+    _clean_at = -1
+    _clean_layout = None
+    
+    def __setattr__(self, name: str, value: Any):
+        object.__setattr__(self, name, value)
+        if name[0] != '_':
+            object.__setattr__(self, '_modified', next(_clock))
+    
+    def _touch(self):
+        """Отметить изменение, сделанное не через поле"""
+        object.__setattr__(self, '_modified', next(_clock))
+    
+    def _changed_since(self, moment: int) -> bool:
+        """Было ли изменение после отметки moment"""
+        return self._modified > moment
+    
+    def _layout(self) -> Any:
+        """Состав изменяемых на месте списков, сравниваемый с запомненным в mark_clean()"""
+        return None
+    
+    @property
+    def dirty(self) -> bool:
+        """Изменилось ли содержимое после последнего mark_clean()"""
+        return self._changed_since(self._clean_at) or self._layout() != self._clean_layout
+    
+    def mark_clean(self) -> str:
+        """Запомнить текущее содержимое как обработанное; вернуть его хэш"""
+        self._clean_hash = self.content_hash
+        self._clean_at = next(_clock)
+        self._clean_layout = self._layout()
+        return self._clean_hash
+
+class NetworkDevice:
+    """
+    Сетевое устройство
+    
+    Компактное представление для больших инвентарей: __slots__ вместо
+    __dict__, IP- и MAC-адреса хранятся целыми числами, открытые порты -
+    общим для одинаковых наборов кортежем, производитель и ОС
+    интернируются. Публичные атрибуты, порядок аргументов конструктора и
+    сравнение такие же, как у dataclass; MAC-адрес возвращается в виде
+    AA:BB:CC:DD:EE:FF. Текст IP-адреса строится при первом чтении
+    ip_address и кэшируется (_ip_text): генераторы и GUI читают его в
+    циклах. Запись публичного атрибута ставит устройству отметку
+    изменения (_modified) для грязных флагов зон и политики
+    """
+    __slots__ = (
+        '_ip', '_ip_text', '_mac', '_hostname', '_device_type', '_vendor',
+        '_open_ports', '_os_info', '_risk_score', '_is_gateway', '_modified'
+    )
+    
+    # Публичные поля в порядке аргументов конструктора
+    FIELDS = (
+        'ip_address', 'mac_address', 'hostname', 'device_type', 'vendor',
+        'open_ports', 'os_info', 'risk_score', 'is_gateway'
+    )
+    
+    def __init__(self, ip_address: str, mac_address: Optional[str] = None,
+                 hostname: Optional[str] = None,
+                 device_type: DeviceType = DeviceType.UNKNOWN,
+                 vendor: Optional[str] = None, open_ports: Iterable[int] = (),
+                 os_info: Optional[str] = None, risk_score: float = 0.5,
+                 is_gateway: bool = False):
+        self._ip = _parse_ip(ip_address)
+        self._ip_text = None
+        self._mac = _parse_mac(mac_address)
+        self._hostname = hostname
+        self._device_type = device_type
+        self._vendor = _intern(vendor)
+        self._open_ports = _shared_ports(open_ports)
+        self._os_info = _intern(os_info)
+        self._risk_score = risk_score
+        self._is_gateway = is_gateway
+        self._modified = 0
+    
+    @property
+    def ip_address(self) -> str:
+        """IP-адрес в текстовом виде"""
+        text = self._ip_text
+        if text is None:
+            ip = self._ip
+            if ip.__class__ is str:
+                text = ip
+            elif ip >= _IPV6_FLAG:
+                text = str(ipaddress.IPv6Address(ip ^ _IPV6_FLAG))
+            else:
+                text = socket.inet_ntoa(ip.to_bytes(4, 'big'))
+            self._ip_text = text
+        return text
+    
+    @ip_address.setter
+    def ip_address(self, value: str):
+        self._ip = _parse_ip(value)
+        self._ip_text = None
+        self._modified = _device_touched()
+    
+    @property
+    def ip_int(self) -> int:
+        """IP-адрес целым числом"""
+        ip = self._ip
+        if ip.__class__ is str:
+            return int(ipaddress.ip_address(ip))
+        return ip & ~_IPV6_FLAG
+    
+    @property
+    def ip_version(self) -> int:
+        """Версия протокола IP (4 или 6)"""
+        ip = self._ip
+        return 6 if ip.__class__ is str or ip >= _IPV6_FLAG else 4
+    
+    @property
+    def mac_address(self) -> Optional[str]:
+        mac = self._mac
+        if mac.__class__ is int:
+            return mac.to_bytes(6, 'big').hex(':').upper()
+        return mac
+    
+    @mac_address.setter
+    def mac_address(self, value: Optional[str]):
+        self._mac = _parse_mac(value)
+        self._modified = _device_touched()
+    
+    @property
+    def hostname(self) -> Optional[str]:
+        return self._hostname
+    
+    @hostname.setter
+    def hostname(self, value: Optional[str]):
+        self._hostname = value
+        self._modified = _device_touched()
+    
+    @property
+    def device_type(self) -> DeviceType:
+        return self._device_type
+    
+    @device_type.setter
+    def device_type(self, value: DeviceType):
+        self._device_type = value
+        self._modified = _device_touched()
+    
+    @property
+    def vendor(self) -> Optional[str]:
+        return self._vendor
+    
+    @vendor.setter
+    def vendor(self, value: Optional[str]):
+        self._vendor = _intern(value)
+        self._modified = _device_touched()
+    
+    @property
+    def os_info(self) -> Optional[str]:
+        return self._os_info
+    
+    @os_info.setter
+    def os_info(self, value: Optional[str]):
+        self._os_info = _intern(value)
+        self._modified = _device_touched()
+    
+    @property
+    def open_ports(self) -> Tuple[int, ...]:
+        """Открытые порты (неизменяемый кортеж; для изменения присвойте новый список)"""
+        return self._open_ports
+    
+    @open_ports.setter
+    def open_ports(self, value: Iterable[int]):
+        self._open_ports = _shared_ports(value)
+        self._modified = _device_touched()
+    
+    @property
+    def risk_score(self) -> float:
+        return self._risk_score
+    
+    @risk_score.setter
+    def risk_score(self, value: float):
+        self._risk_score = value
+        self._modified = _device_touched()
+    
+    @property
+    def is_gateway(self) -> bool:
+        return self._is_gateway
+    
+    @is_gateway.setter
+    def is_gateway(self, value: bool):
+        self._is_gateway = value
+        self._modified = _device_touched()
+    
+    def _key(self) -> tuple:
+        return (self._ip, self._mac, self._hostname, self._device_type,
+                self._vendor, self._open_ports, self._os_info, self._risk_score, self._is_gateway)
+    
+    @property
+    def content_hash(self) -> str:
+        """Стабильный хэш содержимого устройства"""
+        return content_digest(self._key())
+    
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._key() == other._key()
+    
+    # Как и dataclass с eq=True, устройство изменяемо и не хешируется
+    __hash__ = None
+    
+    def __repr__(self) -> str:
+        values = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.FIELDS)
+        return f"{self.__class__.__name__}({values})"
+    
+    def __reduce__(self):
+        return self.__class__, tuple(getattr(self, name) for name in self.FIELDS)
+    
+    @classmethod
+    def _from_columns(cls, ips: Iterable[Any], macs: Iterable[Any], hostnames: Iterable[Optional[str]],
+                      device_types: Iterable[DeviceType], vendors: Iterable[Optional[str]],
+                      open_ports: Iterable[Tuple[int, ...]], os_infos: Iterable[Optional[str]],
+                      risk_scores: Iterable[float], gateways: Iterable[bool]) -> List['NetworkDevice']:
+        """
+        Создать устройства из столбцов без разбора и проверки значений
+        
+        Для доверенных источников (собственный бинарный формат): ip и mac
+        передаются в том виде, в котором хранятся в _ip и _mac, порты -
+        готовыми кортежами. Строки не интернируются: источник уже хранит
+        каждое значение один раз
+        """
+        new = cls.__new__
+        devices = []
+        append = devices.append
+        for ip, mac, hostname, device_type, vendor, ports, os_info, risk_score, is_gateway in zip(
+                ips, macs, hostnames, device_types, vendors, open_ports, os_infos, risk_scores, gateways):
+            device = new(cls)
+            device._ip = ip
+            device._ip_text = None
+            device._mac = mac
+            device._hostname = hostname
+            device._device_type = device_type
+            device._vendor = vendor
+            device._open_ports = ports
+            device._os_info = os_info
+            device._risk_score = risk_score
+            device._is_gateway = is_gateway
+            device._modified = 0
+            append(device)
+        return devices
     
     @property
     def display_name(self) -> str:
@@ -67,7 +402,7 @@ class NetworkDevice:
             'hostname': self.hostname,
             'device_type': self.device_type.value,
             'vendor': self.vendor,
-            'open_ports': self.open_ports,
+            'open_ports': list(self._open_ports),
             'os_info': self.os_info,
             'risk_score': self.risk_score,
             'is_gateway': self.is_gateway
@@ -89,8 +424,14 @@ class NetworkDevice:
         )
 
 @dataclass
-class SecurityZone:
-    """Зона безопасности"""
+class SecurityZone(_ContentTracked):
+    """
+    Зона безопасности
+    
+    Членство устройств индексируется по идентичности объекта (id), поэтому
+    проверка, добавление и удаление выполняются за O(1). Список devices
+    хранит порядок; изменять его следует через методы зоны
+    """
     name: str
     zone_type: ZoneType
     description: str = ""
@@ -98,6 +439,12 @@ class SecurityZone:
     color: str = "#808080"
     position: tuple = (0, 0)  # Позиция на канвасе
     size: tuple = (200, 150)  # Размер зоны
+    _members: Dict[int, NetworkDevice] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _policy: Optional['NetworkPolicy'] = field(default=None, init=False, repr=False, compare=False)
+    _hash: Optional[Tuple[tuple, str]] = field(default=None, init=False, repr=False, compare=False)
+    _device_hashes: Dict[int, Tuple[tuple, str]] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _clean_hash: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    _device_scan: Optional[Tuple[int, int]] = field(default=None, init=False, repr=False, compare=False)
     
     def __post_init__(self):
         """Установка цвета по типу зоны"""
@@ -110,15 +457,83 @@ class SecurityZone:
         }
         self.color = color_map.get(self.zone_type, self.color)
     
+    def _index(self) -> Dict[int, NetworkDevice]:
+        """Индекс членства; перестраивается, если devices изменили напрямую"""
+        members = self._members
+        if len(members) != len(self.devices):
+            members.clear()
+            for device in self.devices:
+                members[id(device)] = device
+            if self._policy is not None:
+                self._policy._invalidate_device_index()
+        return members
+    
+    def __contains__(self, device: NetworkDevice) -> bool:
+        return id(device) in self._index()
+    
+    def __getstate__(self):
+        # Индекс по id не переносится в копию: там другие объекты
+        state = self.__dict__.copy()
+        state['_members'] = {}
+        state['_device_hashes'] = {}
+        return state
+    
     def add_device(self, device: NetworkDevice):
         """Добавить устройство в зону"""
-        if device not in self.devices:
+        members = self._index()
+        if id(device) not in members:
+            members[id(device)] = device
             self.devices.append(device)
+            self._touch()
+            if self._policy is not None:
+                self._policy._on_device_added(self, device)
+    
+    def remove_device(self, device):
+        """Удалить устройство (объект или IP-адрес) из зоны"""
+        members = self._index()
+        
+        if isinstance(device, str):
+            device = next((d for d in self.devices if d.ip_address == device), None)
+        
+        if device is None or members.pop(id(device), None) is None:
+            return
+        
+        # Удаляем по идентичности, а не по равенству полей
+        for i, member in enumerate(self.devices):
+            if member is device:
+                del self.devices[i]
+                break
+        self._touch()
+        
+        if self._policy is not None:
+            self._policy._on_device_removed(self, device)
+    
+    def clear_devices(self):
+        """Удалить все устройства из зоны"""
+        devices = list(self.devices)
+        self.devices.clear()
+        self._members.clear()
+        self._touch()
+        
+        if self._policy is not None:
+            for device in devices:
+                self._policy._on_device_removed(self, device)
+    
+    def _changed_since(self, moment: int) -> bool:
+        if self._modified > moment:
+            return True
+        # Устройство не знает своих зон: после изменения любого устройства
+        # отметки устройств зоны просматриваются (один раз на изменение)
+        if _device_changed <= moment:
+            return False
+        scan = self._device_scan
+        if scan is None or scan[0] != _device_changed:
+            latest = max((device._modified for device in self.devices), default=0)
+            scan = self._device_scan = (_device_changed, latest)
+        return scan[1] > moment
     
-    def remove_device(self, device: NetworkDevice):
-        """Удалить устройство из зоны"""
-        if device in self.devices:
-            self.devices.remove(device)
+    def _layout(self) -> Any:
+        return len(self.devices)
     
     @property
     def device_count(self) -> int:
@@ -130,21 +545,67 @@ class SecurityZone:
         """Список IP-адресов устройств"""
         return [device.ip_address for device in self.devices]
     
-    def to_dict(self) -> Dict[str, Any]:
-        """Конвертировать в словарь"""
+    @property
+    def content_hash(self) -> str:
+        """
+        Стабильный хэш содержимого зоны, включая устройства
+        
+        Хэши устройств кэшируются и пересчитываются только для устройств,
+        поля которых изменились; неизмененная зона сводится к сравнению
+        кортежей без сериализации
+        """
+        cache = self._device_hashes
+        digests = []
+        for device in self.devices:
+            key = device._key()
+            cached = cache.get(id(device))
+            if cached is None or cached[0] != key:
+                cached = cache[id(device)] = (key, content_digest(key))
+            digests.append(cached[1])
+        
+        # Удаленные устройства не должны накапливаться в кэше
+        if len(cache) > 2 * len(self.devices):
+            self._device_hashes = {id(device): cache[id(device)] for device in self.devices}
+        
+        key = (self.name, self.zone_type, self.description, self.color,
+               tuple(self.position), tuple(self.size), tuple(digests))
+        if self._hash is None or self._hash[0] != key:
+            self._hash = (key, content_digest(key))
+        return self._hash[1]
+    
+    def to_dict(self, device_refs: Optional[Dict[int, int]] = None) -> Dict[str, Any]:
+        """
+        Конвертировать в словарь
+        
+        device_refs - индексы устройств в общей таблице политики по id();
+        если заданы, зона хранит ссылки вместо полных описаний устройств
+        """
+        if device_refs is not None:
+            devices_key = 'device_refs'
+            devices = [device_refs[id(device)] for device in self.devices]
+        else:
+            devices_key = 'devices'
+            devices = [device.to_dict() for device in self.devices]
+        
         return {
             'name': self.name,
             'zone_type': self.zone_type.value,
             'description': self.description,
-            'devices': [device.to_dict() for device in self.devices],
+            devices_key: devices,
             'color': self.color,
             'position': self.position,
             'size': self.size
         }
     
     @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'SecurityZone':
-        """Создать из словаря"""
+    def from_dict(cls, data: Dict[str, Any],
+                  devices: Optional[List[NetworkDevice]] = None) -> 'SecurityZone':
+        """
+        Создать из словаря
+        
+        devices - общая таблица устройств политики, на которую ссылается
+        device_refs; устройства по ссылкам не копируются
+        """
         zone = cls(
             name=data['name'],
             zone_type=ZoneType(data['zone_type']),
@@ -154,13 +615,19 @@ class SecurityZone:
             size=tuple(data.get('size', (200, 150)))
         )
         
+        if 'device_refs' in data:
+            if devices is None:
+                raise ValueError(f"Зона {zone.name} ссылается на таблицу устройств, которой нет")
+            for ref in data['device_refs']:
+                zone.add_device(devices[ref])
+        
         for device_data in data.get('devices', []):
-            zone.devices.append(NetworkDevice.from_dict(device_data))
+            zone.add_device(NetworkDevice.from_dict(device_data))
         
         return zone
 
 @dataclass
-class SecurityRule:
+class SecurityRule(_ContentTracked):
     """Правило безопасности"""
     source_zone: str
     destination_zone: str
@@ -168,6 +635,20 @@ class SecurityRule:
     protocol: str = "any"
     ports: Optional[List[int]] = None
     description: str = ""
+    _hash: Optional[Tuple[tuple, str]] = field(default=None, init=False, repr=False, compare=False)
+    _clean_hash: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    
+    @property
+    def content_hash(self) -> str:
+        """Стабильный хэш содержимого правила"""
+        key = (self.source_zone, self.destination_zone, self.action, self.protocol,
+               None if self.ports is None else tuple(self.ports), self.description)
+        if self._hash is None or self._hash[0] != key:
+            self._hash = (key, content_digest(key))
+        return self._hash[1]
+    
+    def _layout(self) -> Any:
+        return None if self.ports is None else tuple(self.ports)
     
     def to_dict(self) -> Dict[str, Any]:
         """Конвертировать в словарь"""
@@ -176,7 +657,7 @@ class SecurityRule:
             'destination_zone': self.destination_zone,
             'action': self.action.value,
             'protocol': self.protocol,
-            'ports': self.ports,
+            'ports': None if self.ports is None else list(self.ports),
             'description': self.description
         }
     
@@ -193,22 +674,137 @@ class SecurityRule:
         )
 
 @dataclass
-class NetworkPolicy:
-    """Политика безопасности"""
+class NetworkPolicy(_ContentTracked):
+    """
+    Политика безопасности
+    
+    Обратный индекс id(устройство) -> зоны строится лениво и затем
+    поддерживается зонами при добавлении и удалении устройств
+    """
     name: str
     description: str = ""
     zones: Dict[str, SecurityZone] = field(default_factory=dict)
     rules: List[SecurityRule] = field(default_factory=list)
     created_at: datetime = field(default_factory=datetime.now)
+    _device_zones: Optional[Dict[int, List[SecurityZone]]] = field(default=None, init=False, repr=False, compare=False)
+    _indexed_zones: int = field(default=0, init=False, repr=False, compare=False)
+    _clean_hash: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    
+    def _device_index(self) -> Dict[int, List[SecurityZone]]:
+        """Обратный индекс; перестраивается, если zones изменили напрямую"""
+        index = self._device_zones
+        
+        # Зон немного, поэтому проверка актуальности дешевая
+        if index is not None and len(self.zones) == self._indexed_zones and all(
+            zone._policy is self and len(zone._members) == len(zone.devices)
+            for zone in self.zones.values()
+        ):
+            return index
+        
+        index = {}
+        for zone in self.zones.values():
+            zone._policy = self
+            for device in zone._index().values():
+                index.setdefault(id(device), []).append(zone)
+        
+        self._device_zones = index
+        self._indexed_zones = len(self.zones)
+        return index
+    
+    def _invalidate_device_index(self):
+        self._device_zones = None
+    
+    def __getstate__(self):
+        # Индекс по id не переносится в копию: там другие объекты
+        state = self.__dict__.copy()
+        state['_device_zones'] = None
+        return state
+    
+    def _on_device_added(self, zone: SecurityZone, device: NetworkDevice):
+        # Зона могла быть удалена из zones напрямую
+        if self._device_zones is not None and self.zones.get(zone.name) is zone:
+            self._device_zones.setdefault(id(device), []).append(zone)
+    
+    def _on_device_removed(self, zone: SecurityZone, device: NetworkDevice):
+        if self._device_zones is None:
+            return
+        
+        zones = self._device_zones.get(id(device))
+        if zones:
+            zones[:] = [z for z in zones if z is not zone]
+            if not zones:
+                del self._device_zones[id(device)]
+    
+    def zones_of(self, device: NetworkDevice) -> List[SecurityZone]:
+        """Все зоны, содержащие устройство"""
+        return list(self._device_index().get(id(device), ()))
+    
+    def zone_of(self, device: NetworkDevice) -> Optional[SecurityZone]:
+        """Зона устройства или None, если оно не распределено"""
+        zones = self._device_index().get(id(device))
+        return zones[0] if zones else None
+    
+    def _changed_since(self, moment: int) -> bool:
+        return (self._modified > moment
+                or any(zone._changed_since(moment) for zone in self.zones.values())
+                or any(rule._modified > moment for rule in self.rules))
+    
+    def _layout(self) -> Any:
+        return (tuple((name, id(zone), zone._layout()) for name, zone in self.zones.items()),
+                tuple((id(rule), rule._layout()) for rule in self.rules))
+    
+    def move_device(self, device: NetworkDevice, zone: SecurityZone):
+        """Переместить устройство в зону, удалив его из остальных зон"""
+        for current in self.zones_of(device):
+            if current is not zone:
+                current.remove_device(device)
+        
+        zone.add_device(device)
+    
+    @property
+    def content_hash(self) -> str:
+        """
+        Стабильный хэш содержимого политики
+        
+        Складывается из хэшей зон и правил, которые кэшируются на своих
+        объектах; дата создания в хэш не входит. Хэш позволяет проверить,
+        актуален ли кэшированный результат генерации, валидации или
+        сохранения
+        """
+        return content_digest([
+            self.name,
+            self.description,
+            [[name, zone.content_hash] for name, zone in self.zones.items()],
+            [rule.content_hash for rule in self.rules],
+        ])
+    
+    def unique_devices(self) -> List[NetworkDevice]:
+        """Устройства всех зон без повторов, в порядке первого появления"""
+        seen = set()
+        devices = []
+        for zone in self.zones.values():
+            for device in zone.devices:
+                if id(device) not in seen:
+                    seen.add(id(device))
+                    devices.append(device)
+        return devices
     
     def add_zone(self, zone: SecurityZone):
         """Добавить зону"""
+        previous = self.zones.get(zone.name)
+        if previous is not None and previous is not zone:
+            previous._policy = None
+        
         self.zones[zone.name] = zone
+        self._invalidate_device_index()
+        self._touch()
     
     def remove_zone(self, zone_name: str):
         """Удалить зону"""
         if zone_name in self.zones:
-            del self.zones[zone_name]
+            self.zones.pop(zone_name)._policy = None
+            self._invalidate_device_index()
+            self._touch()
             # Удаляем связанные правила
             self.rules = [
                 rule for rule in self.rules
@@ -219,6 +815,7 @@ class NetworkPolicy:
         """Добавить правило"""
         if rule.source_zone in self.zones and rule.destination_zone in self.zones:
             self.rules.append(rule)
+            self._touch()
     
     def validate(self) -> List[str]:
         """Валидация политики"""
@@ -236,11 +833,21 @@ class NetworkPolicy:
         return errors
     
     def to_dict(self) -> Dict[str, Any]:
-        """Конвертировать в словарь"""
+        """
+        Конвертировать в словарь
+        
+        Каждое устройство записывается один раз в таблицу devices, даже если
+        входит в несколько зон; зоны ссылаются на него по индексу
+        """
+        devices = self.unique_devices()
+        device_refs = {id(device): i for i, device in enumerate(devices)}
+        
         return {
+            'format_version': POLICY_FORMAT_VERSION,
             'name': self.name,
             'description': self.description,
-            'zones': {name: zone.to_dict() for name, zone in self.zones.items()},
+            'devices': [device.to_dict() for device in devices],
+            'zones': {name: zone.to_dict(device_refs) for name, zone in self.zones.items()},
             'rules': [rule.to_dict() for rule in self.rules],
             'created_at': self.created_at.isoformat()
         }
@@ -256,9 +863,12 @@ class NetworkPolicy:
         if 'created_at' in data:
             policy.created_at = datetime.fromisoformat(data['created_at'])
         
+        # Общая таблица устройств (в файлах версии 1 ее нет: устройства внутри зон)
+        devices = [NetworkDevice.from_dict(device_data) for device_data in data.get('devices', [])]
+        
         # Загружаем зоны
         for zone_name, zone_data in data.get('zones', {}).items():
-            policy.zones[zone_name] = SecurityZone.from_dict(zone_data)
+            policy.zones[zone_name] = SecurityZone.from_dict(zone_data, devices)
         
         # Загружаем правила
         for rule_data in data.get('rules', []):
@@ -266,14 +876,37 @@ class NetworkPolicy:
         
         return policy
     
-    def save_to_file(self, filepath: str):
-        """Сохранить в файл"""
+    def save_to_file(self, filepath: str, binary: Optional[bool] = None):
+        """
+        Сохранить в файл
+        
+        binary=None - формат по расширению: .ztpb - бинарный, иначе JSON
+        """
+        from . import binary_format
+        
+        if binary is None:
+            binary = str(filepath).lower().endswith(binary_format.EXTENSION)
+        
+        if binary:
+            binary_format.save(self, filepath)
+            return
+        
         with open(filepath, 'w', encoding='utf-8') as f:
             json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
     
     @classmethod
-    def load_from_file(cls, filepath: str) -> 'NetworkPolicy':
-        """Загрузить из файла"""
+    def load_from_file(cls, filepath: str, trusted: bool = False) -> 'NetworkPolicy':
+        """
+        Загрузить из файла
+        
+        Формат определяется по сигнатуре. trusted=True ускоряет загрузку
+        бинарных файлов, пропуская проверку устройств; на JSON не влияет
+        """
+        from . import binary_format
+        
+        if binary_format.is_binary_policy(filepath):
+            return binary_format.load(filepath, trusted=trusted)
+        
         with open(filepath, 'r', encoding='utf-8') as f:
             data = json.load(f)
         return cls.from_dict(data)
\ No newline at end of file
@@ -0,0 +1,533 @@
+"""
+Структурное сравнение политик и журнал изменений
+
+diff_policies сравнивает две политики и возвращает PolicyPatch - список
+операций (зоны, устройства, членство в зонах, правила), который
+apply переносит на другую копию политики.
+
+PolicyJournal хранит политику как снимок плюс журнал патчей (JSON Lines):
+автосохранение дописывает в журнал только изменения, а полный снимок
+перезаписывается при периодическом уплотнении.
+"""
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from . import binary_format
+from .exceptions import PolicyFormatError
+from .models import NetworkDevice, SecurityZone, SecurityRule, NetworkPolicy, DeviceType, ZoneType
+
+PathLike = Union[str, Path]
+
+# Версия ключей устройств в заголовке журнала: 1 - MAC или IP, 2 - MAC@IP
+DEVICE_KEY_VERSION = 2
+
+def _device_key(device: NetworkDevice) -> str:
+    # У узла с несколькими адресами один MAC на разных IP
+    if device.mac_address:
+        return f"{device.mac_address}@{device.ip_address}"
+    return device.ip_address
+
+def _device_keys(policy: NetworkPolicy, legacy: bool = False) -> Dict[str, NetworkDevice]:
+    """
+    Устройства политики по ключу: MAC@IP, а если MAC нет - IP-адрес
+    (legacy - ключи старых журналов: MAC или IP)
+    
+    Повторяющиеся ключи получают суффикс #2, #3... по порядку
+    устройств, поэтому журнал такие ключи не пишет
+    """
+    devices = {}
+    for device in policy.unique_devices():
+        if legacy:
+            base = key = device.mac_address or device.ip_address
+        else:
+            base = key = _device_key(device)
+        n = 1
+        while key in devices:
+            n += 1
+            key = f"{base}#{n}"
+        devices[key] = device
+    return devices
+
+def _zone_fields(zone: SecurityZone) -> Dict[str, Any]:
+    return {
+        'zone_type': zone.zone_type.value,
+        'description': zone.description,
+        'color': zone.color,
+        'position': list(zone.position),
+        'size': list(zone.size),
+    }
+
+def _policy_state(policy: NetworkPolicy, devices: Optional[Dict[str, NetworkDevice]] = None) -> Dict[str, Any]:
+    """Сравниваемое представление политики"""
+    if devices is None:
+        devices = _device_keys(policy)
+    keys = {id(device): key for key, device in devices.items()}
+    
+    membership: Dict[str, List[str]] = {}
+    for zone in policy.zones.values():
+        for device in zone.devices:
+            membership.setdefault(keys[id(device)], []).append(zone.name)
+    
+    return {
+        'name': policy.name,
+        'description': policy.description,
+        'zones': {name: _zone_fields(zone) for name, zone in policy.zones.items()},
+        'devices': {key: device.to_dict() for key, device in devices.items()},
+        'membership': membership,
+        'rules': [rule.to_dict() for rule in policy.rules],
+    }
+
+@dataclass
+class PolicyPatch:
+    """Набор изменений политики"""
+    changes: List[Dict[str, Any]] = field(default_factory=list)
+    created_at: datetime = field(default_factory=datetime.now)
+    
+    def __len__(self) -> int:
+        return len(self.changes)
+    
+    def __bool__(self) -> bool:
+        return bool(self.changes)
+    
+    def apply(self, policy: NetworkPolicy, legacy_keys: bool = False) -> NetworkPolicy:
+        """Применить патч к политике (на месте) и вернуть ее"""
+        devices = _device_keys(policy, legacy_keys)
+        
+        for change in self.changes:
+            op = change['op']
+            
+            if op == 'policy':
+                policy.name = change['name']
+                policy.description = change['description']
+            
+            elif op == 'add_zone':
+                zone_data = dict(change['fields'], name=change['zone'])
+                policy.add_zone(SecurityZone.from_dict(zone_data))
+            
+            elif op == 'update_zone':
+                zone = policy.zones[change['zone']]
+                for name, value in change['fields'].items():
+                    if name == 'zone_type':
+                        value = ZoneType(value)
+                    elif name in ('position', 'size'):
+                        value = tuple(value)
+                    setattr(zone, name, value)
+            
+            elif op == 'remove_zone':
+                # remove_zone удаляет и правила зоны, но правила патч описывает сам
+                rules = policy.rules
+                policy.remove_zone(change['zone'])
+                policy.rules = rules
+            
+            elif op == 'add_device':
+                devices[change['key']] = NetworkDevice.from_dict(change['device'])
+            
+            elif op == 'update_device':
+                device = devices[change['key']]
+                for name, value in change['fields'].items():
+                    if name == 'device_type':
+                        value = DeviceType(value)
+                    setattr(device, name, value)
+            
+            elif op == 'remove_device':
+                device = devices.pop(change['key'])
+                for zone in policy.zones_of(device):
+                    zone.remove_device(device)
+            
+            elif op == 'move_device':
+                device = devices[change['key']]
+                target = change['zones']
+                for zone in policy.zones_of(device):
+                    if zone.name not in target:
+                        zone.remove_device(device)
+                for name in target:
+                    policy.zones[name].add_device(device)
+            
+            elif op == 'set_rule':
+                policy.rules[change['index']] = SecurityRule.from_dict(change['rule'])
+            
+            elif op == 'insert_rules':
+                index = change['index']
+                policy.rules[index:index] = [SecurityRule.from_dict(rule) for rule in change['rules']]
+            
+            elif op == 'delete_rules':
+                index = change['index']
+                del policy.rules[index:index + change['count']]
+            
+            # add_rule и truncate_rules пишутся старыми журналами
+            elif op == 'add_rule':
+                policy.rules.append(SecurityRule.from_dict(change['rule']))
+            
+            elif op == 'truncate_rules':
+                del policy.rules[change['count']:]
+            
+            else:
+                raise PolicyFormatError(f"Неизвестная операция патча: {op}")
+        
+        return policy
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Конвертировать в словарь"""
+        return {
+            'created_at': self.created_at.isoformat(),
+            'changes': self.changes
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'PolicyPatch':
+        """Создать из словаря"""
+        patch = cls(changes=data['changes'])
+        if 'created_at' in data:
+            patch.created_at = datetime.fromisoformat(data['created_at'])
+        return patch
+
+def _diff_states(old: Dict[str, Any], new: Dict[str, Any]) -> PolicyPatch:
+    changes = []
+    
+    if old['name'] != new['name'] or old['description'] != new['description']:
+        changes.append({'op': 'policy', 'name': new['name'], 'description': new['description']})
+    
+    # Зоны: сначала добавляем, чтобы в них можно было перемещать устройства
+    old_zones, new_zones = old['zones'], new['zones']
+    for name, fields in new_zones.items():
+        previous = old_zones.get(name)
+        if previous is None:
+            changes.append({'op': 'add_zone', 'zone': name, 'fields': fields})
+        elif previous != fields:
+            changed = {k: v for k, v in fields.items() if previous.get(k) != v}
+            changes.append({'op': 'update_zone', 'zone': name, 'fields': changed})
+    
+    # Устройства
+    old_devices, new_devices = old['devices'], new['devices']
+    old_membership, new_membership = old['membership'], new['membership']
+    for key, device in new_devices.items():
+        previous = old_devices.get(key)
+        if previous is None:
+            changes.append({'op': 'add_device', 'key': key, 'device': device})
+        elif previous != device:
+            changed = {k: v for k, v in device.items() if previous.get(k) != v}
+            changes.append({'op': 'update_device', 'key': key, 'fields': changed})
+        
+        zones = new_membership.get(key, [])
+        if zones != old_membership.get(key, []):
+            changes.append({'op': 'move_device', 'key': key, 'zones': zones})
+    
+    for key in old_devices.keys() - new_devices.keys():
+        changes.append({'op': 'remove_device', 'key': key})
+    
+    for name in old_zones.keys() - new_zones.keys():
+        changes.append({'op': 'remove_zone', 'zone': name})
+    
+    changes.extend(_diff_rules(old['rules'], new['rules']))
+    return PolicyPatch(changes)
+    
+def _diff_rules(old_rules: List[Dict[str, Any]], new_rules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Операции над списком правил
+    
+    Списки сравниваются как последовательности, поэтому вставка правила
+    в начало дает одну операцию, а не изменение всех следующих правил.
+    Операции идут с конца списка: индексы ранних операций остаются
+    индексами старого списка
+    """
+    if old_rules == new_rules:
+        return []
+    
+    old_keys = [json.dumps(rule, sort_keys=True) for rule in old_rules]
+    new_keys = [json.dumps(rule, sort_keys=True) for rule in new_rules]
+    matcher = SequenceMatcher(None, old_keys, new_keys, autojunk=False)
+    
+    changes = []
+    for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+        if tag == 'equal':
+            continue
+        
+        # Замена: совпадающая по длине часть правится на месте
+        common = min(i2 - i1, j2 - j1)
+        if j2 - j1 > common:
+            changes.append({'op': 'insert_rules', 'index': i1 + common, 'rules': new_rules[j1 + common:j2]})
+        elif i2 - i1 > common:
+            changes.append({'op': 'delete_rules', 'index': i1 + common, 'count': i2 - i1 - common})
+        for k in reversed(range(common)):
+            changes.append({'op': 'set_rule', 'index': i1 + k, 'rule': new_rules[j1 + k]})
+    
+    return changes
+
+def diff_policies(old: NetworkPolicy, new: NetworkPolicy) -> PolicyPatch:
+    """Патч, превращающий политику old в new"""
+    return _diff_states(_policy_state(old), _policy_state(new))
+
+class PolicyJournal:
+    """
+    Политика на диске: снимок и журнал патчей
+    
+    Первая строка журнала содержит хэш снимка, к которому относятся
+    патчи. Если уплотнение прервалось после записи нового снимка,
+    устаревший журнал распознается по хэшу и не применяется повторно.
+    Снимок уплотняется, когда в журнале max_entries патчей или журнал
+    стал больше снимка. Сохраненная политика помечается mark_clean().
+    
+    Состояние последнего сохранения обновляется по отметкам изменений
+    моделей: при сохранении пересобираются только измененные зоны и
+    устройства этих зон, поэтому стоимость автосохранения зависит от
+    объема изменений, а не от размера политики
+    """
+    
+    def __init__(self, snapshot_path: PathLike, max_entries: int = 100):
+        self.snapshot_path = Path(snapshot_path)
+        self.journal_path = self.snapshot_path.with_name(self.snapshot_path.name + '.journal')
+        self.max_entries = max_entries
+        
+        self._state: Optional[Dict[str, Any]] = None
+        self._entries = 0
+        self._damaged = False
+        self._snapshot_size = 0
+    
+        # Что записано в _state: политика, отметка времени, ключи
+        # устройств (объекты держатся, чтобы их id не переиспользовались)
+        # и id устройств каждой зоны
+        self._policy: Optional[NetworkPolicy] = None
+        self._recorded_at = 0
+        self._devices: Dict[str, NetworkDevice] = {}
+        self._keys: Dict[int, str] = {}
+        self._zones: Dict[str, Tuple[SecurityZone, Set[int]]] = {}
+        self._rules_layout: tuple = ()
+        self._shared_keys: Set[str] = set()
+    
+    def load(self, trusted: bool = False) -> NetworkPolicy:
+        """Загрузить снимок и применить к нему журнал"""
+        data = self.snapshot_path.read_bytes()
+        if data[:len(binary_format.MAGIC)] == binary_format.MAGIC:
+            policy = binary_format.loads(data, trusted=trusted)
+        else:
+            policy = NetworkPolicy.from_dict(json.loads(data))
+        self._snapshot_size = len(data)
+        self._entries = 0
+        self._damaged = False
+        
+        for patch, legacy in self._read_journal(hashlib.sha256(data).hexdigest()):
+            patch.apply(policy, legacy_keys=legacy)
+            self._entries += 1
+            if legacy:
+                # Со старыми ключами журнал не дописывается: следующее
+                # сохранение запишет снимок
+                self._damaged = True
+        
+        self._capture(policy)
+        return policy
+    
+    def _capture(self, policy: NetworkPolicy, devices: Optional[Dict[str, NetworkDevice]] = None,
+                 state: Optional[Dict[str, Any]] = None):
+        """Полностью пересобрать состояние последнего сохранения"""
+        if devices is None:
+            devices = _device_keys(policy)
+        self._state = state if state is not None else _policy_state(policy, devices)
+        self._devices = devices
+        self._keys = {id(device): key for key, device in devices.items()}
+        self._zones = {name: (zone, {id(device) for device in zone.devices})
+                       for name, zone in policy.zones.items()}
+        self._rules_layout = self._rule_layout(policy)
+        self._shared_keys = {key.rsplit('#', 1)[0] for key in devices if '#' in key}
+        self._mark_recorded(policy)
+    
+    def _mark_recorded(self, policy: NetworkPolicy):
+        # Хэш не считается, если политика не менялась после mark_clean()
+        if policy.dirty:
+            policy.mark_clean()
+        self._policy = policy
+        self._recorded_at = policy._clean_at
+    
+    @staticmethod
+    def _rule_layout(policy: NetworkPolicy) -> tuple:
+        return tuple((id(rule), rule._layout()) for rule in policy.rules)
+    
+    def _diff_changed(self, policy: NetworkPolicy) -> Optional[PolicyPatch]:
+        """
+        Патч по измененным зонам, устройствам и правилам
+        
+        Старое и новое состояния строятся только для затронутых ключей,
+        затем _state обновляется на месте. None - нужна полная
+        пересборка: совпали ключи устройств
+        """
+        state, moment = self._state, self._recorded_at
+        old_zones, new_zones = {}, {}
+        zones: Dict[str, Tuple[SecurityZone, Set[int]]] = {}
+        affected: Dict[int, NetworkDevice] = {}
+        
+        for name, zone in policy.zones.items():
+            recorded = self._zones.get(name)
+            if (recorded is not None and recorded[0] is zone
+                    and len(zone.devices) == len(recorded[1]) and not zone._changed_since(moment)):
+                zones[name] = recorded
+                continue
+            
+            members = {id(device): device for device in zone.devices}
+            previous = recorded[1] if recorded is not None else set()
+            for device_id, device in members.items():
+                if device_id not in previous or device._modified > moment:
+                    affected[device_id] = device
+            for device_id in previous - members.keys():
+                affected[device_id] = self._devices[self._keys[device_id]]
+            
+            zones[name] = (zone, set(members))
+            if name in state['zones']:
+                old_zones[name] = state['zones'][name]
+            new_zones[name] = _zone_fields(zone)
+        
+        for name in self._zones.keys() - zones.keys():
+            old_zones[name] = state['zones'][name]
+            for device_id in self._zones[name][1]:
+                affected[device_id] = self._devices[self._keys[device_id]]
+        
+        # Ключи: сначала освобождаются ключи ушедших и переименованных
+        # устройств, затем назначаются новые
+        old_devices, old_membership = {}, {}
+        placed, released = [], set()
+        for device_id, device in affected.items():
+            key = self._keys.get(device_id)
+            if key is not None:
+                old_devices[key] = state['devices'][key]
+                old_membership[key] = state['membership'].get(key, [])
+            
+            membership = [zone.name for zone, members in zones.values() if device_id in members]
+            base = _device_key(device)
+            if base in self._shared_keys or (key is not None and key.rsplit('#', 1)[0] in self._shared_keys):
+                return None
+            if key is not None and (not membership or key != base):
+                released.add(key)
+            if membership:
+                placed.append((device, base, membership))
+        
+        new_devices, new_membership = {}, {}
+        for device, base, membership in placed:
+            owner = self._devices.get(base, device)
+            if base in new_devices or (owner is not device and base not in released):
+                return None
+            new_devices[base] = device.to_dict()
+            new_membership[base] = membership
+        
+        rules = state['rules']
+        rules_layout = self._rule_layout(policy)
+        if rules_layout != self._rules_layout or any(rule._modified > moment for rule in policy.rules):
+            rules = [rule.to_dict() for rule in policy.rules]
+        
+        old = dict(state, zones=old_zones, devices=old_devices, membership=old_membership)
+        new = {
+            'name': policy.name,
+            'description': policy.description,
+            'zones': new_zones,
+            'devices': new_devices,
+            'membership': new_membership,
+            'rules': rules,
+        }
+        patch = _diff_states(old, new)
+        
+        # Перенос затронутой части в _state
+        for name in old_zones:
+            del state['zones'][name]
+        state['zones'].update(new_zones)
+        for key in old_devices:
+            del state['devices'][key]
+            state['membership'].pop(key, None)
+        state['devices'].update(new_devices)
+        state['membership'].update(new_membership)
+        state.update(name=policy.name, description=policy.description, rules=rules)
+        
+        for key in released:
+            del self._keys[id(self._devices.pop(key))]
+        for device, base, _ in placed:
+            self._devices[base] = device
+            self._keys[id(device)] = base
+        self._zones = zones
+        self._rules_layout = rules_layout
+        return patch
+    
+    def _read_journal(self, snapshot_hash: str):
+        if not self.journal_path.exists():
+            return
+        
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            header = f.readline()
+            if not header:
+                return
+            header = json.loads(header)
+            if header.get('snapshot') != snapshot_hash:
+                return
+            legacy = header.get('keys', 1) < DEVICE_KEY_VERSION
+            
+            for line in f:
+                if not line.endswith('\n'):
+                    # Недописанная запись после сбоя: дописывать после нее нельзя
+                    self._damaged = True
+                    break
+                yield PolicyPatch.from_dict(json.loads(line)), legacy
+    
+    def record(self, policy: NetworkPolicy) -> Optional[PolicyPatch]:
+        """
+        Сохранить текущее состояние политики
+        
+        Дописывает в журнал патч относительно последнего сохранения и
+        возвращает его (None - изменений нет). Без предыдущего состояния
+        или при переполнении журнала записывается полный снимок
+        """
+        if self._state is None or self._damaged:
+            self.compact(policy)
+            return None
+        
+        patch = self._diff_changed(policy) if policy is self._policy else None
+        full = patch is None
+        if full:
+            devices = _device_keys(policy)
+            state = _policy_state(policy, devices)
+            patch = _diff_states(self._state, state)
+            if patch and (self._shared_keys or any('#' in key for key in devices)):
+                # Суффиксы #2, #3... зависят от порядка устройств и после
+                # загрузки могут указать на другое устройство: пишется снимок
+                self.compact(policy)
+                return patch
+        
+        if patch:
+            line = json.dumps(patch.to_dict(), ensure_ascii=False) + '\n'
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._entries += 1
+        
+        if full:
+            self._capture(policy, devices, state)
+        else:
+            self._mark_recorded(policy)
+        
+        if not patch:
+            return None
+        
+        if self._entries >= self.max_entries or self.journal_path.stat().st_size > self._snapshot_size:
+            self.compact(policy)
+        
+        return patch
+    
+    def compact(self, policy: NetworkPolicy):
+        """Записать полный снимок и начать журнал заново"""
+        # Расширение сохраняется: по нему save_to_file выбирает формат
+        path = self.snapshot_path
+        temp_path = path.with_name(f"{path.stem}.tmp{path.suffix}")
+        policy.save_to_file(str(temp_path))
+        data = temp_path.read_bytes()
+        os.replace(temp_path, self.snapshot_path)
+        
+        header = json.dumps({'snapshot': hashlib.sha256(data).hexdigest(), 'keys': DEVICE_KEY_VERSION}) + '\n'
+        with open(self.journal_path, 'w', encoding='utf-8') as f:
+            f.write(header)
+        
+        self._capture(policy)
+        self._entries = 0
+        self._damaged = False
+        self._snapshot_size = len(data)
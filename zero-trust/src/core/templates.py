@@ -0,0 +1,85 @@
+"""
+Общий реестр шаблонов Jinja
+
+Генераторы конфигураций и движок правил получают окружение Jinja отсюда,
+а не создают свое: на каждый каталог шаблонов приходится одно окружение
+на процесс, скомпилированные шаблоны живут в его кэше, а байткод
+сохраняется на диск (FileSystemBytecodeCache), поэтому новые процессы -
+GUI, CLI, пакетные выгрузки - не компилируют шаблоны заново. Измененный
+файл шаблона перечитывается по времени изменения (auto_reload).
+"""
+
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template, TemplateAssertionError
+
+# Каталог шаблонов по умолчанию
+DEFAULT_TEMPLATE_DIR = Path(__file__).resolve().parent.parent.parent / "configs" / "templates"
+
+# Шаблон имени файлов кэша байткода
+BYTECODE_CACHE_PATTERN = '__zerotrust_%s.cache'
+
+PathLike = Union[str, Path]
+
+_environments: Dict[Tuple[str, bool], Environment] = {}
+_bytecode_cache: Optional[FileSystemBytecodeCache] = None
+_lock = threading.Lock()
+
+def _get_bytecode_cache() -> FileSystemBytecodeCache:
+    """Кэш байткода во временном каталоге пользователя"""
+    global _bytecode_cache
+    if _bytecode_cache is None:
+        _bytecode_cache = FileSystemBytecodeCache(pattern=BYTECODE_CACHE_PATTERN)
+    return _bytecode_cache
+
+def get_environment(template_dir: Optional[PathLike] = None, trim_blocks: bool = True) -> Environment:
+    """
+    Окружение Jinja для каталога шаблонов
+    
+    Повторный вызов с тем же каталогом возвращает то же окружение.
+    trim_blocks включает trim_blocks и lstrip_blocks, как в шаблонах
+    конфигураций
+    """
+    directory = str(Path(template_dir or DEFAULT_TEMPLATE_DIR).resolve())
+    key = (directory, trim_blocks)
+    
+    with _lock:
+        env = _environments.get(key)
+        if env is None:
+            env = _environments[key] = Environment(
+                loader=FileSystemLoader(directory),
+                trim_blocks=trim_blocks,
+                lstrip_blocks=trim_blocks,
+                auto_reload=True,
+                bytecode_cache=_get_bytecode_cache()
+            )
+    return env
+
+def get_template(name: str, template_dir: Optional[PathLike] = None) -> Template:
+    """Скомпилированный шаблон из общего окружения"""
+    return get_environment(template_dir).get_template(name)
+
+def precompile(template_dir: Optional[PathLike] = None) -> int:
+    """
+    Скомпилировать все шаблоны каталога заранее
+    
+    Возвращает число скомпилированных шаблонов; удобно вызывать при
+    запуске приложения. Шаблоны с фильтрами, которые регистрирует
+    конкретный генератор, компилируются при первом использовании
+    """
+    env = get_environment(template_dir)
+    count = 0
+    for name in env.list_templates():
+        try:
+            env.get_template(name)
+        except TemplateAssertionError:
+            continue
+        count += 1
+    return count
+
+def clear():
+    """Сбросить окружения процесса (кэш байткода на диске остается)"""
+    with _lock:
+        _environments.clear()
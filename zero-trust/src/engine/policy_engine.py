@@ -6,18 +6,19 @@ from typing import List, Dict, Optional
 from pathlib import Path
 import jinja2
 
-from ..core.models import NetworkPolicy, Rule, SecurityZone
+from ..core.models import NetworkPolicy, SecurityRule, SecurityZone
 from ..core.exceptions import RuleGenerationError
+from ..core.generator import PLATFORMS, PolicyGenerator
+from ..core.templates import DEFAULT_TEMPLATE_DIR, get_environment
 
 class PolicyEngine:
     """Движок для обработки и генерации правил безопасности"""
     
     def __init__(self, templates_dir: Optional[Path] = None):
-        self.templates_dir = templates_dir or Path(__file__).parent / "templates"
-        self.template_env = jinja2.Environment(
-            loader=jinja2.FileSystemLoader(self.templates_dir),
-            autoescape=jinja2.select_autoescape()
-        )
+        self.templates_dir = templates_dir or DEFAULT_TEMPLATE_DIR
+        # Шаблоны .j2 не экранировались и раньше: select_autoescape
+        # включает экранирование только для html и xml
+        self.template_env = get_environment(self.templates_dir, trim_blocks=False)
     
     def generate_firewall_rules(self, policy: NetworkPolicy, 
                                target_platform: str = "mikrotik") -> str:
@@ -26,12 +27,18 @@ class PolicyEngine:
         
         Args:
             policy: Политика безопасности
-            target_platform: Целевая платформа (mikrotik, ubiquiti, iptables)
+            target_platform: Целевая платформа: ключ PLATFORMS генератора
+                (mikrotik, iptables, nftables...) или имя шаблона .j2
         
         Returns:
             Сгенерированные правила в текстовом формате
         """
         try:
+            # Платформы генератора конфигураций собирает он сам
+            if target_platform in PLATFORMS:
+                generator = PolicyGenerator(str(self.templates_dir))
+                return "".join(generator.stream_config(policy, target_platform))
+            
             # Загружаем шаблон для целевой платформы
             template_file = f"{target_platform}.j2"
             template = self.template_env.get_template(template_file)
@@ -73,7 +80,7 @@ class PolicyEngine:
         
         return optimized_policy
     
-    def _merge_rules(self, rules: List[Rule]) -> List[Rule]:
+    def _merge_rules(self, rules: List[SecurityRule]) -> List[SecurityRule]:
         """Объединить дублирующиеся и противоречивые правила"""
         merged_rules = []
         rules_by_pair = {}
@@ -101,7 +108,7 @@ class PolicyEngine:
         
         return merged_rules
     
-    def validate_rule_conflicts(self, rules: List[Rule]) -> List[Dict]:
+    def validate_rule_conflicts(self, rules: List[SecurityRule]) -> List[Dict]:
         """Проверить конфликты правил"""
         conflicts = []
         
@@ -120,7 +127,7 @@ class PolicyEngine:
         
         return conflicts
     
-    def _are_rules_conflicting(self, rule1: Rule, rule2: Rule) -> bool:
+    def _are_rules_conflicting(self, rule1: SecurityRule, rule2: SecurityRule) -> bool:
         """Проверить, конфликтуют ли два правила"""
         # Правила конфликтуют если:
         # 1. Они между одними и теми же зонами
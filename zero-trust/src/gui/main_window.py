@@ -15,7 +15,7 @@ from PyQt6.QtWidgets import (
     QDialog, QLineEdit, QComboBox, QFormLayout, QDialogButtonBox,
     QGraphicsView, QGraphicsScene, QGraphicsRectItem, QGraphicsTextItem,
     QGraphicsEllipseItem, QGraphicsItem, QMenu, QInputDialog,
-    QFileDialog, QApplication
+    QFileDialog, QApplication, QCheckBox
 )
 from PyQt6.QtCore import (
     Qt, QTimer, pyqtSignal, QThread, QPointF, QRectF,
@@ -602,9 +602,14 @@ class MainWindow(QMainWindow):
         platform_layout.addWidget(QLabel("Платформа:"))
         
         self.platform_combo = QComboBox()
-        self.platform_combo.addItems(["OpenWrt", "iptables", "Windows Firewall"])
+        self.platform_combo.addItems(["OpenWrt", "iptables", "iptables (ipset)", "iptables-restore",
+                                      "ip6tables-restore", "nftables", "Windows Firewall",
+                                      "Windows Firewall (grouped)", "MikroTik"])
         platform_layout.addWidget(self.platform_combo)
         
+        self.aggregate_check = QCheckBox("Агрегировать адреса в CIDR")
+        platform_layout.addWidget(self.aggregate_check)
+        
         self.btn_generate = QPushButton("Сгенерировать")
         platform_layout.addWidget(self.btn_generate)
         platform_layout.addStretch()
@@ -726,11 +731,8 @@ class MainWindow(QMainWindow):
         
         for device in self.devices:
             # Находим зону устройства
-            zone_name = "Не распределено"
-            for zone in self.current_policy.zones.values():
-                if device in zone.devices:
-                    zone_name = zone.name
-                    break
+            zone = self.current_policy.zone_of(device)
+            zone_name = zone.name if zone else "Не распределено"
             
             item = QTreeWidgetItem([
                 device.display_name,
@@ -959,7 +961,7 @@ class MainWindow(QMainWindow):
         
         # Очищаем все зоны
         for zone in self.current_policy.zones.values():
-            zone.devices.clear()
+            zone.clear_devices()
         
         # Распределяем устройства по зонам
         for device in self.devices:
@@ -1057,12 +1059,8 @@ class MainWindow(QMainWindow):
     
     def on_device_dropped(self, device: NetworkDevice, zone: SecurityZone):
         """Обработка перетаскивания устройства на зону"""
-        # Удаляем устройство из всех зон
-        for z in self.current_policy.zones.values():
-            z.remove_device(device)
-        
-        # Добавляем в новую зону
-        zone.add_device(device)
+        # Переносим устройство из прежних зон в новую
+        self.current_policy.move_device(device, zone)
         
         # Обновляем интерфейс
         self.update_device_list()
@@ -1094,7 +1092,7 @@ class MainWindow(QMainWindow):
             self,
             "Сохранить политику",
             "exports/policy.json",
-            "JSON Files (*.json)"
+            "JSON Files (*.json);;Binary Policy (*.ztpb)"
         )
         
         if file_path:
@@ -1111,14 +1109,23 @@ class MainWindow(QMainWindow):
             self,
             "Загрузить политику",
             "exports",
-            "JSON Files (*.json)"
+            "JSON Files (*.json);;Binary Policy (*.ztpb)"
         )
         
         if file_path:
             try:
                 self.current_policy = NetworkPolicy.load_from_file(file_path)
                 
+                # Зоны загруженной политики держат свои объекты устройств:
+                # они заменяют найденные сканированием, остальные найденные
+                # устройства остаются нераспределенными
+                loaded = self.current_policy.unique_devices()
+                known = {(device.mac_address, device.ip_address) for device in loaded}
+                self.devices = loaded + [device for device in self.devices
+                                         if (device.mac_address, device.ip_address) not in known]
+                
                 # Обновляем интерфейс
+                self.update_device_list()
                 self.update_zones_list()
                 self.update_rules_list()
                 self.update_canvas()
@@ -1137,12 +1144,25 @@ class MainWindow(QMainWindow):
     def generate_config(self):
         """Сгенерировать конфигурацию"""
         platform = self.platform_combo.currentText().lower()
+        self.generator.aggregate = self.aggregate_check.isChecked()
         
         try:
             if platform == "openwrt":
                 config = self.generator.generate_openwrt_config(self.current_policy)
             elif platform == "iptables":
                 config = self.generator.generate_iptables_config(self.current_policy)
+            elif platform == "iptables (ipset)":
+                config = self.generator.generate_iptables_config(self.current_policy, use_ipset=True)
+            elif platform == "iptables-restore":
+                config = self.generator.generate_iptables_restore(self.current_policy)
+            elif platform == "ip6tables-restore":
+                config = self.generator.generate_iptables_restore(self.current_policy, ip_version=6)
+            elif platform == "nftables":
+                config = self.generator.generate_nftables_config(self.current_policy)
+            elif platform == "mikrotik":
+                config = self.generator.generate_mikrotik_config(self.current_policy)
+            elif platform == "windows firewall (grouped)":
+                config = self.generator.generate_windows_firewall(self.current_policy, grouped=True)
             elif "windows" in platform:
                 config = self.generator.generate_windows_firewall(self.current_policy)
             else:
@@ -1172,10 +1192,14 @@ class MainWindow(QMainWindow):
         extensions = {
             "openwrt": "conf",
             "iptables": "sh",
-            "windows": "ps1"
+            "iptables-restore": "rules",
+            "ip6tables-restore": "rules",
+            "nftables": "nft",
+            "windows": "ps1",
+            "mikrotik": "rsc"
         }
         
-        ext = extensions.get(platform, "txt")
+        ext = extensions.get(platform.split(" ")[0], "txt")
         
         file_path, _ = QFileDialog.getSaveFileName(
             self,
@@ -4,9 +4,10 @@
 
 import os
 from typing import Dict, List, Optional
-from jinja2 import Environment, FileSystemLoader, Template
+from jinja2 import Template
 
 from ..core.models import NetworkPolicy, Rule, ActionType, ProtocolType
+from ..core.templates import get_environment
 
 class PolicyGenerator:
     """Генератор правил безопасности для различных платформ"""
@@ -19,14 +20,10 @@ class PolicyGenerator:
                 '../../../configs/templates'
             )
         
-        # Создаем окружение Jinja2
-        self.env = Environment(
-            loader=FileSystemLoader(template_dir),
-            trim_blocks=True,
-            lstrip_blocks=True
-        )
+        # Берем общее окружение Jinja2 из реестра шаблонов
+        self.env = get_environment(template_dir)
         
-        # Регистрируем фильтры
+        # Регистрируем фильтры (окружение общее, фильтры не зависят от экземпляра)
         self.env.filters['action_to_str'] = self._action_to_str
         self.env.filters['protocol_to_str'] = self._protocol_to_str
     
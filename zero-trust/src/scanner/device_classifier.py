@@ -3,13 +3,14 @@
 """
 
 import re
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 import json
 from pathlib import Path
 
 from src.core.models import NetworkDevice, DeviceType
 from src.core.constants import ASSETS_DIR
 from src.core.exceptions import DeviceClassificationError
+from src.scanner.scoring_classifier import ScoringClassifier
 
 class DeviceClassifier:
     """Классификатор сетевых устройств"""
@@ -18,13 +19,14 @@ class DeviceClassifier:
         self.oui_db = self._load_oui_database()
         self.fingerprints = self._load_fingerprints()
         self.rules = self._get_classification_rules()
+        self.scorer = ScoringClassifier(self.fingerprints, self.oui_db)
     
     def _load_oui_database(self) -> Dict[str, str]:
         """
         Загрузить базу данных OUI (Organizationally Unique Identifier)
         MAC-адреса: первые 3 байта определяют производителя
         """
-        oui_file = ASSETS_DIR / "oui_database.json"
+        oui_file = Path(ASSETS_DIR) / "oui_database.json"
         
         if oui_file.exists():
             with open(oui_file, 'r', encoding='utf-8') as f:
@@ -59,7 +61,7 @@ class DeviceClassifier:
     
     def _load_fingerprints(self) -> Dict:
         """Загрузить отпечатки устройств"""
-        fingerprints_file = ASSETS_DIR / "device_fingerprints.json"
+        fingerprints_file = Path(ASSETS_DIR) / "device_fingerprints.json"
         
         if fingerprints_file.exists():
             with open(fingerprints_file, 'r', encoding='utf-8') as f:
@@ -140,6 +142,20 @@ class DeviceClassifier:
         # 3. Если не удалось, классифицируем по портам
         return self._classify_by_ports(device)
     
+    def classify_with_confidence(self, device: NetworkDevice) -> Tuple[DeviceType, float]:
+        """
+        Классифицировать устройство взвешенной моделью за один проход
+        
+        Returns:
+            Кортеж (тип устройства, уверенность 0..1)
+        """
+        if device.mac_address and not device.vendor:
+            vendor = self.get_vendor_from_mac(device.mac_address)
+            if vendor:
+                device.vendor = vendor
+        
+        return self.scorer.classify(device)
+    
     def get_vendor_from_mac(self, mac: str) -> Optional[str]:
         """
         Определить производителя по MAC-адресу
@@ -3,6 +3,9 @@
 """
 
 import json
+import itertools
+import threading
+import weakref
 from pathlib import Path
 from typing import Dict, List, Optional
 import sqlite3
@@ -11,63 +14,498 @@ from datetime import datetime
 from ..core.constants import ASSETS_DIR
 from ..core.models import NetworkDevice, DeviceType
 
+# Настройки каждого соединения (journal_mode=WAL хранится в самом файле БД)
+CONNECTION_PRAGMAS = (
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -16000',
+    'PRAGMA mmap_size = 268435456',
+    'PRAGMA busy_timeout = 5000',
+)
+
+# Размер кэша подготовленных выражений на соединение
+STATEMENT_CACHE_SIZE = 256
+
+# Версия схемы (миграции в FingerprintDatabase._migrate_schema) и версия
+# начальных данных. Увеличение SEED_VERSION заменяет начальные записи
+SCHEMA_VERSION = 3
+SEED_VERSION = 1
+
+# Обе версии хранятся в PRAGMA user_version: схема в старших 16 битах
+DATABASE_VERSION = (SCHEMA_VERSION << 16) | SEED_VERSION
+
+# Вторичные индексы: имя -> определение. Массовый импорт удаляет их на время
+# загрузки и строит заново по этому же списку
+SECONDARY_INDEXES = {
+    'idx_mac_prefix': 'CREATE INDEX IF NOT EXISTS idx_mac_prefix ON device_fingerprints(mac_prefix)',
+    'idx_device_type': 'CREATE INDEX IF NOT EXISTS idx_device_type ON device_fingerprints(device_type)',
+    'idx_vendor': 'CREATE INDEX IF NOT EXISTS idx_vendor ON device_fingerprints(vendor)',
+    'idx_fingerprint_ports_port': 'CREATE INDEX IF NOT EXISTS idx_fingerprint_ports_port ON fingerprint_ports(port)',
+    'idx_vulnerabilities_vendor_type': '''
+        CREATE INDEX IF NOT EXISTS idx_vulnerabilities_vendor_type
+        ON known_vulnerabilities(vendor COLLATE NOCASE, device_type)
+    ''',
+    'idx_vulnerabilities_device_type': '''
+        CREATE INDEX IF NOT EXISTS idx_vulnerabilities_device_type
+        ON known_vulnerabilities(device_type)
+    ''',
+}
+
+# Полнотекстовый индекс описаний уязвимостей поверх known_vulnerabilities
+# (external content: сам текст хранится только в основной таблице)
+SQL_CREATE_VULNERABILITY_FTS = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS vulnerability_fts USING fts5(
+        description,
+        content = 'known_vulnerabilities',
+        content_rowid = 'id'
+    )
+'''
+
+SQL_REBUILD_VULNERABILITY_FTS = "INSERT INTO vulnerability_fts (vulnerability_fts) VALUES ('rebuild')"
+
+# Триггеры синхронизации FTS-индекса. Массовый импорт удаляет их на время
+# загрузки и перестраивает индекс целиком
+FTS_TRIGGERS = {
+    'vulnerability_fts_ai': '''
+        CREATE TRIGGER IF NOT EXISTS vulnerability_fts_ai
+        AFTER INSERT ON known_vulnerabilities BEGIN
+            INSERT INTO vulnerability_fts (rowid, description) VALUES (new.id, new.description);
+        END
+    ''',
+    'vulnerability_fts_ad': '''
+        CREATE TRIGGER IF NOT EXISTS vulnerability_fts_ad
+        AFTER DELETE ON known_vulnerabilities BEGIN
+            INSERT INTO vulnerability_fts (vulnerability_fts, rowid, description)
+            VALUES ('delete', old.id, old.description);
+        END
+    ''',
+    'vulnerability_fts_au': '''
+        CREATE TRIGGER IF NOT EXISTS vulnerability_fts_au
+        AFTER UPDATE OF description ON known_vulnerabilities BEGIN
+            INSERT INTO vulnerability_fts (vulnerability_fts, rowid, description)
+            VALUES ('delete', old.id, old.description);
+            INSERT INTO vulnerability_fts (rowid, description) VALUES (new.id, new.description);
+        END
+    ''',
+}
+
+# Запросы вынесены в константы: sqlite3 переиспользует подготовленные
+# выражения по тексту запроса в пределах соединения
+SQL_INSERT_FINGERPRINT = '''
+    INSERT INTO device_fingerprints
+    (vendor, device_type, mac_prefix, common_ports, http_headers, banners, model, confidence, source)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+SQL_INSERT_FINGERPRINT_PORT = '''
+    INSERT OR IGNORE INTO fingerprint_ports (fingerprint_id, port) VALUES (?, ?)
+'''
+
+SQL_DELETE_FINGERPRINT_PORTS = '''
+    DELETE FROM fingerprint_ports
+    WHERE fingerprint_id IN (SELECT id FROM device_fingerprints WHERE source = ?)
+'''
+
+SQL_DELETE_FINGERPRINTS = 'DELETE FROM device_fingerprints WHERE source = ?'
+
+# Начальные записи из баз без версии опознаются по содержимому
+SQL_LEGACY_SEED_FILTER = '''
+    source IS NULL AND vendor = ? AND model IS ? AND device_type = ? AND common_ports = ?
+'''
+
+SQL_DELETE_LEGACY_SEED_PORTS = f'''
+    DELETE FROM fingerprint_ports
+    WHERE fingerprint_id IN (SELECT id FROM device_fingerprints WHERE {SQL_LEGACY_SEED_FILTER})
+'''
+
+SQL_DELETE_LEGACY_SEED = f'DELETE FROM device_fingerprints WHERE {SQL_LEGACY_SEED_FILTER}'
+
+# Все столбцы уязвимости, как у прежнего SELECT *
+SQL_VULNERABILITY_COLUMNS = 'v.*'
+
+# Выборка по (есть тип, есть производитель). Производитель сравнивается без
+# учета регистра, как в пакетной выборке: в фидах NVD производители пишутся
+# строчными ("hikvision"), а классификатор дает "Hikvision". Это же
+# сравнение использует индекс idx_vulnerabilities_vendor_type;
+# параметры: производитель, затем тип
+SQL_GET_VULNERABILITIES = {
+    (False, False): f'SELECT {SQL_VULNERABILITY_COLUMNS} FROM known_vulnerabilities AS v',
+    (True, False): f'''
+        SELECT {SQL_VULNERABILITY_COLUMNS} FROM known_vulnerabilities AS v
+        WHERE v.device_type = ?
+    ''',
+    (False, True): f'''
+        SELECT {SQL_VULNERABILITY_COLUMNS} FROM known_vulnerabilities AS v
+        WHERE v.vendor = ? COLLATE NOCASE
+    ''',
+    (True, True): f'''
+        SELECT {SQL_VULNERABILITY_COLUMNS} FROM known_vulnerabilities AS v
+        WHERE v.vendor = ? COLLATE NOCASE AND v.device_type = ?
+    ''',
+}
+
+SQL_SEARCH_VULNERABILITIES = f'''
+    SELECT {SQL_VULNERABILITY_COLUMNS}
+    FROM vulnerability_fts
+    JOIN known_vulnerabilities AS v ON v.id = vulnerability_fts.rowid
+    WHERE vulnerability_fts MATCH ?
+    ORDER BY vulnerability_fts.rank
+    LIMIT ?
+'''
+
+# Запасной вариант для сборок SQLite без FTS5
+SQL_SEARCH_VULNERABILITIES_LIKE = f'''
+    SELECT {SQL_VULNERABILITY_COLUMNS}
+    FROM known_vulnerabilities AS v
+    WHERE v.description LIKE ? ESCAPE '\\'
+    LIMIT ?
+'''
+
+SQL_CREATE_INVENTORY_TABLE = '''
+    CREATE TEMP TABLE IF NOT EXISTS batch_inventory (
+        key_idx INTEGER PRIMARY KEY,
+        vendor TEXT,
+        device_type TEXT
+    )
+'''
+
+SQL_INSERT_INVENTORY = 'INSERT INTO temp.batch_inventory (key_idx, vendor, device_type) VALUES (?, ?, ?)'
+
+# Уязвимость применима к устройству, если ее производитель совпадает с
+# производителем устройства или не указан (общие уязвимости подходят и
+# устройствам без производителя), а тип уязвимости не указан или совпадает
+# с типом устройства; для устройств неизвестного типа (NULL) подходят все
+# типы. Ветви UNION ALL не пересекаются и каждая использует индекс по
+# (vendor, device_type); унарный плюс не дает планировщику выбрать для
+# IS NULL индекс только по типу
+SQL_INVENTORY_VULNERABILITIES = f'''
+    SELECT b.key_idx, {SQL_VULNERABILITY_COLUMNS}
+    FROM temp.batch_inventory AS b
+    JOIN known_vulnerabilities AS v
+        ON v.vendor = b.vendor COLLATE NOCASE AND v.device_type = b.device_type
+    UNION ALL
+    SELECT b.key_idx, {SQL_VULNERABILITY_COLUMNS}
+    FROM temp.batch_inventory AS b
+    JOIN known_vulnerabilities AS v
+        ON v.vendor = b.vendor COLLATE NOCASE AND +v.device_type IS NULL
+    UNION ALL
+    SELECT b.key_idx, {SQL_VULNERABILITY_COLUMNS}
+    FROM temp.batch_inventory AS b
+    JOIN known_vulnerabilities AS v
+        ON v.vendor = b.vendor COLLATE NOCASE AND v.device_type IS NOT NULL
+    WHERE b.device_type IS NULL
+    UNION ALL
+    SELECT b.key_idx, {SQL_VULNERABILITY_COLUMNS}
+    FROM temp.batch_inventory AS b
+    JOIN known_vulnerabilities AS v
+        ON v.vendor IS NULL
+        AND (v.device_type IS NULL OR b.device_type IS NULL OR v.device_type = b.device_type)
+'''
+
+# Кандидаты: совпадение по MAC-префиксу и по пересечению портов через индекс
+# fingerprint_ports(port). Порты передаются JSON-массивом, чтобы текст запроса
+# не зависел от их количества. Лучший кандидат - с совпавшим MAC-префиксом,
+# затем с наибольшим числом общих портов, затем с наибольшей уверенностью
+SQL_MATCH_DEVICE = '''
+    SELECT f.*, SUM(c.mac_match) AS mac_match, SUM(c.port_overlap) AS port_overlap
+    FROM (
+        SELECT fingerprint_id AS id, 0 AS mac_match, COUNT(*) AS port_overlap
+        FROM fingerprint_ports
+        WHERE port IN (SELECT value FROM json_each(?))
+        GROUP BY fingerprint_id
+        UNION ALL
+        SELECT id, 1, 0 FROM device_fingerprints WHERE mac_prefix = ?
+    ) AS c
+    JOIN device_fingerprints AS f ON f.id = c.id
+    GROUP BY f.id
+    ORDER BY mac_match DESC, port_overlap DESC, f.confidence DESC, f.id
+    LIMIT 1
+'''
+
+# Временные таблицы пакетного сопоставления (живут в пределах соединения)
+SQL_CREATE_BATCH_TABLES = (
+    '''
+    CREATE TEMP TABLE IF NOT EXISTS batch_devices (
+        device_idx INTEGER PRIMARY KEY,
+        mac_prefix TEXT
+    )
+    ''',
+    '''
+    CREATE TEMP TABLE IF NOT EXISTS batch_ports (
+        device_idx INTEGER NOT NULL,
+        port INTEGER NOT NULL,
+        PRIMARY KEY (port, device_idx)
+    ) WITHOUT ROWID
+    ''',
+)
+
+SQL_INSERT_BATCH_DEVICE = 'INSERT INTO temp.batch_devices (device_idx, mac_prefix) VALUES (?, ?)'
+
+SQL_INSERT_BATCH_PORT = 'INSERT OR IGNORE INTO temp.batch_ports (device_idx, port) VALUES (?, ?)'
+
+# Те же критерии ранжирования, что и в SQL_MATCH_DEVICE, но для всех
+# устройств пакета сразу: лучший отпечаток выбирается оконной функцией
+SQL_MATCH_BATCH = '''
+    WITH hits AS (
+        SELECT bp.device_idx AS idx, fp.fingerprint_id AS id,
+               0 AS mac_match, COUNT(*) AS port_overlap
+        FROM temp.batch_ports AS bp
+        JOIN fingerprint_ports AS fp ON fp.port = bp.port
+        GROUP BY bp.device_idx, fp.fingerprint_id
+        UNION ALL
+        SELECT bd.device_idx, f.id, 1, 0
+        FROM temp.batch_devices AS bd
+        JOIN device_fingerprints AS f ON f.mac_prefix = bd.mac_prefix
+    ),
+    ranked AS (
+        SELECT h.idx, h.id,
+               SUM(h.mac_match) AS mac_match,
+               SUM(h.port_overlap) AS port_overlap,
+               ROW_NUMBER() OVER (
+                   PARTITION BY h.idx
+                   ORDER BY SUM(h.mac_match) DESC, SUM(h.port_overlap) DESC,
+                            f.confidence DESC, f.id
+               ) AS position
+        FROM hits AS h
+        JOIN device_fingerprints AS f ON f.id = h.id
+        GROUP BY h.idx, h.id
+    )
+    SELECT r.idx AS device_idx, f.*, r.mac_match, r.port_overlap
+    FROM ranked AS r
+    JOIN device_fingerprints AS f ON f.id = r.id
+    WHERE r.position = 1
+'''
+
+_memory_db_counter = itertools.count()
+
+class _ThreadConnection:
+    """Соединение в thread-local: освобождается вместе с данными потока"""
+    __slots__ = ('conn', '__weakref__')
+    
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+def _release_connection(connections: List[sqlite3.Connection], lock: threading.Lock,
+                        conn: sqlite3.Connection):
+    """Закрыть соединение завершившегося потока, если его не закрыл close()"""
+    with lock:
+        if not any(c is conn for c in connections):
+            return
+        connections.remove(conn)
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
 class FingerprintDatabase:
     """База данных для хранения и сопоставления отпечатков устройств"""
     
     def __init__(self, db_path: Optional[Path] = None):
-        self.db_path = db_path or ASSETS_DIR / "fingerprints.db"
+        self.db_path = db_path or Path(ASSETS_DIR) / "fingerprints.db"
+        
+        # ":memory:" превращаем в именованную общую БД, иначе у каждого
+        # потока была бы своя пустая база
+        if str(self.db_path) == ':memory:':
+            self._uri = f"file:zerotrust_fingerprints_{next(_memory_db_counter)}?mode=memory&cache=shared"
+        else:
+            self._uri = None
+        
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._fulltext: Optional[bool] = None
+        
         self.init_database()
     
-    def init_database(self):
-        """Инициализация базы данных"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Таблица отпечатков устройств
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS device_fingerprints (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                vendor TEXT NOT NULL,
-                model TEXT,
-                mac_prefix TEXT,
-                common_ports TEXT,  # JSON список портов
-                http_headers TEXT,  # JSON заголовки HTTP
-                banners TEXT,       # JSON баннеры сервисов
-                device_type TEXT,
-                confidence REAL DEFAULT 0.8,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    def _connect(self) -> sqlite3.Connection:
+        """Открыть и настроить новое соединение"""
+        if self._uri:
+            conn = sqlite3.connect(
+                self._uri,
+                uri=True,
+                check_same_thread=False,
+                cached_statements=STATEMENT_CACHE_SIZE
             )
-        ''')
-        
-        # Таблица известных уязвимостей
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS known_vulnerabilities (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                cve_id TEXT UNIQUE,
-                device_type TEXT,
-                vendor TEXT,
-                affected_versions TEXT,
-                severity TEXT,
-                description TEXT,
-                mitigation TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        else:
+            conn = sqlite3.connect(
+                self.db_path,
+                check_same_thread=False,
+                cached_statements=STATEMENT_CACHE_SIZE
             )
-        ''')
+        conn.row_factory = sqlite3.Row
         
-        # Индексы для ускорения поиска
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_mac_prefix ON device_fingerprints(mac_prefix)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_device_type ON device_fingerprints(device_type)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_vendor ON device_fingerprints(vendor)')
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
         
-        conn.commit()
-        conn.close()
+        with self._connections_lock:
+            self._connections.append(conn)
+        
+        return conn
+    
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """
+        Соединение текущего потока
+        
+        Каждый поток (например, воркер сканера) получает собственное
+        постоянное соединение, которое открывается один раз и затем
+        переиспользуется всеми методами. Соединение закрывается, когда
+        поток завершается и его thread-local данные удаляются
+        """
+        holder = getattr(self._local, 'holder', None)
+        if holder is None:
+            conn = self._connect()
+            holder = self._local.holder = _ThreadConnection(conn)
+            weakref.finalize(holder, _release_connection, self._connections, self._connections_lock, conn)
+        return holder.conn
+    
+    def close(self):
+        """Закрыть все соединения, открытые этим экземпляром"""
+        with self._connections_lock:
+            connections = list(self._connections)
+            self._connections.clear()
+        
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
         
-        # Загрузка начальных данных
-        self._load_initial_data()
+        self._local = threading.local()
     
-    def _load_initial_data(self):
-        """Загрузка начальных данных в базу"""
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+    
+    def init_database(self):
+        """
+        Инициализация базы данных
+        
+        Версии схемы и начальных данных хранятся в PRAGMA user_version,
+        поэтому открытие актуальной базы стоит одного чтения pragma.
+        Миграции выполняются в транзакции BEGIN IMMEDIATE: если несколько
+        воркеров открывают новую базу одновременно, обновляет ее только
+        первый, остальные видят уже актуальную версию
+        """
+        conn = self.connection
+        
+        if conn.execute('PRAGMA user_version').fetchone()[0] == DATABASE_VERSION:
+            return
+        
+        # WAL позволяет воркерам читать параллельно с записью
+        if not self._uri:
+            conn.execute('PRAGMA journal_mode = WAL')
+        
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            schema_version, seed_version = version >> 16, version & 0xFFFF
+            
+            # База создана более новой версией программы - не трогаем ее
+            if schema_version > SCHEMA_VERSION:
+                conn.rollback()
+                return
+            
+            if schema_version < SCHEMA_VERSION:
+                self._migrate_schema(conn, schema_version)
+            
+            if seed_version != SEED_VERSION:
+                self._load_initial_data(conn, legacy=(version == 0))
+            
+            conn.execute(f'PRAGMA user_version = {DATABASE_VERSION}')
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    
+    def _migrate_schema(self, conn: sqlite3.Connection, version: int):
+        """Применить миграции схемы, начиная с версии version"""
+        if version < 1:
+            # Таблица отпечатков устройств
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS device_fingerprints (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    vendor TEXT NOT NULL,
+                    model TEXT,
+                    mac_prefix TEXT,
+                    common_ports TEXT,  -- JSON список портов
+                    http_headers TEXT,  -- JSON заголовки HTTP
+                    banners TEXT,       -- JSON баннеры сервисов
+                    device_type TEXT,
+                    confidence REAL DEFAULT 0.8,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Таблица известных уязвимостей
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS known_vulnerabilities (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    cve_id TEXT UNIQUE,
+                    device_type TEXT,
+                    vendor TEXT,
+                    affected_versions TEXT,
+                    severity TEXT,
+                    description TEXT,
+                    mitigation TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Нормализованные порты отпечатков для индексного поиска
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS fingerprint_ports (
+                    fingerprint_id INTEGER NOT NULL
+                        REFERENCES device_fingerprints(id) ON DELETE CASCADE,
+                    port INTEGER NOT NULL,
+                    PRIMARY KEY (fingerprint_id, port)
+                ) WITHOUT ROWID
+            ''')
+            
+            # Переносим порты из JSON-столбца для отпечатков, добавленных до
+            # появления таблицы fingerprint_ports
+            conn.execute('''
+                INSERT OR IGNORE INTO fingerprint_ports (fingerprint_id, port)
+                SELECT f.id, j.value
+                FROM device_fingerprints AS f, json_each(f.common_ports) AS j
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM fingerprint_ports AS p WHERE p.fingerprint_id = f.id
+                )
+            ''')
+        
+        if version < 2:
+            # Происхождение записи: 'seed' для начальных данных, источник
+            # импорта или NULL для добавленных вручную
+            conn.execute('ALTER TABLE device_fingerprints ADD COLUMN source TEXT')
+        
+        if version < 3:
+            # Полнотекстовый поиск по описаниям уязвимостей. Если SQLite
+            # собран без FTS5, search_vulnerabilities использует LIKE
+            try:
+                conn.execute(SQL_CREATE_VULNERABILITY_FTS)
+            except sqlite3.OperationalError:
+                pass
+            else:
+                for statement in FTS_TRIGGERS.values():
+                    conn.execute(statement)
+                conn.execute(SQL_REBUILD_VULNERABILITY_FTS)
+        
+        # Индексы создаются после всех миграций, так как могут ссылаться
+        # на добавленные ими столбцы
+        for statement in SECONDARY_INDEXES.values():
+            conn.execute(statement)
+    
+    def _load_initial_data(self, conn: sqlite3.Connection, legacy: bool = False):
+        """
+        Загрузка начальных данных в базу
+        
+        Прежние начальные записи (source = 'seed') заменяются текущими.
+        legacy - база без версии, в которую начальные данные вставлялись
+        при каждом открытии; их дубликаты без source тоже удаляются
+        """
         initial_fingerprints = [
             {
                 "vendor": "Raspberry Pi",
@@ -102,110 +540,184 @@ class FingerprintDatabase:
             },
         ]
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        conn.execute(SQL_DELETE_FINGERPRINT_PORTS, ('seed',))
+        conn.execute(SQL_DELETE_FINGERPRINTS, ('seed',))
         
-        for fp in initial_fingerprints:
-            cursor.execute('''
-                INSERT OR IGNORE INTO device_fingerprints 
-                (vendor, model, mac_prefix, common_ports, device_type)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                fp["vendor"],
-                fp.get("model"),
-                fp.get("mac_prefix"),
-                json.dumps(fp.get("common_ports", [])),
-                fp["device_type"]
-            ))
+        if legacy:
+            for fp in initial_fingerprints:
+                params = (fp['vendor'], fp.get('model'), fp['device_type'], json.dumps(fp['common_ports']))
+                conn.execute(SQL_DELETE_LEGACY_SEED_PORTS, params)
+                conn.execute(SQL_DELETE_LEGACY_SEED, params)
         
-        conn.commit()
-        conn.close()
+        for fp in initial_fingerprints:
+            self._insert_fingerprint(conn, source='seed', **fp)
     
     def match_device(self, device: NetworkDevice) -> Dict:
         """
         Найти совпадение для устройства в базе отпечатков
+        
+        Returns:
+            Лучший отпечаток с полями mac_match (совпал MAC-префикс)
+            и port_overlap (число общих портов) или пустой словарь
         """
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        if not device.mac_address and not device.open_ports:
+            return {}
         
-        matches = []
+        row = self.connection.execute(
+            SQL_MATCH_DEVICE,
+            (json.dumps(list(device.open_ports)), self._mac_prefix(device.mac_address))
+        ).fetchone()
         
-        # Поиск по MAC-префиксу
-        if device.mac_address:
-            mac_prefix = ':'.join(device.mac_address.upper().split(':')[:3])
-            cursor.execute(
-                'SELECT * FROM device_fingerprints WHERE mac_prefix = ?',
-                (mac_prefix,)
-            )
-            matches.extend(cursor.fetchall())
-        
-        # Поиск по открытым портам
-        if device.open_ports:
-            # Конвертируем порты в JSON для поиска
-            for row in cursor.execute('SELECT * FROM device_fingerprints'):
-                common_ports = json.loads(row['common_ports'])
-                if set(common_ports).intersection(set(device.open_ports)):
-                    matches.append(row)
-        
-        # Убираем дубликаты
-        unique_matches = []
-        seen_ids = set()
-        for match in matches:
-            if match['id'] not in seen_ids:
-                unique_matches.append(dict(match))
-                seen_ids.add(match['id'])
+        return dict(row) if row else {}
+    
+    def match_devices(self, devices: List[NetworkDevice]) -> List[Dict]:
+        """
+        Найти совпадения для целого пакета устройств
         
-        conn.close()
+        MAC-префиксы и порты пакета загружаются во временные таблицы,
+        после чего все совпадения вычисляются одним запросом. Этот метод
+        вызывают сканеры в конце фазы обнаружения
         
-        if unique_matches:
-            # Возвращаем лучшее совпадение
-            return max(unique_matches, key=lambda x: x.get('confidence', 0))
+        Returns:
+            Список совпадений в порядке devices (пустой словарь, если
+            совпадения нет)
+        """
+        results: List[Dict] = [{} for _ in devices]
+        if not devices:
+            return results
+        
+        conn = self.connection
+        
+        with conn:
+            for statement in SQL_CREATE_BATCH_TABLES:
+                conn.execute(statement)
+            
+            conn.executemany(SQL_INSERT_BATCH_DEVICE, (
+                (idx, self._mac_prefix(device.mac_address))
+                for idx, device in enumerate(devices)
+            ))
+            conn.executemany(SQL_INSERT_BATCH_PORT, (
+                (idx, port)
+                for idx, device in enumerate(devices)
+                for port in device.open_ports
+            ))
+            
+            for row in conn.execute(SQL_MATCH_BATCH):
+                match = dict(row)
+                results[match.pop('device_idx')] = match
+            
+            conn.execute('DELETE FROM temp.batch_devices')
+            conn.execute('DELETE FROM temp.batch_ports')
         
-        return {}
+        return results
+    
+    @staticmethod
+    def _mac_prefix(mac_address: Optional[str]) -> Optional[str]:
+        """OUI-префикс MAC-адреса в формате базы (XX:XX:XX)"""
+        if not mac_address:
+            return None
+        return ':'.join(mac_address.upper().split(':')[:3])
     
     def add_fingerprint(self, vendor: str, device_type: str, **kwargs):
         """Добавить новый отпечаток в базу"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO device_fingerprints 
-            (vendor, device_type, mac_prefix, common_ports, http_headers, banners, model, confidence)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        with self.connection as conn:
+            self._insert_fingerprint(conn, vendor, device_type, **kwargs)
+    
+    def _insert_fingerprint(self, conn: sqlite3.Connection, vendor: str,
+                            device_type: str, **kwargs) -> int:
+        """Вставить отпечаток и его порты в текущей транзакции"""
+        common_ports = kwargs.get('common_ports', [])
+        
+        cursor = conn.execute(SQL_INSERT_FINGERPRINT, (
             vendor,
             device_type,
             kwargs.get('mac_prefix'),
-            json.dumps(kwargs.get('common_ports', [])),
+            json.dumps(common_ports),
             json.dumps(kwargs.get('http_headers', {})),
             json.dumps(kwargs.get('banners', {})),
             kwargs.get('model'),
-            kwargs.get('confidence', 0.8)
+            kwargs.get('confidence', 0.8),
+            kwargs.get('source')
         ))
         
-        conn.commit()
-        conn.close()
+        fingerprint_id = cursor.lastrowid
+        conn.executemany(
+            SQL_INSERT_FINGERPRINT_PORT,
+            [(fingerprint_id, int(port)) for port in set(common_ports)]
+        )
+        
+        return fingerprint_id
     
     def get_vulnerabilities(self, device_type: str = None, vendor: str = None) -> List[Dict]:
         """Получить известные уязвимости для типа устройств или производителя"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        query = SQL_GET_VULNERABILITIES[bool(device_type), bool(vendor)]
+        params = [value for value in (vendor, device_type) if value]
         
-        query = 'SELECT * FROM known_vulnerabilities WHERE 1=1'
-        params = []
+        return [dict(row) for row in self.connection.execute(query, params)]
+    
+    def has_fulltext_search(self) -> bool:
+        """Есть ли в базе FTS5-индекс описаний уязвимостей"""
+        if self._fulltext is None:
+            self._fulltext = self.connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'vulnerability_fts'"
+            ).fetchone() is not None
+        return self._fulltext
+    
+    def search_vulnerabilities(self, text: str, limit: int = 100) -> List[Dict]:
+        """
+        Полнотекстовый поиск уязвимостей по описанию
         
-        if device_type:
-            query += ' AND device_type = ?'
-            params.append(device_type)
+        Все слова запроса должны встречаться в описании; результаты
+        упорядочены по релевантности (bm25)
+        """
+        words = text.split()
+        if not words:
+            return []
         
-        if vendor:
-            query += ' AND vendor = ?'
-            params.append(vendor)
+        if self.has_fulltext_search():
+            # Каждое слово в кавычках, чтобы ввод не разбирался как синтаксис FTS5
+            query = ' '.join('"' + word.replace('"', '""') + '"' for word in words)
+            rows = self.connection.execute(SQL_SEARCH_VULNERABILITIES, (query, limit))
+        else:
+            pattern = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            rows = self.connection.execute(SQL_SEARCH_VULNERABILITIES_LIKE, (f'%{pattern}%', limit))
         
-        cursor.execute(query, params)
-        vulnerabilities = [dict(row) for row in cursor.fetchall()]
-        conn.close()
+        return [dict(row) for row in rows]
+    
+    def get_inventory_vulnerabilities(self, devices: List[NetworkDevice]) -> List[List[Dict]]:
+        """
+        Все применимые уязвимости для инвентаря устройств одним запросом
+        
+        Устройства группируются по (производитель, тип), и каждая пара
+        ищется один раз. Записи уязвимостей общие для устройств одной пары.
+        Устройствам без производителя подходят уязвимости без производителя
+        
+        Returns:
+            Списки уязвимостей в порядке devices
+        """
+        keys: Dict[tuple, int] = {}
+        device_keys = []
+        for device in devices:
+            device_type = None
+            if device.device_type != DeviceType.UNKNOWN:
+                device_type = device.device_type.value
+            key = (device.vendor.casefold() if device.vendor else None, device_type)
+            device_keys.append(keys.setdefault(key, len(keys)))
+        
+        found: List[List[Dict]] = [[] for _ in keys]
+        
+        if keys:
+            conn = self.connection
+            with conn:
+                conn.execute(SQL_CREATE_INVENTORY_TABLE)
+                conn.executemany(SQL_INSERT_INVENTORY, (
+                    (idx, vendor, device_type) for (vendor, device_type), idx in keys.items()
+                ))
+                
+                for row in conn.execute(SQL_INVENTORY_VULNERABILITIES):
+                    vulnerability = dict(row)
+                    found[vulnerability.pop('key_idx')].append(vulnerability)
+                
+                conn.execute('DELETE FROM temp.batch_inventory')
         
-        return vulnerabilities
+        return [list(found[idx]) for idx in device_keys]
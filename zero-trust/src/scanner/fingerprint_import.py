@@ -0,0 +1,732 @@
+"""
+Массовый импорт отпечатков устройств и уязвимостей
+
+Поддерживаемые источники:
+    - nmap-service-probes (строки match/softmatch с полями p/, d/, cpe:)
+    - CSV со списком моделей SSDP/UPnP
+    - CVE-фиды NVD (JSON 1.1 и 2.0, JSON Lines, в том числе .gz)
+
+Запуск из корня проекта:
+    python -m src.scanner.fingerprint_import --nmap nmap-service-probes --cve nvdcve-2.0-2024.json.gz
+"""
+
+import argparse
+import csv
+import gzip
+import itertools
+import json
+import re
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .fingerprint_db import (
+    FingerprintDatabase, SECONDARY_INDEXES, FTS_TRIGGERS, SQL_REBUILD_VULNERABILITY_FTS
+)
+
+# Строк в одной транзакции
+DEFAULT_BATCH_SIZE = 50000
+
+# Размер блока при потоковом чтении JSON-фидов (символов)
+JSON_CHUNK_SIZE = 1 << 20
+
+# Ключи фидов NVD со списком уязвимостей (2.0 и 1.1)
+CVE_FEED_KEYS = ('vulnerabilities', 'CVE_Items')
+
+# Probe с большим списком портов (например, GetRequest) не характеризует
+# конкретное устройство, поэтому такие списки не переносятся в отпечаток
+MAX_PROBE_PORTS = 8
+
+# Порты по умолчанию для сервисов nmap
+SERVICE_PORTS = {
+    'ftp': 21,
+    'ssh': 22,
+    'telnet': 23,
+    'domain': 53,
+    'http': 80,
+    'snmp': 161,
+    'https': 443,
+    'microsoft-ds': 445,
+    'rtsp': 554,
+    'ipp': 631,
+    'mqtt': 1883,
+    'upnp': 1900,
+    'ms-wbt-server': 3389,
+    'vnc': 5900,
+    'jetdirect': 9100,
+}
+
+# Типы устройств nmap (поле d/) -> типы устройств проекта
+NMAP_DEVICE_TYPES = {
+    'router': 'router',
+    'broadband router': 'router',
+    'wap': 'router',
+    'switch': 'router',
+    'firewall': 'router',
+    'bridge': 'router',
+    'load balancer': 'router',
+    'printer': 'printer',
+    'print server': 'printer',
+    'webcam': 'camera',
+    'media device': 'tv',
+    'game console': 'tv',
+    'storage-misc': 'nas',
+    'phone': 'phone',
+    'voip phone': 'phone',
+    'pda': 'phone',
+    'general purpose': 'computer',
+    'terminal': 'iot',
+    'specialized': 'iot',
+    'power-device': 'iot',
+    'voip adapter': 'iot',
+    'remote management': 'iot',
+    'security-misc': 'iot',
+}
+
+# Типы устройств UPnP (urn:schemas-upnp-org:device:<тип>:1) -> типы проекта
+UPNP_DEVICE_TYPES = {
+    'internetgatewaydevice': 'router',
+    'wandevice': 'router',
+    'wlanaccesspointdevice': 'router',
+    'mediarenderer': 'tv',
+    'mediaserver': 'nas',
+    'printer': 'printer',
+    'scanner': 'printer',
+    'digitalsecuritycamera': 'camera',
+    'basic': 'iot',
+    'binarylight': 'iot',
+    'dimmablelight': 'iot',
+    'hvac_system': 'iot',
+}
+
+# Ключевые слова в названии продукта CPE -> тип устройства
+PRODUCT_KEYWORDS = (
+    (('router', 'gateway', 'access_point', 'firewall'), 'router'),
+    (('camera', 'ipcam', 'nvr', 'dvr', 'webcam'), 'camera'),
+    (('printer', 'laserjet', 'officejet', 'deskjet'), 'printer'),
+    (('nas', 'diskstation', 'storage'), 'nas'),
+    (('tv', 'television', 'roku', 'chromecast'), 'tv'),
+    (('phone', 'iphone', 'android'), 'phone'),
+)
+
+SQL_INSERT_FINGERPRINT = '''
+    INSERT INTO device_fingerprints
+    (id, vendor, device_type, mac_prefix, common_ports, http_headers, banners, model, confidence, source)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+SQL_INSERT_FINGERPRINT_PORT = 'INSERT OR IGNORE INTO fingerprint_ports (fingerprint_id, port) VALUES (?, ?)'
+
+SQL_UPSERT_VULNERABILITY = '''
+    INSERT INTO known_vulnerabilities
+    (cve_id, device_type, vendor, affected_versions, severity, description, mitigation)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(cve_id) DO UPDATE SET
+        device_type = excluded.device_type,
+        vendor = excluded.vendor,
+        affected_versions = excluded.affected_versions,
+        severity = excluded.severity,
+        description = excluded.description,
+        mitigation = excluded.mitigation
+'''
+
+# Следующий свободный id с учетом AUTOINCREMENT (sqlite_sequence)
+SQL_NEXT_FINGERPRINT_ID = '''
+    SELECT MAX(
+        COALESCE((SELECT MAX(id) FROM device_fingerprints), 0),
+        COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'device_fingerprints'), 0)
+    ) + 1
+'''
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+ProgressCallback = Callable[[str, int], None]
+
+def _open_text(path: Path):
+    """Открыть текстовый файл, в том числе сжатый gzip"""
+    if path.suffix == '.gz':
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, 'r', encoding='utf-8', errors='replace', newline='')
+
+def _parse_ports(text: str, limit: Optional[int] = None) -> List[int]:
+    """Разобрать список портов вида '80,443,8000-8010'"""
+    ports = []
+    for chunk in re.split(r'[\s,;]+', text.strip()):
+        if not chunk:
+            continue
+        start, _, end = chunk.partition('-')
+        try:
+            first = int(start)
+            last = int(end) if end else first
+        except ValueError:
+            continue
+        ports.extend(range(first, last + 1))
+        if limit is not None and len(ports) > limit:
+            return []
+    return ports
+
+def _guess_device_type(text: str) -> Optional[str]:
+    """Определить тип устройства по названию продукта"""
+    words = set(_WORD_RE.findall(text.lower()))
+    words.update(text.lower().split(':'))
+    for keywords, device_type in PRODUCT_KEYWORDS:
+        if words.intersection(keywords):
+            return device_type
+    return None
+
+def _vendor_name(raw: str) -> str:
+    """Привести имя производителя из CPE к читаемому виду"""
+    name = raw.replace('_', ' ').replace('\\', '')
+    return name.upper() if len(name) <= 3 else name.title()
+
+def _json_ports(ports: Iterable[int]) -> str:
+    """JSON-массив портов без накладных расходов json.dumps"""
+    return '[' + ', '.join(map(str, map(int, ports))) + ']'
+
+def _json_object(value: Optional[Dict]) -> str:
+    """JSON-объект; пустые значения - самый частый случай при импорте"""
+    return json.dumps(value) if value else '{}'
+
+def _parse_template_fields(text: str, pos: int) -> Tuple[Dict[str, str], List[str]]:
+    """Разобрать поля версии nmap: p/.../ v/.../ d/.../ cpe:/.../"""
+    fields: Dict[str, str] = {}
+    cpes: List[str] = []
+    length = len(text)
+    
+    while pos < length:
+        if text[pos].isspace():
+            pos += 1
+            continue
+        
+        if text.startswith('cpe:', pos):
+            key = 'cpe'
+            pos += 4
+        else:
+            key = text[pos]
+            pos += 1
+        
+        if pos >= length:
+            break
+        
+        delimiter = text[pos]
+        close = text.find(delimiter, pos + 1)
+        if close < 0:
+            break
+        
+        value = text[pos + 1:close]
+        pos = close + 1
+        
+        if key == 'cpe':
+            cpes.append(value)
+            if pos < length and text[pos] == 'a':
+                pos += 1
+        else:
+            fields[key] = value
+    
+    return fields, cpes
+
+def parse_nmap_service_probes(path: Path) -> Iterator[Dict]:
+    """
+    Отпечатки из файла nmap-service-probes
+    
+    Импортируются только строки match/softmatch, для которых известен
+    тип устройства (поле d/ или аппаратный CPE)
+    """
+    probe_ports: List[int] = []
+    
+    with _open_text(Path(path)) as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            
+            if line.startswith('Probe '):
+                probe_ports = []
+                continue
+            
+            if line.startswith(('ports ', 'sslports ')):
+                extra = _parse_ports(line.split(None, 1)[1], MAX_PROBE_PORTS)
+                probe_ports = sorted(set(probe_ports).union(extra))
+                if len(probe_ports) > MAX_PROBE_PORTS:
+                    probe_ports = []
+                continue
+            
+            if not line.startswith(('match ', 'softmatch ')):
+                continue
+            
+            parts = line.split(None, 2)
+            if len(parts) < 3 or len(parts[2]) < 3 or parts[2][0] != 'm':
+                continue
+            
+            kind, service, rest = parts
+            delimiter = rest[1]
+            end = rest.find(delimiter, 2)
+            if end < 0:
+                continue
+            
+            pattern = rest[2:end]
+            pos = end + 1
+            while pos < len(rest) and rest[pos] in 'is':
+                pos += 1
+            
+            fields, cpes = _parse_template_fields(rest, pos)
+            
+            vendor = None
+            device_type = NMAP_DEVICE_TYPES.get(fields.get('d', '').lower())
+            for cpe in cpes:
+                cpe_parts = cpe.split(':')
+                if len(cpe_parts) < 2 or '$' in cpe_parts[1]:
+                    continue
+                if vendor is None or cpe_parts[0] == 'h':
+                    vendor = _vendor_name(cpe_parts[1])
+                if device_type is None and cpe_parts[0] == 'h':
+                    device_type = _guess_device_type(cpe)
+            
+            product = fields.get('p')
+            if vendor is None and product and not product.startswith('$'):
+                vendor = product.split()[0]
+            
+            if not vendor or not device_type:
+                continue
+            
+            ports = set(probe_ports)
+            if service in SERVICE_PORTS:
+                ports.add(SERVICE_PORTS[service])
+            
+            yield {
+                'vendor': vendor,
+                'model': product,
+                'device_type': device_type,
+                'common_ports': sorted(ports),
+                'banners': {'service': service, 'pattern': pattern},
+                'confidence': 0.7 if kind == 'match' else 0.4,
+                'source': 'nmap',
+            }
+
+def parse_ssdp_models(path: Path) -> Iterator[Dict]:
+    """
+    Отпечатки из CSV со списком моделей SSDP/UPnP
+    
+    Ожидаемые столбцы: manufacturer (или vendor), modelName (или model),
+    deviceType (URN UPnP или тип проекта), server, ports
+    """
+    with _open_text(Path(path)) as f:
+        for row in csv.DictReader(f):
+            row = {key.strip().lower(): (value or '').strip()
+                   for key, value in row.items() if key}
+            
+            vendor = row.get('manufacturer') or row.get('vendor')
+            if not vendor:
+                continue
+            
+            raw_type = row.get('devicetype') or row.get('device_type') or ''
+            device_type = raw_type.lower()
+            if raw_type.startswith('urn:'):
+                urn_parts = raw_type.split(':')
+                device_type = UPNP_DEVICE_TYPES.get(urn_parts[3].lower() if len(urn_parts) > 3 else '')
+            
+            model = row.get('modelname') or row.get('model') or None
+            if not device_type:
+                device_type = _guess_device_type(model or '') or 'iot'
+            
+            ports = set(_parse_ports(row.get('ports', '')))
+            ports.add(1900)
+            
+            server = row.get('server')
+            
+            yield {
+                'vendor': vendor,
+                'model': model,
+                'device_type': device_type,
+                'common_ports': sorted(ports),
+                'banners': {'ssdp': server} if server else {},
+                'confidence': 0.6,
+                'source': 'ssdp',
+            }
+
+def _english(items: Iterable[Dict]) -> Optional[str]:
+    """Англоязычное описание из списка {lang, value}"""
+    fallback = None
+    for item in items:
+        if item.get('lang') == 'en':
+            return item.get('value')
+        fallback = fallback or item.get('value')
+    return fallback
+
+def _cpe_strings(nodes: Iterable[Dict]) -> Iterator[str]:
+    """Все CPE из дерева configurations (форматы NVD 1.1 и 2.0)"""
+    for node in nodes:
+        for match in node.get('cpeMatch', ()) or node.get('cpe_match', ()):
+            cpe = match.get('criteria') or match.get('cpe23Uri')
+            if cpe:
+                yield cpe
+        yield from _cpe_strings(node.get('children', ()))
+
+def _vulnerability_from_cpes(record: Dict, cpes: List[str]) -> Dict:
+    """Заполнить производителя, тип и версии по списку CPE"""
+    # cpe:2.3:<part>:<vendor>:<product>:<version>:...
+    parsed = [cpe.split(':') for cpe in cpes if cpe.count(':') >= 5]
+    parsed.sort(key=lambda parts: 'hoa'.find(parts[2]) % 3)
+    
+    if parsed:
+        record['vendor'] = _vendor_name(parsed[0][3])
+        record['device_type'] = next(
+            (t for t in (_guess_device_type(parts[4]) for parts in parsed) if t),
+            None
+        )
+    
+    affected = sorted({
+        parts[4] if parts[5] in ('*', '-') else f"{parts[4]}:{parts[5]}"
+        for parts in parsed
+    })
+    record['affected_versions'] = json.dumps(affected[:50]) if affected else None
+    return record
+
+def _normalize_cve(item: Dict) -> Optional[Dict]:
+    """Привести запись CVE любого поддерживаемого формата к строке таблицы"""
+    if 'cve_id' in item:
+        return item
+    
+    cve = item.get('cve', item)
+    
+    # NVD 2.0
+    if 'id' in cve:
+        metrics = cve.get('metrics', {})
+        severity = None
+        for key in ('cvssMetricV40', 'cvssMetricV31', 'cvssMetricV30'):
+            if metrics.get(key):
+                severity = metrics[key][0].get('cvssData', {}).get('baseSeverity')
+                break
+        if severity is None and metrics.get('cvssMetricV2'):
+            severity = metrics['cvssMetricV2'][0].get('baseSeverity')
+        
+        nodes = [node for config in cve.get('configurations', ())
+                 for node in config.get('nodes', ())]
+        record = {
+            'cve_id': cve['id'],
+            'severity': severity,
+            'description': _english(cve.get('descriptions', ())),
+        }
+        return _vulnerability_from_cpes(record, list(_cpe_strings(nodes)))
+    
+    # NVD 1.1
+    meta = cve.get('CVE_data_meta')
+    if meta:
+        impact = item.get('impact', {})
+        severity = (impact.get('baseMetricV3', {}).get('cvssV3', {}).get('baseSeverity')
+                    or impact.get('baseMetricV2', {}).get('severity'))
+        
+        nodes = item.get('configurations', {}).get('nodes', ())
+        record = {
+            'cve_id': meta['ID'],
+            'severity': severity,
+            'description': _english(cve.get('description', {}).get('description_data', ())),
+        }
+        return _vulnerability_from_cpes(record, list(_cpe_strings(nodes)))
+    
+    return None
+
+class _JsonReader:
+    """
+    Потоковое чтение JSON блоками по JSON_CHUNK_SIZE
+    
+    Значения разбираются json.JSONDecoder.raw_decode по одному, поэтому в
+    памяти находятся текущий блок и одно значение, а не весь документ
+    """
+    
+    def __init__(self, f, chunk_size: Optional[int] = None):
+        self.f = f
+        self.chunk_size = chunk_size or JSON_CHUNK_SIZE
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+    
+    def _fill(self) -> bool:
+        """Дочитать блок; False - файл закончился"""
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+    
+    def _error(self, message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, self.buffer, self.pos)
+    
+    def peek(self) -> str:
+        """Следующий значащий символ ('' в конце файла)"""
+        while True:
+            buffer, pos = self.buffer, self.pos
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            self.pos = pos
+            if pos < len(buffer):
+                return buffer[pos]
+            if not self._fill():
+                return ''
+    
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise self._error(f"Expecting '{char}'")
+        self.pos += 1
+    
+    def value(self):
+        """Очередное значение целиком"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # Значение обрезано концом блока
+                if self._fill():
+                    continue
+                raise
+            # Число в конце блока может продолжаться в следующем
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+    
+    def items(self) -> Iterator:
+        """Элементы массива, начинающегося с текущей позиции"""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        
+        while True:
+            yield self.value()
+            char = self.peek()
+            self.pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise self._error("Expecting ',' delimiter")
+
+def _feed_items(f) -> Iterator:
+    """Записи JSON-фида: массив верхнего уровня или массив под CVE_FEED_KEYS"""
+    reader = _JsonReader(f)
+    char = reader.peek()
+    if char == '[':
+        yield from reader.items()
+        return
+    
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        if key in CVE_FEED_KEYS and reader.peek() == '[':
+            yield from reader.items()
+        else:
+            # Метаданные фида (формат, число записей) пропускаются
+            reader.value()
+        
+        char = reader.peek()
+        reader.pos += 1
+        if char == '}':
+            return
+        if char != ',':
+            raise reader._error("Expecting ',' delimiter")
+
+def parse_cve_feed(path: Path) -> Iterator[Dict]:
+    """
+    Уязвимости из CVE-фида
+    
+    Поддерживаются фиды NVD 1.1 (CVE_Items), NVD 2.0 (vulnerabilities),
+    списки готовых записей и JSON Lines (.jsonl/.ndjson). JSON читается
+    потоково: в памяти одна запись фида, а не весь файл
+    """
+    path = Path(path)
+    suffixes = [suffix.lower() for suffix in path.suffixes]
+    
+    with _open_text(path) as f:
+        if '.jsonl' in suffixes or '.ndjson' in suffixes:
+            items: Iterable[Dict] = (json.loads(line) for line in f if line.strip())
+        else:
+            items = _feed_items(f)
+        
+        for item in items:
+            record = _normalize_cve(item)
+            if record and record.get('cve_id'):
+                yield record
+
+class BulkImporter:
+    """
+    Потоковая загрузка больших наборов данных в FingerprintDatabase
+    
+    Строки вставляются через executemany пакетами по batch_size в одной
+    транзакции, вторичные индексы удаляются на время загрузки и строятся
+    заново в конце
+    """
+    
+    def __init__(self, db: FingerprintDatabase, batch_size: int = DEFAULT_BATCH_SIZE,
+                 progress: Optional[ProgressCallback] = None):
+        self.db = db
+        self.batch_size = batch_size
+        self.progress = progress
+    
+    def _report(self, message: str, count: int):
+        if self.progress:
+            self.progress(message, count)
+    
+    @contextmanager
+    def _bulk_load(self, fulltext: bool = False):
+        """
+        Отключить вторичные индексы и fsync на время загрузки
+        
+        fulltext - также отключить триггеры FTS-индекса уязвимостей и
+        перестроить его целиком после загрузки
+        """
+        conn = self.db.connection
+        fulltext = fulltext and self.db.has_fulltext_search()
+        
+        with conn:
+            for name in SECONDARY_INDEXES:
+                conn.execute(f'DROP INDEX IF EXISTS {name}')
+            if fulltext:
+                for name in FTS_TRIGGERS:
+                    conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+        conn.execute('PRAGMA synchronous = OFF')
+        
+        try:
+            yield conn
+        finally:
+            self._report("Построение индексов", 0)
+            with conn:
+                for statement in SECONDARY_INDEXES.values():
+                    conn.execute(statement)
+                if fulltext:
+                    conn.execute(SQL_REBUILD_VULNERABILITY_FTS)
+                    for statement in FTS_TRIGGERS.values():
+                        conn.execute(statement)
+            conn.execute('PRAGMA synchronous = NORMAL')
+            conn.execute('PRAGMA optimize')
+    
+    def _batches(self, records: Iterable[Dict]) -> Iterator[List[Dict]]:
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    
+    def import_fingerprints(self, records: Iterable[Dict]) -> int:
+        """Загрузить отпечатки устройств, вернуть число строк"""
+        total = 0
+        
+        with self._bulk_load() as conn:
+            next_id = conn.execute(SQL_NEXT_FINGERPRINT_ID).fetchone()[0]
+            
+            for batch in self._batches(records):
+                rows = []
+                port_rows = []
+                for offset, fp in enumerate(batch):
+                    fingerprint_id = next_id + offset
+                    common_ports = fp.get('common_ports', [])
+                    rows.append((
+                        fingerprint_id,
+                        fp['vendor'],
+                        fp['device_type'],
+                        fp.get('mac_prefix'),
+                        _json_ports(common_ports),
+                        _json_object(fp.get('http_headers')),
+                        _json_object(fp.get('banners')),
+                        fp.get('model'),
+                        fp.get('confidence', 0.8),
+                        fp.get('source')
+                    ))
+                    port_rows.extend((fingerprint_id, int(port)) for port in set(common_ports))
+                
+                with conn:
+                    conn.executemany(SQL_INSERT_FINGERPRINT, rows)
+                    conn.executemany(SQL_INSERT_FINGERPRINT_PORT, port_rows)
+                
+                next_id += len(batch)
+                total += len(batch)
+                self._report("Загружено отпечатков", total)
+        
+        return total
+    
+    def import_vulnerabilities(self, records: Iterable[Dict]) -> int:
+        """Загрузить уязвимости (повторный CVE обновляет запись), вернуть число строк"""
+        total = 0
+        
+        with self._bulk_load(fulltext=True) as conn:
+            for batch in self._batches(records):
+                with conn:
+                    conn.executemany(SQL_UPSERT_VULNERABILITY, [(
+                        vuln['cve_id'],
+                        vuln.get('device_type'),
+                        vuln.get('vendor'),
+                        vuln.get('affected_versions'),
+                        vuln.get('severity'),
+                        vuln.get('description'),
+                        vuln.get('mitigation')
+                    ) for vuln in batch])
+                
+                total += len(batch)
+                self._report("Загружено уязвимостей", total)
+        
+        return total
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Точка входа командной строки"""
+    parser = argparse.ArgumentParser(
+        description="Массовый импорт отпечатков устройств и уязвимостей"
+    )
+    parser.add_argument('--db', type=Path, help="Путь к базе (по умолчанию assets/fingerprints.db)")
+    parser.add_argument('--nmap', type=Path, action='append', default=[],
+                        help="Файл nmap-service-probes")
+    parser.add_argument('--ssdp', type=Path, action='append', default=[],
+                        help="CSV со списком моделей SSDP/UPnP")
+    parser.add_argument('--cve', type=Path, action='append', default=[],
+                        help="CVE-фид NVD (JSON, JSON Lines, .gz)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Строк в одной транзакции")
+    parser.add_argument('--quiet', action='store_true', help="Не выводить прогресс")
+    args = parser.parse_args(argv)
+    
+    if not (args.nmap or args.ssdp or args.cve):
+        parser.error("не указан ни один источник данных")
+    
+    def progress(message: str, count: int):
+        if count:
+            print(f"\r{message}: {count}", end='', flush=True)
+        else:
+            print(f"\n{message}...", flush=True)
+    
+    start = time.perf_counter()
+    
+    try:
+        with FingerprintDatabase(args.db) as db:
+            importer = BulkImporter(db, args.batch_size, None if args.quiet else progress)
+            
+            # Источники одного вида загружаются за один проход, чтобы индексы
+            # строились один раз
+            fingerprints = itertools.chain(
+                *(parse_nmap_service_probes(path) for path in args.nmap),
+                *(parse_ssdp_models(path) for path in args.ssdp)
+            )
+            if args.nmap or args.ssdp:
+                importer.import_fingerprints(fingerprints)
+            if args.cve:
+                importer.import_vulnerabilities(
+                    itertools.chain(*(parse_cve_feed(path) for path in args.cve))
+                )
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"\nОшибка импорта: {e}", file=sys.stderr)
+        return 1
+    
+    print(f"Импорт завершен за {time.perf_counter() - start:.1f} с")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
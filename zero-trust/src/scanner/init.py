@@ -5,9 +5,13 @@
 from src.scanner.network_scanner import NetworkScanner
 from src.scanner.device_classifier import DeviceClassifier
 from src.scanner.fingerprint_db import FingerprintDatabase
+from src.scanner.fingerprint_import import BulkImporter
+from src.scanner.scoring_classifier import ScoringClassifier
 
 __all__ = [
     'NetworkScanner',
     'DeviceClassifier',
     'FingerprintDatabase',
+    'BulkImporter',
+    'ScoringClassifier',
 ]
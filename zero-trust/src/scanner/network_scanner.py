@@ -4,6 +4,7 @@
 
 import ipaddress
 import socket
+import sqlite3
 import threading
 import time
 from typing import List, Dict, Optional, Set
@@ -15,6 +16,7 @@ from scapy.layers.l2 import getmacbyip
 
 from ..core.models import NetworkDevice, DeviceType
 from .device_classifier import DeviceClassifier
+from .fingerprint_db import FingerprintDatabase
 from .oui_database import OUILookup
 
 class NetworkScanner:
@@ -25,8 +27,20 @@ class NetworkScanner:
         self.nm = nmap.PortScanner()
         self.oui_lookup = OUILookup()
         self.classifier = DeviceClassifier()
+        self._fingerprint_db: Optional[FingerprintDatabase] = None
         self.scan_results = []
         self.is_scanning = False
+    
+    @property
+    def fingerprint_db(self) -> FingerprintDatabase:
+        """База отпечатков; открывается при первом сопоставлении"""
+        if self._fingerprint_db is None:
+            self._fingerprint_db = FingerprintDatabase()
+        return self._fingerprint_db
+    
+    @fingerprint_db.setter
+    def fingerprint_db(self, database: FingerprintDatabase):
+        self._fingerprint_db = database
         
     def get_local_interfaces(self) -> List[Dict]:
         """Получить список локальных сетевых интерфейсов"""
@@ -186,6 +200,33 @@ class NetworkScanner:
         
         return device
     
+    def apply_fingerprints(self, devices: List[NetworkDevice]):
+        """
+        Дополнить устройства данными из базы отпечатков
+        
+        Если базу не удалось открыть (нет каталога assets, он только для
+        чтения и т.п.), устройства остаются с классификацией по портам и OUI
+        """
+        try:
+            matches = self.fingerprint_db.match_devices(devices)
+        except sqlite3.Error as e:
+            if self.logger:
+                self.logger.error(f"Ошибка сопоставления с базой отпечатков: {e}")
+            return
+        
+        for device, match in zip(devices, matches):
+            if not match:
+                continue
+            
+            if not device.vendor:
+                device.vendor = match['vendor']
+            
+            if device.device_type == DeviceType.UNKNOWN:
+                try:
+                    device.device_type = DeviceType(match['device_type'])
+                except ValueError:
+                    pass
+    
     def scan_network(self, network: str, callback=None) -> List[NetworkDevice]:
         """Полное сканирование сети"""
         self.is_scanning = True
@@ -226,6 +267,13 @@ class NetworkScanner:
             if callback:
                 callback(f"Обработано устройство: {ip}", i+1, len(arp_devices))
         
+        # Этап 3: Сопоставление с базой отпечатков (один пакетный запрос)
+        if devices:
+            if self.logger:
+                self.logger.info("Этап 3: Сопоставление с базой отпечатков...")
+            
+            self.apply_fingerprints(devices)
+        
         self.is_scanning = False
         
         if self.logger:
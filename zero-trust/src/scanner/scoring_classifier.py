@@ -0,0 +1,341 @@
+"""
+Вероятностный классификатор устройств на основе таблиц весов
+"""
+
+import json
+import math
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.core.models import NetworkDevice, DeviceType
+from src.core.constants import ASSETS_DIR
+
+# Типы, между которыми распределяется вероятность
+CLASS_TYPES = [t for t in DeviceType if t is not DeviceType.UNKNOWN]
+
+# Синонимы типов, встречающиеся в базах отпечатков
+_TYPE_ALIASES = {
+    'server': DeviceType.NAS,
+    'routers': DeviceType.ROUTER,
+    'printers': DeviceType.PRINTER,
+    'cameras': DeviceType.CAMERA,
+    'computers': DeviceType.COMPUTER,
+    'phones': DeviceType.PHONE,
+}
+
+# Встроенные признаки (перенесены из цепочки правил DeviceClassifier)
+_BUILTIN_PORTS = {
+    DeviceType.ROUTER: [53, 67, 68],
+    DeviceType.COMPUTER: [22, 3389, 445, 139],
+    DeviceType.PHONE: [62078, 5353],
+    DeviceType.IOT: [1883, 1900, 8080],
+    DeviceType.PRINTER: [9100, 515, 631],
+    DeviceType.CAMERA: [554, 37777],
+    DeviceType.NAS: [5000, 5001, 2049],
+}
+
+_BUILTIN_VENDORS = {
+    DeviceType.ROUTER: ['cisco', 'mikrotik', 'asus', 'tp-link', 'ubiquiti'],
+    DeviceType.COMPUTER: ['microsoft', 'apple', 'dell', 'hp', 'lenovo'],
+    DeviceType.PHONE: ['apple', 'samsung', 'xiaomi', 'huawei'],
+    DeviceType.IOT: ['philips', 'xiaomi', 'yeelight', 'smart'],
+    DeviceType.PRINTER: ['hp', 'epson', 'canon', 'brother'],
+    DeviceType.CAMERA: ['hikvision', 'dahua', 'camera'],
+    DeviceType.NAS: ['synology', 'qnap'],
+}
+
+_BUILTIN_HOSTNAMES = {
+    DeviceType.ROUTER: ['router', 'gateway', 'gw'],
+    DeviceType.COMPUTER: ['pc', 'desktop', 'laptop', 'workstation'],
+    DeviceType.PHONE: ['phone', 'iphone', 'android'],
+    DeviceType.IOT: ['iot', 'smart', 'bulb', 'plug', 'hue'],
+    DeviceType.PRINTER: ['printer', 'print'],
+    DeviceType.CAMERA: ['camera', 'cam', 'dvr', 'nvr'],
+    DeviceType.TV: ['tv', 'bravia', 'roku', 'chromecast'],
+    DeviceType.NAS: ['nas', 'diskstation'],
+}
+
+# Последний октет IP-адреса шлюза
+_BUILTIN_OCTETS = {DeviceType.ROUTER: [1, 254]}
+
+# Сила признака каждого вида при суммировании
+_FEATURE_STRENGTH = {
+    'port': 1.0,
+    'oui': 2.0,
+    'vendor': 1.5,
+    'host': 1.5,
+    'octet': 0.5,
+    'port_count': 0.5,
+}
+
+# Сглаживание частот признаков
+_SMOOTHING = 0.5
+
+# Максимальный размер кэшей производителей, наборов портов и hostname
+_CACHE_LIMIT = 65536
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def _tokens(text: str) -> List[str]:
+    """Разбить строку на слова и склейки соседних слов ("tp-link" -> "tplink")"""
+    words = _TOKEN_RE.findall(text.lower())
+    return words + [a + b for a, b in zip(words, words[1:])]
+
+
+def _keyword_key(keyword: str) -> str:
+    """Нормализовать ключевое слово к виду токена"""
+    return ''.join(_TOKEN_RE.findall(keyword.lower()))
+
+
+def _sum_vectors(vectors: List[Optional[Tuple[float, ...]]]) -> Optional[Tuple[float, ...]]:
+    """Поэлементно сложить векторы весов, пропуская отсутствующие"""
+    vectors = [v for v in vectors if v is not None]
+    if not vectors:
+        return None
+    if len(vectors) == 1:
+        return vectors[0]
+    return tuple(map(sum, zip(*vectors)))
+
+
+def _port_count_bucket(count: int) -> str:
+    """Группа по количеству открытых портов"""
+    if count <= 3:
+        return 'few'
+    if count > 5:
+        return 'many'
+    return 'some'
+
+
+class ScoringClassifier:
+    """
+    Классификатор, оценивающий все типы устройств за один проход.
+    
+    Веса признаков (порты, OUI, слова производителя и hostname)
+    заранее компилируются в таблицы: каждому значению признака
+    соответствует вектор log-odds по типам устройств. Классификация
+    устройства сводится к нескольким обращениям к словарям и сложению
+    векторов, порядок правил на результат не влияет.
+    """
+    
+    def __init__(self, fingerprints: Optional[Dict] = None,
+                 oui_db: Optional[Dict[str, str]] = None,
+                 min_confidence: float = 0.3):
+        if fingerprints is None:
+            fingerprints = self._load_fingerprints()
+        
+        self.types = CLASS_TYPES
+        self.min_confidence = min_confidence
+        self.oui_db = {k.upper(): v for k, v in (oui_db or {}).items()}
+        self._vendor_cache: Dict[str, Optional[Tuple[float, ...]]] = {}
+        self._ports_cache: Dict[Tuple[int, ...], Optional[Tuple[float, ...]]] = {}
+        self._host_cache: Dict[str, Optional[Tuple[float, ...]]] = {}
+        self._compile(fingerprints)
+    
+    @staticmethod
+    def _load_fingerprints() -> Dict:
+        """Загрузить отпечатки устройств из assets"""
+        fingerprints_file = Path(ASSETS_DIR) / "device_fingerprints.json"
+        
+        if fingerprints_file.exists():
+            with open(fingerprints_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        
+        return {}
+    
+    @staticmethod
+    def _resolve_type(name: str, value: Optional[str]) -> Optional[DeviceType]:
+        """Определить DeviceType для записи отпечатка"""
+        for candidate in (value, name):
+            if not candidate:
+                continue
+            candidate = candidate.lower()
+            if candidate in _TYPE_ALIASES:
+                return _TYPE_ALIASES[candidate]
+            try:
+                device_type = DeviceType(candidate)
+            except ValueError:
+                continue
+            if device_type is not DeviceType.UNKNOWN:
+                return device_type
+        return None
+    
+    def _compile(self, fingerprints: Dict):
+        """Скомпилировать отпечатки и встроенные признаки в таблицы весов"""
+        index = {t: i for i, t in enumerate(self.types)}
+        counts: Dict[str, Dict] = {kind: {} for kind in _FEATURE_STRENGTH}
+        
+        def count(kind: str, key, device_type: DeviceType, weight: float = 1.0):
+            vector = counts[kind].setdefault(key, [0.0] * len(self.types))
+            vector[index[device_type]] += weight
+        
+        for device_type, ports in _BUILTIN_PORTS.items():
+            for port in ports:
+                count('port', port, device_type)
+        for device_type, keywords in _BUILTIN_VENDORS.items():
+            for keyword in keywords:
+                count('vendor', _keyword_key(keyword), device_type)
+        for device_type, keywords in _BUILTIN_HOSTNAMES.items():
+            for keyword in keywords:
+                count('host', _keyword_key(keyword), device_type)
+        for device_type, octets in _BUILTIN_OCTETS.items():
+            for octet in octets:
+                count('octet', octet, device_type)
+        count('port_count', 'few', DeviceType.IOT)
+        count('port_count', 'many', DeviceType.COMPUTER)
+        
+        # Отпечатки поддерживаются в двух форматах: assets/device_fingerprints.json
+        # (common_ports, mac_prefixes, vendor) и встроенный DeviceClassifier
+        # (ports, keywords)
+        for name, fingerprint in fingerprints.items():
+            device_type = self._resolve_type(name, fingerprint.get('device_type'))
+            if device_type is None:
+                continue
+            
+            ports = fingerprint.get('common_ports') or fingerprint.get('ports') or []
+            for port in ports:
+                count('port', int(port), device_type, 1.0 / len(ports))
+            
+            for prefix in fingerprint.get('mac_prefixes', []):
+                count('oui', prefix.upper().replace('-', ':'), device_type)
+            
+            if fingerprint.get('vendor'):
+                count('vendor', _keyword_key(fingerprint['vendor']), device_type)
+            
+            for keyword in fingerprint.get('keywords', []):
+                count('vendor', _keyword_key(keyword), device_type)
+                count('host', _keyword_key(keyword), device_type)
+        
+        self.tables: Dict[str, Dict] = {
+            kind: {key: self._to_log_odds(vector, _FEATURE_STRENGTH[kind])
+                   for key, vector in table.items()}
+            for kind, table in counts.items()
+        }
+        
+        # OUI, известные только по базе производителей, получают веса слов
+        # производителя, чтобы MAC-адрес разрешался одним обращением
+        oui_table = self.tables['oui']
+        for oui, vendor in self.oui_db.items():
+            vendor_vector = self._vendor_vector(vendor)
+            if vendor_vector is None:
+                continue
+            if oui in oui_table:
+                oui_table[oui] = tuple(a + b for a, b in zip(oui_table[oui], vendor_vector))
+            else:
+                oui_table[oui] = vendor_vector
+    
+    def _to_log_odds(self, vector: List[float], strength: float) -> Tuple[float, ...]:
+        """Перевести частоты признака в log-odds относительно равномерного распределения"""
+        k = len(vector)
+        total = sum(vector) + _SMOOTHING * k
+        return tuple(
+            strength * math.log((value + _SMOOTHING) * k / total)
+            for value in vector
+        )
+    
+    def _vendor_vector(self, vendor: str) -> Optional[Tuple[float, ...]]:
+        """Суммарный вектор весов для строки производителя (с кэшированием)"""
+        vector = self._vendor_cache.get(vendor, False)
+        if vector is not False:
+            return vector
+        
+        vector = self._sum_tokens(self.tables['vendor'], _tokens(vendor))
+        
+        if len(self._vendor_cache) >= _CACHE_LIMIT:
+            self._vendor_cache.clear()
+        self._vendor_cache[vendor] = vector
+        return vector
+    
+    def _ports_vector(self, ports: Tuple[int, ...]) -> Optional[Tuple[float, ...]]:
+        """Суммарный вектор весов для набора открытых портов (с кэшированием)"""
+        vector = self._ports_cache.get(ports, False)
+        if vector is not False:
+            return vector
+        
+        port_table = self.tables['port']
+        vectors = [port_table[port] for port in set(ports) if port in port_table]
+        vectors.append(self.tables['port_count'].get(_port_count_bucket(len(ports))))
+        vector = _sum_vectors(vectors)
+        
+        if len(self._ports_cache) >= _CACHE_LIMIT:
+            self._ports_cache.clear()
+        self._ports_cache[ports] = vector
+        return vector
+    
+    def _host_vector(self, hostname: str) -> Optional[Tuple[float, ...]]:
+        """Суммарный вектор весов для hostname (с кэшированием)"""
+        vector = self._host_cache.get(hostname, False)
+        if vector is not False:
+            return vector
+        
+        vector = self._sum_tokens(self.tables['host'], _tokens(hostname))
+        
+        if len(self._host_cache) >= _CACHE_LIMIT:
+            self._host_cache.clear()
+        self._host_cache[hostname] = vector
+        return vector
+    
+    def _sum_tokens(self, table: Dict, tokens: Iterable[str]) -> Optional[Tuple[float, ...]]:
+        """Сложить векторы найденных в таблице токенов"""
+        return _sum_vectors([table.get(token) for token in set(tokens)])
+    
+    def scores(self, device: NetworkDevice) -> Optional[Tuple[float, ...]]:
+        """
+        Вычислить оценки всех типов за один проход по признакам устройства
+        
+        Returns:
+            Кортеж оценок в порядке self.types или None, если ни один
+            признак не найден в таблицах
+        """
+        vectors = []
+        
+        if device.open_ports:
+            vectors.append(self._ports_vector(tuple(device.open_ports)))
+        
+        if device.vendor:
+            vectors.append(self._vendor_vector(device.vendor))
+        elif device.mac_address:
+            oui = device.mac_address[:8].upper().replace('-', ':')
+            vectors.append(self.tables['oui'].get(oui))
+        
+        hostname = device.hostname
+        if hostname and hostname != 'unknown':
+            vectors.append(self._host_vector(hostname))
+        
+        last_octet = device.ip_address.rsplit('.', 1)[-1]
+        if last_octet.isdigit():
+            vectors.append(self.tables['octet'].get(int(last_octet)))
+        
+        return _sum_vectors(vectors)
+    
+    def classify(self, device: NetworkDevice) -> Tuple[DeviceType, float]:
+        """
+        Классифицировать устройство
+        
+        Returns:
+            Кортеж (тип устройства, уверенность 0..1). Если уверенность
+            ниже min_confidence, тип - UNKNOWN
+        """
+        scores = self.scores(device)
+        if scores is None:
+            return DeviceType.UNKNOWN, 0.0
+        
+        top = max(scores)
+        confidence = 1.0 / sum(map(math.exp, [score - top for score in scores]))
+        
+        if confidence < self.min_confidence:
+            return DeviceType.UNKNOWN, confidence
+        return self.types[scores.index(top)], confidence
+    
+    def probabilities(self, device: NetworkDevice) -> Dict[DeviceType, float]:
+        """Распределение вероятностей по всем типам устройств"""
+        scores = self.scores(device)
+        if scores is None:
+            return {}
+        
+        top = max(scores)
+        weights = [math.exp(score - top) for score in scores]
+        total = sum(weights)
+        
+        return {t: w / total for t, w in zip(self.types, weights)}
@@ -8,6 +8,7 @@ from datetime import datetime
 from pathlib import Path
 
 from ..core.constants import EXPORTS_DIR
+from ..core.inventory import DeviceInventory
 from ..core.models import NetworkPolicy
 
 class ReportGenerator:
@@ -36,6 +37,8 @@ class ReportGenerator:
                 'zones': list(policy.zones.keys()),
                 'success_rate': results.get('summary', {}).get('success_rate', '0%'),
                 'overall_status': results.get('summary', {}).get('overall_status', 'unknown'),
+                # Ленивой политике сводка не строится: она загрузила бы все устройства
+                'devices': DeviceInventory(policy).summary() if isinstance(policy, NetworkPolicy) else None,
             },
             'recommendations': results.get('summary', {}).get('recommendations', []),
         }
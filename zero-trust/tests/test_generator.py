@@ -0,0 +1,489 @@
+"""
+Тесты генераторов конфигураций
+"""
+
+import os
+import tempfile
+import tracemalloc
+import unittest
+from pathlib import Path
+from typing import List
+
+from jinja2 import FileSystemBytecodeCache
+
+from src.core import templates
+from src.core.cidr import aggregate_addresses
+from src.core import generator as core_generator
+from src.core.generator import PolicyGenerator, _ipset_names
+from src.core.models import NetworkDevice, SecurityZone, SecurityRule, NetworkPolicy, ZoneType, ActionType
+from src.engine.policy_engine import PolicyEngine
+
+TEMPLATE_DIR = str(Path(__file__).resolve().parent.parent / "configs" / "templates")
+
+def make_policy(zone_size: int = 3) -> NetworkPolicy:
+    """Политика из двух зон с правилом между ними"""
+    policy = NetworkPolicy("Generator")
+    policy.add_zone(SecurityZone("IoT", ZoneType.IOT, devices=[
+        NetworkDevice(f"192.168.2.{i + 1}") for i in range(zone_size)
+    ]))
+    policy.add_zone(SecurityZone("Trusted", ZoneType.TRUSTED, devices=[
+        NetworkDevice(f"192.168.1.{i + 1}") for i in range(zone_size)
+    ]))
+    policy.add_rule(SecurityRule("IoT", "Trusted", ActionType.DENY, "tcp", [22, 23], "IoT to LAN"))
+    return policy
+
+class TestIptablesGenerator(unittest.TestCase):
+    """Тесты генерации iptables"""
+    
+    def setUp(self):
+        self.generator = PolicyGenerator(TEMPLATE_DIR)
+    
+    def test_ipset_mode(self):
+        """Правило зоны - одна строка с наборами ipset вместо перебора пар адресов"""
+        policy = make_policy(zone_size=200)
+        
+        plain = self.generator.generate_iptables_config(policy)
+        self.assertEqual(plain.count("iptables -A FORWARD -s "), 200 * 200)
+        self.assertNotIn("ipset", plain)
+        
+        config = self.generator.generate_iptables_config(policy, use_ipset=True)
+        rules = [line for line in config.splitlines() if "--match-set" in line]
+        self.assertEqual(rules, [
+            'iptables -A FORWARD -m set --match-set zt_IoT src -m set --match-set zt_Trusted dst '
+            '-p tcp --dport 22,23 -j DROP -m comment --comment "IoT to LAN"'
+        ])
+        self.assertIn("create zt_IoT hash:ip family inet maxelem 65536", config)
+        self.assertIn("add zt_Trusted 192.168.1.200", config)
+        self.assertEqual(config.count("\nadd "), 400)
+        # Наборы создаются до правил, которые на них ссылаются
+        self.assertLess(config.index("ipset -exist restore"), config.index("--match-set"))
+    
+    def test_ipset_ipv6(self):
+        """Адреса IPv6 попадают в наборы inet6 и правила ip6tables, а не теряются"""
+        policy = make_policy(zone_size=3)
+        policy.zones["IoT"].add_device(NetworkDevice("fd00::5"))
+        policy.zones["Trusted"].add_device(NetworkDevice("fd00::9"))
+        
+        config = self.generator.generate_iptables_config(policy, use_ipset=True)
+        self.assertIn("create zt_IoT_v6 hash:ip family inet6 maxelem 65536", config)
+        self.assertIn("add zt_IoT_v6 fd00::5", config)
+        self.assertNotIn("add zt_IoT fd00::5", config)
+        self.assertIn('ip6tables -A FORWARD -m set --match-set zt_IoT_v6 src -m set --match-set zt_Trusted_v6 dst '
+                      '-p tcp --dport 22,23 -j DROP -m comment --comment "IoT to LAN"', config)
+        self.assertEqual(config.count("iptables -A FORWARD -m set"), 1)
+        
+        # Повторное применение: ip6tables отпускает наборы до их удаления,
+        # а неудаленные наборы очищаются
+        self.assertLess(config.index("ip6tables -F FORWARD"), config.index("ipset destroy zt_IoT_v6"))
+        self.assertIn("flush zt_IoT_v6", config)
+        
+        # Без адресов IPv6 выгрузка не трогает ip6tables
+        self.assertNotIn("ip6tables", self.generator.generate_iptables_config(make_policy(3), use_ipset=True))
+    
+    def test_ipset_names(self):
+        """Имена наборов допустимы для ipset и не совпадают"""
+        names = _ipset_names(["Гостевая сеть", "Guest-Net", "guest_net", "x" * 64])
+        self.assertEqual(names["Гостевая сеть"], "zt_zone")
+        self.assertEqual(names["Guest-Net"], "zt_Guest_Net")
+        self.assertEqual(names["guest_net"], "zt_guest_net_2")
+        self.assertTrue(all(len(name) <= 31 for name in names.values()))
+    
+    def test_restore_format(self):
+        """Вход iptables-restore: цепочки зон-источников и одна транзакция"""
+        policy = make_policy(zone_size=3)
+        policy.zones["IoT"].add_device(NetworkDevice("fd00::10"))
+        
+        config = self.generator.generate_iptables_restore(policy)
+        lines = config.splitlines()
+        self.assertEqual(lines[4], "*filter")
+        self.assertEqual(lines[-1], "COMMIT")
+        self.assertIn(":zt_IoT - [0:0]", lines)
+        self.assertEqual([line for line in lines if line.startswith("-A FORWARD -s ")],
+                         [f"-A FORWARD -s 192.168.2.{i} -j zt_IoT" for i in (1, 2, 3)])
+        self.assertIn('-A zt_IoT -d 192.168.1.3 -p tcp -m multiport --dports 22,23 '
+                      '-m comment --comment "IoT to LAN" -j DROP', lines)
+        self.assertNotIn("iptables -", config)
+        
+        config6 = self.generator.generate_iptables_restore(policy, ip_version=6, use_ipset=True)
+        self.assertIn("-A FORWARD -m set --match-set zt_IoT_v6 src -j zt_IoT", config6)
+        self.assertIn("add zt_IoT_v6 fd00::10", self.generator.generate_ipset_restore(policy, 6))
+
+def apply_delta(config: str, delta: str) -> tuple:
+    """Применить разностный скрипт к наборам и цепочкам FORWARD выгрузки ipset"""
+    sets = {}
+    forward = {"iptables": [], "ip6tables": []}
+    
+    for line in config.splitlines() + delta.splitlines():
+        words = line.split()
+        # Строки ipset restore в выгрузке и команды ipset в скрипте
+        if words[:1] == ["ipset"]:
+            words = words[1:]
+        if words[:1] == ["create"]:
+            sets[words[1]] = set()
+        elif words[:1] == ["add"]:
+            sets[words[1]].add(words[2])
+        elif words[:1] == ["del"]:
+            sets[words[1]].remove(words[2])
+        elif words[:1] == ["destroy"] and "2>/dev/null" not in words:
+            del sets[words[1]]
+        elif words[:1] in (["iptables"], ["ip6tables"]) and words[2:3] == ["FORWARD"]:
+            chain = forward[words[0]]
+            spec = line.split("FORWARD", 1)[1].strip()
+            if words[1] == "-A":
+                chain.append(spec)
+            elif words[1] == "-D":
+                chain.remove(spec)
+            elif words[1] == "-I":
+                position, spec = spec.split(" ", 1)
+                chain.insert(int(position) - 1, spec)
+            elif words[1] == "-F":
+                chain.clear()
+    return sets, forward
+
+class TestIptablesDelta(unittest.TestCase):
+    """Тесты разностных скриптов между ревизиями политики"""
+    
+    def setUp(self):
+        self.generator = PolicyGenerator(TEMPLATE_DIR)
+    
+    def check(self, old: NetworkPolicy, new: NetworkPolicy) -> str:
+        """Скрипт переводит выгрузку old в выгрузку new"""
+        delta = self.generator.generate_iptables_delta(old, new)
+        self.assertEqual(
+            apply_delta(self.generator.generate_iptables_config(old, use_ipset=True), delta),
+            apply_delta(self.generator.generate_iptables_config(new, use_ipset=True), "")
+        )
+        self.assertNotIn("iptables -F", delta)
+        return delta
+    
+    def test_device_move(self):
+        """Перенос устройства - две команды ipset без изменения правил"""
+        old, new = make_policy(zone_size=50), make_policy(zone_size=50)
+        new.move_device(new.zones["IoT"].devices[0], new.zones["Trusted"])
+        
+        delta = self.check(old, new)
+        commands = [line for line in delta.splitlines() if line.startswith(("ipset", "iptables"))]
+        self.assertEqual(commands, ["ipset add zt_Trusted 192.168.2.1", "ipset del zt_IoT 192.168.2.1"])
+    
+    def test_rules_and_zones(self):
+        """Новые зоны, правила и смена порядка правил"""
+        old = make_policy(zone_size=3)
+        old.add_rule(SecurityRule("Trusted", "IoT", ActionType.ALLOW, description="LAN to IoT"))
+        new = make_policy(zone_size=3)
+        new.add_zone(SecurityZone("Guest", ZoneType.GUEST, devices=[NetworkDevice("10.9.0.1")]))
+        new.rules.insert(0, SecurityRule("Guest", "Trusted", ActionType.DENY))
+        new.add_rule(SecurityRule("Trusted", "IoT", ActionType.ALLOW, "tcp", [80], "LAN to IoT web"))
+        self.check(old, new)
+        self.check(new, old)
+        
+        # Набор, ставший после агрегации hash:net, пересоздается вместе со своими правилами
+        self.generator.aggregate = True
+        new.zones["Guest"].add_device(NetworkDevice("10.9.0.0"))
+        delta = self.check(old, new)
+        self.assertIn("ipset create zt_Guest hash:net", delta)
+    
+    def test_ipv6(self):
+        """Наборы и правила IPv6 обновляются так же, как IPv4"""
+        old, new = make_policy(zone_size=3), make_policy(zone_size=3)
+        new.zones["IoT"].add_device(NetworkDevice("fd00::5"))
+        new.zones["Trusted"].add_device(NetworkDevice("fd00::9"))
+        
+        delta = self.check(old, new)
+        self.assertIn("ipset create zt_IoT_v6 hash:ip family inet6 maxelem 65536", delta)
+        self.assertIn("ip6tables -P FORWARD DROP", delta)
+        
+        newer = make_policy(zone_size=3)
+        newer.zones["IoT"].add_device(NetworkDevice("fd00::5"))
+        newer.zones["Trusted"].add_device(NetworkDevice("fd00::9"))
+        newer.add_rule(SecurityRule("Trusted", "IoT", ActionType.ALLOW, "icmp", description="Ping"))
+        delta = self.check(new, newer)
+        self.assertIn('ip6tables -I FORWARD 3 -m set --match-set zt_Trusted_v6 src '
+                      '-m set --match-set zt_IoT_v6 dst -p ipv6-icmp -j ACCEPT', delta)
+        self.assertNotIn("ip6tables -F", delta)
+
+class TestWindowsGrouped(unittest.TestCase):
+    """Тесты сгруппированных правил Windows Firewall"""
+    
+    def setUp(self):
+        self.generator = PolicyGenerator(TEMPLATE_DIR)
+    
+    def test_one_rule_per_policy_rule(self):
+        """Правило политики - одно правило New-NetFirewallRule со списками адресов"""
+        policy = make_policy(zone_size=50)
+        
+        plain = self.generator.generate_windows_firewall(policy)
+        self.assertEqual(plain.count("New-NetFirewallRule"), 50 * 50)
+        
+        config = self.generator.generate_windows_firewall(policy, grouped=True)
+        self.assertEqual(config.count("New-NetFirewallRule"), 1)
+        self.assertIn('-DisplayName "ZTI_1_IoT_to_Trusted"', config)
+        self.assertIn("-LocalAddress " + ",".join(f"192.168.2.{i}" for i in range(1, 51)), config)
+        self.assertIn("-RemotePort 22,23", config)
+        self.assertIn("-Action Block", config)
+        
+        self.generator.aggregate = True
+        config = self.generator.generate_windows_firewall(policy, grouped=True)
+        self.assertIn("-RemoteAddress 192.168.1.1,192.168.1.2/31,192.168.1.4/30", config)
+    
+    def test_chunking(self):
+        """Длинные списки адресов делятся на несколько правил"""
+        policy = make_policy(zone_size=5)
+        chunk = core_generator.WINDOWS_ADDRESS_CHUNK
+        core_generator.WINDOWS_ADDRESS_CHUNK = 2
+        try:
+            config = self.generator.generate_windows_firewall(policy, grouped=True)
+        finally:
+            core_generator.WINDOWS_ADDRESS_CHUNK = chunk
+        
+        self.assertEqual(config.count("New-NetFirewallRule"), 3 * 3)
+        self.assertIn('-DisplayName "ZTI_1_IoT_to_Trusted_3_1"', config)
+        self.assertIn("-LocalAddress 192.168.2.5 `", config)
+        self.assertIn("-RemoteAddress 192.168.1.3,192.168.1.4 `", config)
+
+def forward_chain(config: str) -> List[str]:
+    """
+    Цепочка forward RouterOS после применения скрипта поверх непустой цепочки
+    
+    Правила вставляются перед первым правилом (place-before=0), поэтому
+    итоговый порядок обратен порядку команд
+    """
+    chain = []
+    for line in config.splitlines():
+        if "add chain=forward" not in line:
+            continue
+        if line.startswith(":if "):
+            # Первая команда: перед правилами роутера, если они есть
+            line = line[line.index("else={ ") + len("else={ "):-len(" }")]
+        if not line.endswith(" place-before=0"):
+            raise AssertionError(f"Правило не вставляется в начало цепочки: {line}")
+        chain.insert(0, line[len("add chain=forward "):-len(" place-before=0")])
+    return chain
+
+class TestMikrotikGenerator(unittest.TestCase):
+    """Тесты генерации RouterOS"""
+    
+    def setUp(self):
+        self.generator = PolicyGenerator(TEMPLATE_DIR)
+    
+    def test_address_lists(self):
+        """Зоны - списки адресов, правило политики - одно правило forward"""
+        policy = make_policy(zone_size=100)
+        config = self.generator.generate_mikrotik_config(policy)
+        
+        self.assertEqual(config.count("add list=zt_IoT address="), 100)
+        self.assertIn("add list=zt_Trusted address=192.168.1.100\n", config)
+        
+        self.assertEqual(config.count("add list=zt-zones address="), 200)
+        
+        self.assertEqual(forward_chain(config), [
+            'action=fasttrack-connection connection-state=established,related comment="ZTI: fast-path"',
+            'action=accept connection-state=established,related comment="ZTI: established"',
+            'action=drop connection-state=invalid comment="ZTI: invalid"',
+            'action=drop src-address-list=zt_IoT dst-address-list=zt_Trusted '
+            'protocol=tcp dst-port=22,23 comment="ZTI: IoT to LAN"',
+            'action=drop src-address-list=zt-zones dst-address-list=zt-zones comment="ZTI: default deny"',
+        ])
+        self.assertNotIn("/ipv6", config)
+        # Списки заполняются до правил, которые на них ссылаются
+        self.assertLess(config.index("/ip firewall address-list"), config.index("/ip firewall filter"))
+    
+    def test_ipv6(self):
+        """Адреса IPv6 выгружаются в раздел /ipv6, без FastTrack"""
+        policy = make_policy(zone_size=2)
+        policy.zones["IoT"].add_device(NetworkDevice("fd00::5"))
+        policy.zones["Trusted"].add_device(NetworkDevice("fd00::9"))
+        policy.add_rule(SecurityRule("Trusted", "IoT", ActionType.ALLOW, "icmp", None, ""))
+        
+        config = self.generator.generate_mikrotik_config(policy)
+        ipv6 = config[config.index("/ipv6 firewall address-list"):]
+        self.assertIn("add list=zt_IoT address=fd00::5", ipv6)
+        self.assertNotIn("192.168.", ipv6)
+        self.assertNotIn("fasttrack", ipv6)
+        self.assertIn('src-address-list=zt_Trusted dst-address-list=zt_IoT protocol=icmpv6 '
+                      'comment="ZTI: Trusted to IoT"', ipv6)
+        
+        config = self.generator.generate_mikrotik_config(policy, fasttrack=False)
+        self.assertNotIn("fasttrack", config)
+    
+    def test_policy_engine(self):
+        """Платформа движка по умолчанию - mikrotik"""
+        policy = make_policy()
+        self.assertEqual(PolicyEngine(TEMPLATE_DIR).generate_firewall_rules(policy),
+                         self.generator.generate_mikrotik_config(policy))
+
+class TestStreamingExport(unittest.TestCase):
+    """Тесты потокового экспорта в файл"""
+    
+    def setUp(self):
+        self.generator = PolicyGenerator(TEMPLATE_DIR)
+    
+    def test_export_matches_render(self):
+        """Файл экспорта совпадает с конфигурацией, собранной в строку"""
+        policy = make_policy(zone_size=20)
+        generate = {
+            'iptables-restore': self.generator.generate_iptables_restore,
+            'nftables': self.generator.generate_nftables_config,
+            'windows': self.generator.generate_windows_firewall,
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            out_dir = Path(tmp) / "exports"
+            for platform, render in generate.items():
+                path = out_dir / f"{platform}.conf"
+                self.generator.export_policy(policy, platform, str(path))
+                self.assertEqual(path.read_text(encoding='utf-8'), render(policy))
+            
+            self.assertEqual(sorted(p.name for p in out_dir.iterdir()),
+                             ["iptables-restore.conf", "nftables.conf", "windows.conf"])
+            with self.assertRaises(ValueError):
+                self.generator.export_policy(policy, "junos", str(out_dir / "junos.conf"))
+    
+    def test_export_memory(self):
+        """Память при экспорте не растет вместе с размером конфигурации"""
+        policy = make_policy(zone_size=200)
+        self.generator.generate_iptables_config(make_policy(zone_size=1))
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "iptables.sh"
+            tracemalloc.start()
+            try:
+                self.generator.export_policy(policy, "iptables", str(path))
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            
+            self.assertLess(peak, path.stat().st_size / 10)
+
+class TestExportAll(unittest.TestCase):
+    """Тесты параллельного экспорта на несколько платформ"""
+    
+    def test_parallel_export(self):
+        """Процессы-исполнители выгружают те же файлы, что и последовательный экспорт"""
+        generator = PolicyGenerator(TEMPLATE_DIR)
+        policy = make_policy(zone_size=20)
+        platforms = ["iptables", "nftables", "Windows"]
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            parallel = generator.export_all(policy, platforms, os.path.join(tmp, "parallel"), max_workers=2)
+            serial = generator.export_all(policy, platforms, os.path.join(tmp, "serial"), max_workers=1)
+            
+            self.assertEqual(list(parallel), ["iptables", "nftables", "windows"])
+            for platform, result in parallel.items():
+                self.assertEqual(Path(result['file']).parent.name, "parallel")
+                self.assertGreater(result['seconds'], 0)
+                self.assertEqual(result['size'], serial[platform]['size'])
+                self.assertEqual(Path(result['file']).read_bytes(), Path(serial[platform]['file']).read_bytes())
+            
+            with self.assertRaises(ValueError):
+                generator.export_all(policy, ["iptables", "junos"], tmp)
+
+class TestCidrAggregation(unittest.TestCase):
+    """Тесты агрегации адресов зон"""
+    
+    def test_exact(self):
+        """Точная агрегация сворачивает смежные адреса и не трогает одиночные"""
+        addresses = [f"10.0.0.{i}" for i in range(256)] + ["10.0.1.7", "fd00::1", "fd00::"]
+        self.assertEqual(aggregate_addresses(addresses), ["10.0.0.0/24", "10.0.1.7", "fd00::/127"])
+        self.assertEqual(aggregate_addresses(["10.0.0.1", "10.0.0.2"]), ["10.0.0.1", "10.0.0.2"])
+    
+    def test_overcoverage(self):
+        """Расширение префикса ограничено допустимой долей чужих адресов"""
+        addresses = [f"10.0.0.{i}" for i in range(256) if i not in (5, 77)]
+        self.assertGreater(len(aggregate_addresses(addresses)), 10)
+        self.assertEqual(aggregate_addresses(addresses, max_overcoverage=0.01), ["10.0.0.0/24"])
+        self.assertEqual(aggregate_addresses(["10.0.0.1", "10.0.0.2", "10.0.0.3"], 0.25), ["10.0.0.0/30"])
+        self.assertEqual(aggregate_addresses(["10.0.0.1", "10.0.0.9"], 0.5), ["10.0.0.1", "10.0.0.9"])
+        with self.assertRaises(ValueError):
+            aggregate_addresses(addresses, max_overcoverage=1.0)
+    
+    def test_generators(self):
+        """Генераторы выгружают префиксы вместо отдельных адресов"""
+        policy = make_policy(zone_size=254)
+        generator = PolicyGenerator(TEMPLATE_DIR, aggregate=True, max_overcoverage=0.01)
+        
+        config = generator.generate_iptables_config(policy, use_ipset=True)
+        self.assertIn("create zt_IoT hash:net", config)
+        self.assertIn("add zt_IoT 192.168.2.0/24", config)
+        
+        plain = generator.generate_iptables_config(policy)
+        self.assertEqual(plain.count("iptables -A FORWARD -s "), 1)
+        self.assertIn("-s 192.168.2.0/24 -d 192.168.1.0/24", plain)
+        
+        nft = generator.generate_nftables_config(policy)
+        self.assertIn("flags interval", nft)
+        # В карте вердиктов префиксы точные: группы адресов не должны перекрываться
+        self.assertIn("192.168.2.128/26 : jump zt_IoT_out_v4", nft)
+        self.assertIn("192.168.1.0/24\n", nft)
+
+class TestTemplateRegistry(unittest.TestCase):
+    """Тесты общего реестра шаблонов"""
+    
+    def test_shared_environment(self):
+        """Генераторы одного каталога используют одно окружение с кэшем байткода"""
+        first = PolicyGenerator(TEMPLATE_DIR)
+        second = PolicyGenerator(TEMPLATE_DIR + os.sep)
+        self.assertIs(first.env, second.env)
+        self.assertIsInstance(first.env.bytecode_cache, FileSystemBytecodeCache)
+        self.assertIs(first.env.get_template('iptables.j2'), second.env.get_template('iptables.j2'))
+        self.assertGreaterEqual(templates.precompile(TEMPLATE_DIR), 4)
+    
+    def test_auto_reload(self):
+        """Измененный шаблон перечитывается без пересоздания окружения"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "test.j2"
+            path.write_text("v1 {{ name }}", encoding='utf-8')
+            self.assertEqual(templates.get_template("test.j2", tmp).render(name="x"), "v1 x")
+            
+            path.write_text("v2 {{ name }}", encoding='utf-8')
+            stat = path.stat()
+            os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+            self.assertEqual(templates.get_template("test.j2", tmp).render(name="x"), "v2 x")
+
+class TestNftablesGenerator(unittest.TestCase):
+    """Тесты генерации nftables"""
+    
+    def setUp(self):
+        self.generator = PolicyGenerator(TEMPLATE_DIR)
+    
+    def test_verdict_map(self):
+        """Адреса источника попадают в карту вердиктов, назначение проверяется по набору зоны"""
+        policy = make_policy(zone_size=200)
+        config = self.generator.generate_nftables_config(policy)
+        
+        self.assertIn("delete table inet zerotrust", config)
+        self.assertIn("set zt_Trusted_v4 {", config)
+        self.assertIn("ip saddr vmap @zone_sources_v4", config)
+        self.assertNotIn("zone_sources_v6", config)
+        # Элемент на адрес источника, а не на пару адресов
+        self.assertEqual(config.count(" : jump "), 200)
+        self.assertIn("192.168.2.3 : jump zt_IoT_out_v4", config)
+        self.assertIn('ip daddr @zt_Trusted_v4 tcp dport { 22, 23 } drop comment "IoT to LAN"', config)
+    
+    def test_overlapping_zones(self):
+        """Адрес из нескольких зон получает правила всех своих пар в порядке политики"""
+        policy = make_policy(zone_size=1)
+        shared = policy.zones["IoT"].devices[0]
+        policy.zones["Trusted"].add_device(shared)
+        policy.add_rule(SecurityRule("Trusted", "IoT", ActionType.ALLOW))
+        
+        config = self.generator.generate_nftables_config(policy)
+        self.assertIn("192.168.2.1 : jump zt_overlap_", config)
+        overlap = config[config.index("    chain zt_overlap_"):]
+        overlap = overlap[:overlap.index("}\n")]
+        self.assertLess(overlap.index("ip daddr @zt_Trusted_v4 tcp dport"),
+                        overlap.index("ip daddr @zt_IoT_v4 accept"))
+        self.assertIn("192.168.1.1 : jump zt_Trusted_out_v4", config)
+
+    def test_icmp_dual_stack(self):
+        """Правило ICMP в цепочке IPv6 проверяет ICMPv6"""
+        policy = make_policy(zone_size=1)
+        policy.zones["IoT"].add_device(NetworkDevice("fd00::5"))
+        policy.zones["Trusted"].add_device(NetworkDevice("fd00::9"))
+        policy.add_rule(SecurityRule("Trusted", "IoT", ActionType.ALLOW, "icmp", description="Ping"))
+        
+        config = self.generator.generate_nftables_config(policy)
+        self.assertIn('ip daddr @zt_IoT_v4 meta l4proto icmp accept comment "Ping"', config)
+        self.assertIn('ip6 daddr @zt_IoT_v6 meta l4proto ipv6-icmp accept comment "Ping"', config)
+        self.assertNotIn("ip6 daddr @zt_IoT_v6 meta l4proto icmp ", config)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+"""
+Тесты столбцового инвентаря устройств
+"""
+
+import unittest
+
+from src.core.inventory import DeviceInventory
+from src.core.models import NetworkDevice, DeviceType, SecurityZone, NetworkPolicy, ZoneType
+
+class TestDeviceInventory(unittest.TestCase):
+    """Тесты фильтров, группировок и синхронизации"""
+    
+    def setUp(self):
+        self.camera = NetworkDevice("192.168.2.10", mac_address="44:19:B6:00:00:01",
+                                    device_type=DeviceType.CAMERA, vendor="Hikvision",
+                                    open_ports=[23, 554], risk_score=0.85)
+        self.printer = NetworkDevice("192.168.1.40", device_type=DeviceType.PRINTER,
+                                     vendor="HP", open_ports=[80, 9100], risk_score=0.35)
+        self.router = NetworkDevice("192.168.1.1", device_type=DeviceType.ROUTER, vendor="MikroTik",
+                                    open_ports=[23, 80], risk_score=0.72, is_gateway=True)
+        
+        self.policy = NetworkPolicy("Inventory")
+        self.policy.add_zone(SecurityZone("IoT", ZoneType.IOT, devices=[self.camera, self.printer]))
+        self.policy.add_zone(SecurityZone("Trusted", ZoneType.TRUSTED, devices=[self.router]))
+        self.inventory = DeviceInventory(self.policy)
+    
+    def test_filters_and_groups(self):
+        """Фильтры комбинируются масками, группировки считают устройства"""
+        inv = self.inventory
+        
+        self.assertEqual(inv.devices(inv.with_port(23)), [self.camera, self.router])
+        self.assertEqual(inv.devices(inv.with_port(23) & inv.in_zone("IoT")), [self.camera])
+        self.assertEqual(inv.devices(inv.in_network("192.168.1.0/24") & inv.risk_at_least(0.7)),
+                         [self.router])
+        self.assertEqual(inv.devices(inv.with_oui("44:19:B6")), [self.camera])
+        self.assertEqual(inv.devices(inv.gateways()), [self.router])
+        
+        self.assertEqual(inv.count_by('port')[80], 2)
+        self.assertEqual(inv.count_by('vendor', inv.in_zone("IoT")), {"Hikvision": 1, "HP": 1})
+        self.assertEqual(inv.risk_histogram_by_zone()["IoT"], [0, 0, 0, 1, 0, 0, 0, 0, 1, 0])
+    
+    def test_sync(self):
+        """sync отражает добавление, изменение и удаление устройств"""
+        inv = self.inventory
+        self.assertFalse(inv.sync())
+        
+        self.camera.open_ports = [554]
+        self.policy.zones["IoT"].remove_device(self.printer)
+        tv = NetworkDevice("192.168.2.20", device_type=DeviceType.TV, open_ports=[23])
+        self.policy.zones["Trusted"].add_device(tv)
+        
+        self.assertTrue(inv.sync())
+        self.assertEqual(len(inv), 3)
+        self.assertEqual(inv.devices(inv.with_port(23)), [self.router, tv])
+        self.assertEqual(inv.count(inv.from_vendor("HP")), 0)
+        self.assertEqual(inv.count_by('zone'), {"IoT": 1, "Trusted": 2})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,483 @@
+"""
+Тесты моделей данных
+"""
+
+import copy
+import json
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+
+from src.core import binary_format, models
+from src.core.exceptions import PolicyFormatError
+from src.core.lazy_policy import LazyPolicy
+from src.core.policy_diff import PolicyJournal, diff_policies, _policy_state
+from src.core.models import (
+    NetworkDevice, DeviceType, SecurityZone, SecurityRule, NetworkPolicy, ZoneType, ActionType
+)
+
+class TestNetworkDevice(unittest.TestCase):
+    """Тесты компактного представления устройства"""
+    
+    def setUp(self):
+        self.device = NetworkDevice(
+            "192.168.1.40", mac_address="00:1b:a9:00:00:01", hostname="hp-printer",
+            device_type=DeviceType.PRINTER, vendor="HP", open_ports=[80, 9100]
+        )
+    
+    def test_public_attributes(self):
+        """Публичные атрибуты возвращают прежние значения"""
+        self.assertEqual(self.device.ip_address, "192.168.1.40")
+        self.assertEqual(self.device.mac_address, "00:1B:A9:00:00:01")
+        self.assertEqual(list(self.device.open_ports), [80, 9100])
+        self.assertEqual(self.device.ip_int, 0xC0A80128)
+        
+        self.device.ip_address = "2001:DB8::1"
+        self.assertEqual(self.device.ip_address, "2001:db8::1")
+        self.assertEqual(self.device.ip_version, 6)
+    
+    def test_invalid_ip(self):
+        """Некорректный IP-адрес отклоняется"""
+        with self.assertRaises(ValueError):
+            NetworkDevice("192.168.1.256")
+    
+    def test_no_instance_dict(self):
+        """У устройства нет __dict__, одинаковые наборы портов общие"""
+        other = NetworkDevice("192.168.1.41", open_ports=[80, 9100])
+        
+        self.assertFalse(hasattr(self.device, '__dict__'))
+        self.assertIs(other.open_ports, self.device.open_ports)
+    
+    def test_port_cache_is_bounded(self):
+        """Кэш наборов портов не растет сверх предела"""
+        with mock.patch('src.core.models._PORT_CACHE_LIMIT', 8):
+            for port in range(100):
+                NetworkDevice("192.168.1.41", open_ports=[port, port + 1])
+            self.assertLessEqual(len(models._port_sets), 8)
+            self.assertLessEqual(len(models._port_objects), 9)
+    
+    def test_round_trip(self):
+        """Словарь и pickle воспроизводят равное устройство"""
+        self.assertEqual(NetworkDevice.from_dict(self.device.to_dict()), self.device)
+        self.assertEqual(pickle.loads(pickle.dumps(self.device)), self.device)
+        self.assertNotEqual(NetworkDevice("192.168.1.41"), NetworkDevice("192.168.1.42"))
+
+class TestZoneMembership(unittest.TestCase):
+    """Тесты индекса членства устройств в зонах"""
+    
+    def setUp(self):
+        self.policy = NetworkPolicy("Test")
+        self.trusted = SecurityZone("Trusted", ZoneType.TRUSTED)
+        self.iot = SecurityZone("IoT", ZoneType.IOT)
+        self.policy.add_zone(self.trusted)
+        self.policy.add_zone(self.iot)
+        self.device = NetworkDevice("192.168.1.10")
+    
+    def test_membership_by_identity(self):
+        """Равные по полям, но разные устройства учитываются отдельно"""
+        twin = NetworkDevice("192.168.1.10")
+        self.trusted.add_device(self.device)
+        self.trusted.add_device(twin)
+        self.trusted.add_device(self.device)
+        
+        self.assertEqual(self.trusted.device_count, 2)
+        self.trusted.remove_device(twin)
+        self.assertIs(self.trusted.devices[0], self.device)
+    
+    def test_remove_by_ip(self):
+        """Устройство можно удалить по IP-адресу"""
+        self.trusted.add_device(self.device)
+        self.trusted.remove_device("192.168.1.10")
+        
+        self.assertEqual(self.trusted.device_count, 0)
+        self.assertIsNone(self.policy.zone_of(self.device))
+    
+    def test_move_device(self):
+        """Перемещение обновляет обе зоны и обратный индекс"""
+        self.trusted.add_device(self.device)
+        self.assertIs(self.policy.zone_of(self.device), self.trusted)
+        
+        self.policy.move_device(self.device, self.iot)
+        self.assertNotIn(self.device, self.trusted)
+        self.assertIn(self.device, self.iot)
+        self.assertEqual(self.policy.zones_of(self.device), [self.iot])
+    
+    def test_direct_list_changes_are_detected(self):
+        """Прямое изменение devices и zones перестраивает индексы"""
+        self.policy.zone_of(self.device)
+        self.iot.devices.append(self.device)
+        self.assertIs(self.policy.zone_of(self.device), self.iot)
+        
+        del self.policy.zones["IoT"]
+        self.assertIsNone(self.policy.zone_of(self.device))
+    
+    def test_copy_rebuilds_index(self):
+        """Копия политики индексирует собственные объекты устройств"""
+        self.iot.add_device(self.device)
+        clone = copy.deepcopy(self.policy)
+        
+        self.assertIsNone(clone.zone_of(self.device))
+        self.assertIs(clone.zone_of(clone.zones["IoT"].devices[0]), clone.zones["IoT"])
+
+class TestPolicyDict(unittest.TestCase):
+    """Тесты нормализованного словаря политики"""
+    
+    def setUp(self):
+        self.policy = NetworkPolicy("Dict")
+        self.shared = NetworkDevice("192.168.1.1", vendor="MikroTik")
+        self.policy.add_zone(SecurityZone("Trusted", ZoneType.TRUSTED, devices=[self.shared]))
+        self.policy.add_zone(SecurityZone("IoT", ZoneType.IOT, devices=[
+            self.shared, NetworkDevice("192.168.1.50")
+        ]))
+    
+    def test_devices_stored_once(self):
+        """Общее устройство записывается один раз и загружается общим объектом"""
+        data = self.policy.to_dict()
+        
+        self.assertEqual(len(data['devices']), 2)
+        self.assertEqual(data['zones']['IoT']['device_refs'], [0, 1])
+        self.assertNotIn('devices', data['zones']['IoT'])
+        
+        loaded = NetworkPolicy.from_dict(data)
+        self.assertIs(loaded.zones['Trusted'].devices[0], loaded.zones['IoT'].devices[0])
+        self.assertEqual(loaded.to_dict(), data)
+    
+    def test_legacy_embedded_devices(self):
+        """Файлы с устройствами внутри зон по-прежнему загружаются"""
+        data = self.policy.to_dict()
+        del data['devices'], data['format_version']
+        for zone in self.policy.zones.values():
+            data['zones'][zone.name] = zone.to_dict()
+        
+        loaded = NetworkPolicy.from_dict(data)
+        self.assertEqual([d.ip_address for d in loaded.zones['IoT'].devices],
+                         ["192.168.1.1", "192.168.1.50"])
+
+class TestPolicyDiff(unittest.TestCase):
+    """Тесты патчей и журнала политики"""
+    
+    def setUp(self):
+        self.policy = NetworkPolicy("Diff")
+        self.policy.add_zone(SecurityZone("Trusted", ZoneType.TRUSTED, devices=[
+            NetworkDevice("192.168.1.10", mac_address="00:11:22:33:44:55"),
+            NetworkDevice("192.168.1.11"),
+        ]))
+        self.policy.add_zone(SecurityZone("IoT", ZoneType.IOT))
+        self.policy.add_rule(SecurityRule("IoT", "Trusted", ActionType.DENY))
+    
+    def edit(self, policy: NetworkPolicy):
+        trusted, iot = policy.zones["Trusted"], policy.zones["IoT"]
+        camera, laptop = trusted.devices
+        policy.move_device(camera, iot)
+        laptop.vendor = "Lenovo"
+        iot.add_device(NetworkDevice("192.168.1.20"))
+        iot.description = "Камеры"
+        policy.add_zone(SecurityZone("Guest", ZoneType.GUEST))
+        policy.rules[0].action = ActionType.ALLOW
+        policy.add_rule(SecurityRule("Guest", "IoT", ActionType.DENY))
+    
+    def test_patch_reproduces_changes(self):
+        """Патч переносит изменения на другую копию политики"""
+        edited = copy.deepcopy(self.policy)
+        self.edit(edited)
+        
+        patch = diff_policies(self.policy, edited)
+        ops = sorted(change['op'] for change in patch.changes)
+        self.assertEqual(ops, ['add_device', 'add_zone', 'insert_rules', 'move_device', 'move_device',
+                               'set_rule', 'update_device', 'update_zone'])
+        
+        patch.apply(self.policy)
+        self.assertEqual(self.policy.to_dict(), edited.to_dict())
+        self.assertFalse(diff_policies(self.policy, edited))
+    
+    def test_rule_insert_is_single_op(self):
+        """Вставка правила в начало не переписывает остальные правила"""
+        for name in ("A", "B", "C"):
+            self.policy.add_zone(SecurityZone(name, ZoneType.SERVER))
+            self.policy.add_rule(SecurityRule(name, "IoT", ActionType.DENY))
+        edited = copy.deepcopy(self.policy)
+        edited.rules.insert(0, SecurityRule("Trusted", "A", ActionType.ALLOW))
+        del edited.rules[2]
+        
+        patch = diff_policies(self.policy, edited)
+        self.assertEqual(sorted(change['op'] for change in patch.changes), ['delete_rules', 'insert_rules'])
+        self.assertEqual(patch.apply(self.policy).to_dict(), edited.to_dict())
+    
+    def test_incremental_state(self):
+        """Состояние журнала обновляется по изменениям и совпадает с полным"""
+        with tempfile.TemporaryDirectory() as tmp:
+            journal = PolicyJournal(os.path.join(tmp, "policy.json"), max_entries=100)
+            journal.record(self.policy)
+            trusted = self.policy.zones["Trusted"]
+            
+            edits = (
+                lambda: self.edit(self.policy),
+                lambda: setattr(trusted.devices[0], 'ip_address', "192.168.1.99"),
+                lambda: trusted.remove_device(trusted.devices[0]),
+                lambda: self.policy.remove_zone("Guest"),
+                lambda: self.policy.rules.insert(0, SecurityRule("Trusted", "IoT", ActionType.ALLOW)),
+                # Совпадающий ключ устройства: полная пересборка
+                lambda: trusted.add_device(NetworkDevice("192.168.1.20")),
+            )
+            for change in edits:
+                change()
+                if change is not edits[-1]:
+                    # Маленький снимок уплотнялся бы при каждой записи
+                    with mock.patch('src.core.policy_diff._policy_state', side_effect=AssertionError), \
+                            mock.patch.object(journal, 'compact'):
+                        self.assertTrue(journal.record(self.policy))
+                journal.record(self.policy)
+                self.assertEqual(journal._state, _policy_state(self.policy))
+                self.assertFalse(self.policy.dirty)
+            
+            self.assertEqual(PolicyJournal(journal.snapshot_path).load().to_dict(), self.policy.to_dict())
+    
+    def test_shared_mac_devices(self):
+        """Один MAC на нескольких IP и полные дубликаты устройств"""
+        with tempfile.TemporaryDirectory() as tmp:
+            journal = PolicyJournal(os.path.join(tmp, "policy.json"), max_entries=100)
+            trusted, iot = self.policy.zones["Trusted"], self.policy.zones["IoT"]
+            mac = "AA:BB:CC:DD:EE:FF"
+            hosts = [NetworkDevice(f"10.0.0.{n}", mac_address=mac, hostname=f"h{n}") for n in range(1, 4)]
+            for device in hosts:
+                trusted.add_device(device)
+            journal.record(self.policy)
+            
+            # Ключи MAC@IP не зависят от порядка: пишутся патчи
+            edits = (
+                lambda: trusted.remove_device(hosts[0]),
+                lambda: self.policy.move_device(hosts[2], iot),
+                lambda: setattr(hosts[1], 'hostname', "renamed"),
+                lambda: trusted.add_device(hosts[0]),
+            )
+            for change in edits:
+                change()
+                with mock.patch.object(journal, 'compact', side_effect=AssertionError):
+                    self.assertTrue(journal.record(self.policy))
+                self.assertEqual(PolicyJournal(journal.snapshot_path).load().to_dict(), self.policy.to_dict())
+            
+            # Совпадающие ключи зависят от порядка: вместо патча снимок
+            iot.add_device(NetworkDevice("10.0.0.1", mac_address=mac, hostname="copy"))
+            self.assertTrue(journal.record(self.policy))
+            self.assertEqual(len(open(journal.journal_path).readlines()), 1)
+            trusted.remove_device(hosts[0])
+            self.assertTrue(journal.record(self.policy))
+            self.assertEqual(len(open(journal.journal_path).readlines()), 1)
+            self.assertEqual(PolicyJournal(journal.snapshot_path).load().to_dict(), self.policy.to_dict())
+    
+    def test_legacy_journal_keys(self):
+        """Журнал со старыми ключами применяется и уплотняется"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "policy.json")
+            PolicyJournal(path).record(self.policy)
+            header = json.loads(open(path + ".journal").readline())
+            del header['keys']
+            patch = {'changes': [{'op': 'update_device', 'key': "00:11:22:33:44:55",
+                                  'fields': {'hostname': "camera"}}]}
+            with open(path + ".journal", 'w', encoding='utf-8') as f:
+                f.write(json.dumps(header) + '\n' + json.dumps(patch) + '\n')
+            
+            journal = PolicyJournal(path)
+            policy = journal.load()
+            self.assertEqual(policy.zones["Trusted"].devices[0].hostname, "camera")
+            
+            policy.description = "Новая"
+            journal.record(policy)
+            self.assertEqual(len(open(journal.journal_path).readlines()), 1)
+            self.assertEqual(PolicyJournal(path).load().to_dict(), policy.to_dict())
+    
+    def test_rule_ports_edited_in_place(self):
+        """Изменение списка портов правила на месте попадает в журнал"""
+        with tempfile.TemporaryDirectory() as tmp:
+            journal = PolicyJournal(os.path.join(tmp, "policy.json"), max_entries=100)
+            self.policy.rules[0].ports = [22]
+            journal.record(self.policy)
+            
+            self.policy.rules[0].ports.append(5)
+            patch = journal.record(self.policy)
+            self.assertEqual([change['op'] for change in patch.changes], ['set_rule'])
+            self.assertEqual(PolicyJournal(journal.snapshot_path).load().rules[0].ports, [22, 5])
+    
+    def test_journal_replay_and_compaction(self):
+        """Журнал хранит патчи и восстанавливает политику после уплотнения"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "policy.json")
+            journal = PolicyJournal(path, max_entries=3)
+            # Снимок больше журнала: уплотнение только по max_entries
+            self.policy.description = "Журнал " * 100
+            journal.record(self.policy)
+            snapshot = open(path, 'rb').read()
+            
+            self.edit(self.policy)
+            self.assertTrue(journal.record(self.policy))
+            self.assertIsNone(journal.record(self.policy))
+            self.assertEqual(open(path, 'rb').read(), snapshot)
+            self.assertEqual(PolicyJournal(path).load().to_dict(), self.policy.to_dict())
+            
+            for name in ("A", "B"):
+                self.policy.add_zone(SecurityZone(name, ZoneType.SERVER))
+                journal.record(self.policy)
+            
+            # Третья запись вызвала уплотнение: журнал пуст, снимок новый
+            self.assertEqual(len(open(journal.journal_path).readlines()), 1)
+            self.assertEqual(PolicyJournal(path).load().to_dict(), self.policy.to_dict())
+
+class TestContentHash(unittest.TestCase):
+    """Тесты хэшей содержимого и грязных флагов"""
+    
+    def setUp(self):
+        self.device = NetworkDevice("192.168.1.10", vendor="HP")
+        self.zone = SecurityZone("IoT", ZoneType.IOT, devices=[self.device])
+        self.rule = SecurityRule("IoT", "IoT", ActionType.DENY, ports=[23])
+        self.policy = NetworkPolicy("Hash")
+        self.policy.add_zone(self.zone)
+        self.policy.add_rule(self.rule)
+    
+    def test_hash_is_stable_and_content_based(self):
+        """Хэш не зависит от объектов и меняется при изменении содержимого"""
+        first = self.policy.content_hash
+        self.assertEqual(NetworkPolicy.from_dict(self.policy.to_dict()).content_hash, first)
+        
+        for change in (lambda: setattr(self.device, 'vendor', "Canon"),
+                       lambda: self.rule.ports.append(80),
+                       lambda: setattr(self.zone, 'description', "Камеры")):
+            before = self.policy.content_hash
+            change()
+            self.assertNotEqual(self.policy.content_hash, before)
+    
+    def test_dirty_flags(self):
+        """Грязный флаг сбрасывается mark_clean и учитывает вложенные объекты"""
+        self.assertTrue(self.policy.dirty)
+        self.policy.mark_clean()
+        self.rule.mark_clean()
+        self.assertFalse(self.policy.dirty)
+        
+        self.device.open_ports = [80]
+        self.assertTrue(self.policy.dirty)
+        self.assertTrue(self.zone.dirty)
+        self.assertFalse(self.rule.dirty)
+
+    def test_dirty_tracks_changes_without_hashing(self):
+        """Чтение dirty не считает хэш, но видит изменения полей и списков"""
+        self.policy.mark_clean()
+        self.zone.mark_clean()
+        with mock.patch('src.core.models.content_digest', side_effect=AssertionError):
+            self.assertFalse(self.policy.dirty)
+            self.assertFalse(self.zone.dirty)
+        
+        changes = (
+            lambda: setattr(self.zone, 'description', "Камеры"),
+            lambda: self.rule.ports.append(80),
+            lambda: self.zone.add_device(NetworkDevice("192.168.1.11")),
+            lambda: setattr(self.device, 'hostname', "printer"),
+            lambda: self.policy.rules.pop(),
+            lambda: self.policy.zones.pop("IoT"),
+        )
+        for change in changes:
+            self.policy.mark_clean()
+            change()
+            self.assertTrue(self.policy.dirty)
+
+class TestBinaryFormat(unittest.TestCase):
+    """Тесты бинарного формата политик"""
+    
+    def setUp(self):
+        self.policy = NetworkPolicy("Binary", description="Тестовая политика")
+        shared = NetworkDevice("192.168.1.1", mac_address="AA:BB:CC:DD:EE:FF", vendor="MikroTik",
+                               device_type=DeviceType.ROUTER, open_ports=[22, 80], is_gateway=True)
+        zones = [
+            SecurityZone("Trusted", ZoneType.TRUSTED, devices=[
+                shared,
+                NetworkDevice("fe80::1%eth0", mac_address="not-a-mac", hostname="link-local"),
+            ]),
+            SecurityZone("IoT", ZoneType.IOT, devices=[
+                shared,
+                NetworkDevice("2001:db8::10", os_info="Linux", risk_score=0.9, open_ports=[1883]),
+            ], position=(120.0, 40.5)),
+        ]
+        for zone in zones:
+            self.policy.add_zone(zone)
+        self.policy.add_rule(SecurityRule("IoT", "Trusted", ActionType.DENY, ports=[22, 443]))
+        self.policy.add_rule(SecurityRule("Trusted", "IoT", ActionType.ALLOW))
+    
+    def test_round_trip(self):
+        """Обе ветви загрузки воспроизводят ту же политику"""
+        data = binary_format.dumps(self.policy)
+        
+        for trusted in (False, True):
+            loaded = binary_format.loads(data, trusted=trusted)
+            self.assertEqual(loaded.to_dict(), self.policy.to_dict())
+            
+            # Общее устройство хранится один раз и остается общим
+            self.assertIs(loaded.zones["Trusted"].devices[0], loaded.zones["IoT"].devices[0])
+            self.assertEqual(len(loaded.zones_of(loaded.zones["IoT"].devices[0])), 2)
+    
+    def test_unpackable_values(self):
+        """Значения вне столбцов формата дают PolicyFormatError"""
+        device = self.policy.zones["IoT"].devices[1]
+        device.risk_score = None
+        with self.assertRaisesRegex(PolicyFormatError, "risk_score"):
+            binary_format.dumps(self.policy)
+        
+        device.risk_score = 0.9
+        device.open_ports = [70000]
+        with self.assertRaisesRegex(PolicyFormatError, "ports"):
+            binary_format.dumps(self.policy)
+        
+        device.open_ports = [1883]
+        self.policy.rules[0].ports = [-1]
+        with self.assertRaisesRegex(PolicyFormatError, "ports"):
+            binary_format.dumps(self.policy)
+    
+    def test_round_trip_keeps_content_hash(self):
+        """Целые координаты остаются целыми: загруженная политика не считается измененной"""
+        loaded = binary_format.loads(binary_format.dumps(self.policy))
+        self.assertEqual(loaded.content_hash, self.policy.content_hash)
+        self.assertEqual(loaded.zones["Trusted"].size, (200, 150))
+        self.assertIsInstance(loaded.zones["Trusted"].size[0], int)
+        self.assertIsInstance(loaded.zones["IoT"].position[0], float)
+    
+    def test_file_format_by_extension(self):
+        """Формат при сохранении - по расширению, при загрузке - по сигнатуре"""
+        with tempfile.TemporaryDirectory() as tmp:
+            binary_path = os.path.join(tmp, "policy.ztpb")
+            json_path = os.path.join(tmp, "policy.json")
+            self.policy.save_to_file(binary_path)
+            self.policy.save_to_file(json_path)
+            
+            self.assertTrue(binary_format.is_binary_policy(binary_path))
+            self.assertFalse(binary_format.is_binary_policy(json_path))
+            self.assertEqual(NetworkPolicy.load_from_file(binary_path).to_dict(),
+                             NetworkPolicy.load_from_file(json_path).to_dict())
+    
+    def test_lazy_policy(self):
+        """Ленивая политика создает устройства только открытых зон"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "policy.ztpb")
+            self.policy.save_to_file(path)
+            
+            with LazyPolicy(path) as lazy:
+                self.assertEqual(list(lazy.zones), ["Trusted", "IoT"])
+                self.assertEqual(len(lazy.rules), 2)
+                self.assertEqual(lazy.zone_device_count("IoT"), 2)
+                self.assertEqual(lazy.device_count, 3)
+                self.assertEqual(lazy._device_cache, {})
+                
+                iot = lazy.zones["IoT"]
+                self.assertEqual(len(lazy._device_cache), 2)
+                self.assertIs(lazy.zones["Trusted"].devices[0], iot.devices[0])
+                self.assertEqual(lazy.to_policy().to_dict(), self.policy.to_dict())
+                self.assertEqual(lazy.to_policy().content_hash, self.policy.content_hash)
+    
+    def test_corrupted_data(self):
+        """Поврежденный или чужой файл дает PolicyFormatError"""
+        data = binary_format.dumps(self.policy)
+        
+        for broken in (b'', b'{"name": "x"}', data[:len(data) // 2], data[:4] + b'\xff\xff' + data[6:]):
+            with self.assertRaises(PolicyFormatError):
+                binary_format.loads(broken)
+
+if __name__ == '__main__':
+    unittest.main()
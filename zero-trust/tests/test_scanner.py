@@ -0,0 +1,401 @@
+"""
+Тесты для модуля scanner
+"""
+
+import copy
+import gc
+import json
+import sqlite3
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from src.core.models import NetworkDevice, DeviceType
+from src.scanner.device_classifier import DeviceClassifier
+from src.scanner.fingerprint_db import FingerprintDatabase, DATABASE_VERSION
+from src.scanner.fingerprint_import import BulkImporter, parse_cve_feed, parse_nmap_service_probes
+from src.scanner.scoring_classifier import ScoringClassifier
+
+FINGERPRINTS = {
+    "hp_printer": {
+        "vendor": "HP",
+        "mac_prefixes": ["00:01:E6"],
+        "common_ports": [9100, 631, 80],
+        "device_type": "printer"
+    },
+    "xiaomi_camera": {
+        "vendor": "Xiaomi",
+        "mac_prefixes": ["34:CE:00"],
+        "common_ports": [80, 554],
+        "device_type": "camera"
+    },
+    "synology_nas": {
+        "vendor": "Synology",
+        "common_ports": [5000, 5001],
+        "device_type": "server"
+    },
+}
+
+class TestScoringClassifier(unittest.TestCase):
+    """Тесты взвешенного классификатора"""
+    
+    def setUp(self):
+        self.classifier = ScoringClassifier(FINGERPRINTS, {"00:01:E6": "Hewlett-Packard"})
+    
+    def test_printer_beats_rule_order(self):
+        """Принтер с веб-интерфейсом не становится IoT из-за порядка правил"""
+        device = NetworkDevice("192.168.1.40", hostname="hp-printer", open_ports=[80, 9100, 631])
+        
+        device_type, confidence = self.classifier.classify(device)
+        self.assertEqual(device_type, DeviceType.PRINTER)
+        self.assertGreater(confidence, 0.5)
+    
+    def test_mac_prefix_lookup(self):
+        """OUI из отпечатков используется, если производитель не задан"""
+        device = NetworkDevice("192.168.1.50", mac_address="34:CE:00:11:22:33", open_ports=[554])
+        
+        self.assertEqual(self.classifier.classify(device)[0], DeviceType.CAMERA)
+    
+    def test_type_alias(self):
+        """Тип 'server' из отпечатков соответствует NAS"""
+        device = NetworkDevice("192.168.1.60", open_ports=[5000, 5001])
+        
+        self.assertEqual(self.classifier.classify(device)[0], DeviceType.NAS)
+    
+    def test_no_features(self):
+        """Устройство без признаков остается неизвестным"""
+        device = NetworkDevice("192.168.1.70")
+        
+        self.assertEqual(self.classifier.classify(device), (DeviceType.UNKNOWN, 0.0))
+    
+    def test_probabilities_sum_to_one(self):
+        """Вероятности по типам образуют распределение"""
+        device = NetworkDevice("192.168.1.1", vendor="MikroTik", open_ports=[53, 80])
+        
+        probabilities = self.classifier.probabilities(device)
+        self.assertAlmostEqual(sum(probabilities.values()), 1.0)
+        self.assertEqual(max(probabilities, key=probabilities.get), DeviceType.ROUTER)
+    
+    def test_caches_are_bounded(self):
+        """Кэши векторов не растут сверх предела"""
+        with mock.patch('src.scanner.scoring_classifier._CACHE_LIMIT', 4):
+            for i in range(20):
+                self.classifier.classify(NetworkDevice("192.168.1.80", vendor=f"Vendor {i}",
+                                                       hostname=f"host-{i}", open_ports=[i]))
+        
+        for cache in (self.classifier._vendor_cache, self.classifier._ports_cache,
+                      self.classifier._host_cache):
+            self.assertLessEqual(len(cache), 4)
+
+# Ожидаемые типы на отпечатках из assets: (устройство, цепочка правил,
+# ScoringClassifier). Цепочка возвращает первое сработавшее правило и без
+# MAC-адреса смотрит только на порты; взвешенная модель учитывает все
+# признаки сразу и при противоречивых признаках возвращает UNKNOWN
+EXPECTED_CLASSIFICATIONS = [
+    # Согласованные признаки: результаты совпадают
+    (NetworkDevice("192.168.1.40", hostname="hp-printer", vendor="HP", open_ports=[80, 9100, 631]),
+     DeviceType.PRINTER, DeviceType.PRINTER),
+    (NetworkDevice("192.168.1.20", hostname="home-pc", vendor="Dell", open_ports=[139, 445, 3389]),
+     DeviceType.COMPUTER, DeviceType.COMPUTER),
+    (NetworkDevice("192.168.1.45", hostname="hue-bridge", vendor="Philips", open_ports=[80, 1900]),
+     DeviceType.IOT, DeviceType.IOT),
+    (NetworkDevice("192.168.1.41", hostname="hp-printer", vendor="HP", open_ports=[53, 9100]),
+     DeviceType.PRINTER, DeviceType.PRINTER),
+    # Производитель перевешивает порт, на котором цепочка останавливается
+    (NetworkDevice("192.168.1.1", vendor="MikroTik", open_ports=[53, 80]),
+     DeviceType.IOT, DeviceType.ROUTER),
+    (NetworkDevice("192.168.1.50", vendor="Hikvision", open_ports=[80, 554]),
+     DeviceType.IOT, DeviceType.CAMERA),
+    (NetworkDevice("192.168.1.60", vendor="Synology", open_ports=[5000, 5001]),
+     DeviceType.UNKNOWN, DeviceType.NAS),
+    (NetworkDevice("192.168.1.30", hostname="iphone", vendor="Apple", open_ports=[62078]),
+     DeviceType.UNKNOWN, DeviceType.PHONE),
+    (NetworkDevice("192.168.1.43", hostname="security-camera", vendor="Xiaomi", open_ports=[3389, 9100]),
+     DeviceType.PRINTER, DeviceType.CAMERA),
+    # Противоречивые признаки: модель не выбирает тип наугад
+    (NetworkDevice("192.168.1.44", hostname="hp-printer", vendor="Apple", open_ports=[53]),
+     DeviceType.ROUTER, DeviceType.UNKNOWN),
+    (NetworkDevice("192.168.1.42", hostname="living-room-tv", vendor="Sony", open_ports=[139, 1900]),
+     DeviceType.UNKNOWN, DeviceType.UNKNOWN),
+]
+
+class TestClassifierBehavior(unittest.TestCase):
+    """Закрепленные результаты цепочки правил и взвешенной модели"""
+    
+    def test_expected_classifications(self):
+        """Классификация совпадает с ожидаемой для обоих классификаторов"""
+        classifier = DeviceClassifier()
+        
+        for device, rule_type, scored_type in EXPECTED_CLASSIFICATIONS:
+            with self.subTest(device=device.ip_address):
+                self.assertEqual(classifier.classify_device(copy.copy(device)), rule_type)
+                self.assertEqual(classifier.classify_with_confidence(copy.copy(device))[0], scored_type)
+
+class TestFingerprintDatabase(unittest.TestCase):
+    """Тесты базы отпечатков"""
+    
+    def setUp(self):
+        self.db = FingerprintDatabase(":memory:")
+    
+    def tearDown(self):
+        self.db.close()
+    
+    def test_connection_is_reused(self):
+        """Соединение открывается один раз на поток"""
+        self.assertIs(self.db.connection, self.db.connection)
+    
+    def test_match_from_worker_threads(self):
+        """Воркеры в других потоках видят ту же базу"""
+        device = NetworkDevice("192.168.1.5", mac_address="B8:27:EB:00:00:01", open_ports=[22])
+        results = []
+        
+        def worker():
+            results.append(self.db.match_device(device).get('vendor'))
+        
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(results, ["Raspberry Pi"] * 4)
+    
+    def test_thread_connection_released(self):
+        """Соединение завершившегося потока закрывается"""
+        connections = []
+        thread = threading.Thread(target=lambda: connections.append(self.db.connection))
+        thread.start()
+        thread.join()
+        gc.collect()
+        
+        self.assertEqual(self.db._connections, [self.db.connection])
+        with self.assertRaises(sqlite3.ProgrammingError):
+            connections[0].execute("SELECT 1")
+    
+    def test_match_ranked_by_port_overlap(self):
+        """Лучшее совпадение - отпечаток с наибольшим числом общих портов"""
+        self.db.add_fingerprint("Brother", "printer", common_ports=[9100, 515, 631], confidence=0.5)
+        device = NetworkDevice("192.168.1.40", open_ports=[9100, 515, 631])
+        
+        match = self.db.match_device(device)
+        self.assertEqual(match['vendor'], "Brother")
+        self.assertEqual(match['port_overlap'], 3)
+    
+    def test_mac_prefix_has_priority(self):
+        """Совпадение MAC-префикса важнее пересечения портов"""
+        device = NetworkDevice("192.168.1.5", mac_address="B8:27:EB:00:00:01", open_ports=[9100, 631])
+        
+        match = self.db.match_device(device)
+        self.assertEqual(match['vendor'], "Raspberry Pi")
+        self.assertEqual(match['mac_match'], 1)
+    
+    def test_match_devices_batch(self):
+        """Пакетное сопоставление совпадает с поштучным и сохраняет порядок"""
+        devices = [
+            NetworkDevice("192.168.1.5", mac_address="B8:27:EB:00:00:01", open_ports=[9100, 631]),
+            NetworkDevice("192.168.1.6"),
+            NetworkDevice("192.168.1.7", open_ports=[9100, 631, 80]),
+            NetworkDevice("192.168.1.8", open_ports=[65000]),
+        ]
+        
+        matches = self.db.match_devices(devices)
+        self.assertEqual(matches, [self.db.match_device(d) for d in devices])
+        self.assertEqual(matches[0]['vendor'], "Raspberry Pi")
+        self.assertEqual(matches[1], {})
+        self.assertEqual(matches[3], {})
+        
+        # Временные таблицы очищаются между вызовами
+        self.assertEqual(self.db.match_devices(devices[1:2]), [{}])
+
+class TestFingerprintDatabaseVersioning(unittest.TestCase):
+    """Тесты версионирования схемы"""
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "fingerprints.db"
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def count(self, db, where='1'):
+        return db.connection.execute(f'SELECT COUNT(*) FROM device_fingerprints WHERE {where}').fetchone()[0]
+    
+    def test_reopen_does_not_reseed(self):
+        """Повторное открытие актуальной базы не добавляет начальные данные"""
+        with FingerprintDatabase(self.path) as db:
+            db.add_fingerprint("Brother", "printer", common_ports=[9100])
+            self.assertEqual(db.connection.execute('PRAGMA user_version').fetchone()[0], DATABASE_VERSION)
+        
+        with FingerprintDatabase(self.path) as db:
+            self.assertEqual(self.count(db, "source = 'seed'"), 5)
+            self.assertEqual(self.count(db), 6)
+    
+    def test_upgrade_unversioned_database(self):
+        """Дубликаты начальных данных из базы без версии удаляются"""
+        conn = sqlite3.connect(self.path)
+        conn.execute('''
+            CREATE TABLE device_fingerprints (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, vendor TEXT NOT NULL, model TEXT,
+                mac_prefix TEXT, common_ports TEXT, http_headers TEXT, banners TEXT,
+                device_type TEXT, confidence REAL DEFAULT 0.8,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        rows = [("HP", "Printer", "[9100, 631, 80]", "printer"), ("Xerox", None, "[9100]", "printer")]
+        conn.executemany(
+            'INSERT INTO device_fingerprints (vendor, model, common_ports, device_type) VALUES (?, ?, ?, ?)',
+            rows + rows[:1]
+        )
+        conn.commit()
+        conn.close()
+        
+        with FingerprintDatabase(self.path) as db:
+            self.assertEqual(self.count(db, "vendor = 'HP'"), 1)
+            self.assertEqual(self.count(db, "vendor = 'Xerox' AND source IS NULL"), 1)
+            self.assertEqual(db.match_device(NetworkDevice("192.168.1.9", open_ports=[9100]))['port_overlap'], 1)
+
+NMAP_PROBES = r"""Probe TCP RTSPRequest q|OPTIONS / RTSP/1.0\r\n\r\n|
+ports 554,8554
+match rtsp m|^RTSP/1\.0 200 OK\r\n.*Server: Hikvision|s p/Hikvision rtspd/ d/webcam/ cpe:/h:hikvision:ip_camera/a
+match rtsp m|^RTSP/1\.0 200 OK| p/Generic rtspd/
+"""
+
+NVD_FEED = {
+    "vulnerabilities": [{
+        "cve": {
+            "id": "CVE-2024-0001",
+            "descriptions": [{"lang": "en", "value": "Buffer overflow in camera web server"}],
+            "metrics": {"cvssMetricV31": [{"cvssData": {"baseSeverity": "CRITICAL"}}]},
+            "configurations": [{"nodes": [{"cpeMatch": [
+                {"criteria": "cpe:2.3:h:hikvision:ip_camera:-:*:*:*:*:*:*:*"}
+            ]}]}]
+        }
+    }]
+}
+
+class TestFingerprintImport(unittest.TestCase):
+    """Тесты массового импорта"""
+    
+    def setUp(self):
+        self.db = FingerprintDatabase(":memory:")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.progress = []
+        self.importer = BulkImporter(self.db, batch_size=1, progress=lambda msg, n: self.progress.append(n))
+    
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+    
+    def test_import_nmap_probes(self):
+        """Строки match с типом устройства становятся отпечатками"""
+        path = Path(self.tmp.name) / "nmap-service-probes"
+        path.write_text(NMAP_PROBES, encoding='utf-8')
+        
+        self.assertEqual(self.importer.import_fingerprints(parse_nmap_service_probes(path)), 1)
+        self.assertIn(1, self.progress)
+        
+        match = self.db.match_device(NetworkDevice("192.168.1.50", open_ports=[554, 8554]))
+        self.assertEqual(match['vendor'], "Hikvision")
+        self.assertEqual(match['device_type'], "camera")
+    
+    def test_import_cve_feed_is_idempotent(self):
+        """Повторная загрузка фида обновляет записи, а не дублирует их"""
+        path = Path(self.tmp.name) / "nvdcve.json"
+        path.write_text(json.dumps(NVD_FEED), encoding='utf-8')
+        
+        for _ in range(2):
+            self.importer.import_vulnerabilities(parse_cve_feed(path))
+        
+        vulnerabilities = self.db.get_vulnerabilities(vendor="Hikvision")
+        self.assertEqual(len(vulnerabilities), 1)
+        self.assertEqual(vulnerabilities[0]['severity'], "CRITICAL")
+        self.assertEqual(vulnerabilities[0]['device_type'], "camera")
+
+    def test_cve_feed_is_streamed(self):
+        """JSON-фид читается блоками: результат не зависит от их границ"""
+        path = Path(self.tmp.name) / "nvdcve.json"
+        feed = dict(NVD_FEED, totalResults=2, vulnerabilities=NVD_FEED['vulnerabilities'] * 2)
+        path.write_text(json.dumps(feed, indent=2), encoding='utf-8')
+        expected = list(parse_cve_feed(path))
+        self.assertEqual(len(expected), 2)
+        
+        for chunk_size in (1, 7, 64):
+            with mock.patch('src.scanner.fingerprint_import.JSON_CHUNK_SIZE', chunk_size):
+                self.assertEqual(list(parse_cve_feed(path)), expected)
+        
+        path.write_text(json.dumps(NVD_FEED['vulnerabilities']), encoding='utf-8')
+        self.assertEqual(list(parse_cve_feed(path)), expected[:1])
+        
+        path.write_text('{"vulnerabilities": [{"cve": {}} {"cve": {}}]}', encoding='utf-8')
+        with self.assertRaises(ValueError):
+            list(parse_cve_feed(path))
+
+class TestVulnerabilityLookup(unittest.TestCase):
+    """Тесты поиска уязвимостей"""
+    
+    def setUp(self):
+        self.db = FingerprintDatabase(":memory:")
+        BulkImporter(self.db).import_vulnerabilities([
+            {'cve_id': "CVE-1", 'vendor': "Hikvision", 'device_type': "camera",
+             'description': "Command injection in the web interface"},
+            {'cve_id': "CVE-2", 'vendor': "Hikvision",
+             'description': "Hardcoded credentials in firmware"},
+            {'cve_id': "CVE-3", 'vendor': "Hikvision", 'device_type': "nas",
+             'description': "Path traversal in storage web interface"},
+            {'cve_id': "CVE-4", 'vendor': "HP", 'device_type': "printer",
+             'description': "Buffer overflow in print spooler"},
+            {'cve_id': "CVE-5", 'device_type': "camera",
+             'description': "Unauthenticated RTSP stream"},
+            {'cve_id': "CVE-6", 'description': "Default SNMP community"},
+        ])
+    
+    def tearDown(self):
+        self.db.close()
+    
+    def test_search_descriptions(self):
+        """Поиск находит описания, содержащие все слова запроса"""
+        found = {v['cve_id'] for v in self.db.search_vulnerabilities("web interface")}
+        self.assertEqual(found, {"CVE-1", "CVE-3"})
+        
+        # Операторы FTS5 в запросе считаются обычными словами
+        self.assertEqual(self.db.search_vulnerabilities('spooler OR'), [])
+    
+    def test_inventory_vulnerabilities(self):
+        """Пакетная выборка учитывает производителя и тип устройства"""
+        devices = [
+            NetworkDevice("192.168.1.50", vendor="hikvision", device_type=DeviceType.CAMERA),
+            NetworkDevice("192.168.1.51", vendor="Hikvision"),
+            NetworkDevice("192.168.1.40", vendor="HP", device_type=DeviceType.PRINTER),
+            NetworkDevice("192.168.1.60"),
+            NetworkDevice("192.168.1.61", device_type=DeviceType.PRINTER),
+        ]
+        
+        result = [{v['cve_id'] for v in found} for found in self.db.get_inventory_vulnerabilities(devices)]
+        self.assertEqual(result, [
+            {"CVE-1", "CVE-2", "CVE-5", "CVE-6"},
+            {"CVE-1", "CVE-2", "CVE-3", "CVE-5", "CVE-6"},
+            {"CVE-4", "CVE-6"},
+            # Без производителя подходят общие уязвимости
+            {"CVE-5", "CVE-6"},
+            {"CVE-6"},
+        ])
+    
+    def test_vendor_case_insensitive(self):
+        """Производитель сравнивается без учета регистра, как в пакетной выборке"""
+        found = {v['cve_id'] for v in self.db.get_vulnerabilities(vendor="hikvision")}
+        self.assertEqual(found, {"CVE-1", "CVE-2", "CVE-3"})
+        found = {v['cve_id'] for v in self.db.get_vulnerabilities("camera", "HIKVISION")}
+        self.assertEqual(found, {"CVE-1"})
+    
+    def test_vulnerability_columns(self):
+        """get_vulnerabilities возвращает все столбцы записи"""
+        vulnerability = self.db.get_vulnerabilities(vendor="HP")[0]
+        self.assertEqual(vulnerability['cve_id'], "CVE-4")
+        self.assertIn('id', vulnerability)
+        self.assertIn('created_at', vulnerability)
+
+if __name__ == '__main__':
+    unittest.main()